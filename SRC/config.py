@@ -18,12 +18,19 @@ LANGUAGE = {
     'sync_begin': {'ru': 'Синхронизация началась', 'en': 'Synchronization started'},
     'sync_end': {'ru': 'Синхронизация завершена', 'en': 'Synchronization ended'},
     'token_error': {'ru': 'Неверный токен доступа', 'en': 'Invalid access token'},
+    'local_missing': {'ru': 'Локальная папка не найдена: {path}', 'en': 'Local folder not found: {path}'},
     'yddir_exists': {'ru': 'Внимание! Такая папка уже существует на Яндекс.Диске. Продолжить?',
                      'en': 'Warning! This folder already exists on Yandex.Disk. Continue?'},
     'error': {'ru': 'Ошибка подключения к Яндекс.Диску. Проверьте настройки.',
               'en': 'Error connecting to Yandex.Disk. Check the settings.'},
     'warning': {'ru': 'Внимание!', 'en': 'Warning!'},
     'connect': {'ru': 'Подключение к Яндекс.Диску...', 'en': 'Connecting to Yandex.Disk...'},
+    'scan': {'ru': 'Сканирование папок...', 'en': 'Scanning folders...'},
+    'progress': {'ru': 'Файлы {files_done}/{files_total}, {mb_done:.1f}/{mb_total:.1f} МБ, '
+                       '{rate:.2f} МБ/с, осталось {eta}, в очереди {queue}',
+                 'en': 'Files {files_done}/{files_total}, {mb_done:.1f}/{mb_total:.1f} MB, '
+                       '{rate:.2f} MB/s, {eta} left, {queue} queued'},
+    'full_sync_done': {'ru': 'Полная синхронизация завершена', 'en': 'Full sync finished'},
 }
 
 
@@ -32,9 +39,47 @@ CONFIG_DEFAULT = {
     'token': '',
     'local': '',
     'yddir': '',
+    'pairs': [],
     'ignoreextensions': [],
     'ignorefiles': [],
+    'ignorepatterns': [],
     'logsize': 1024,
+    'upload_workers': 4,
+    'download_workers': 4,
+    'state_db': 'sync_state.db',
+    'remote_flat_scan': True,
+    'remote_page_size': 1000,
+    'remote_scan_workers': 8,
+    'remote_poll_max_interval': 60,
+    'remote_full_scan_interval': 600,
+    'remote_probe_folders': 20,
+    'remote_meta_ttl': 60,
+    'event_quiet_period': 1.0,
+    'echo_ttl': 10,
+    'hash_workers': 0,
+    'local_scan_workers': 8,
+    'chunked_threshold_mb': 32,
+    'metadata_workers': 2,
+    'small_file_workers': 4,
+    'large_file_workers': 1,
+    'lane_aging': 30,
+    'transfer_retries': 3,
+    'metadata_timeout': 15,
+    'transfer_timeout': 120,
+    'api_rate_limit': 20,
+    'api_burst': 40,
+    'api_retries': 5,
+    'metrics_port': 0,
+    'metrics_snapshot': '',
+    'metrics_snapshot_interval': 30,
+    'profile_resync': False,
+    'profile_mode': 'cprofile',
+    'profile_dir': '',
+    'transfer_log': '',
+    'engine': 'threads',
+    'startup_target_ms': 500,
+    'async_metadata_limit': 32,
+    'async_transfer_limit': 64,
 }
 
 
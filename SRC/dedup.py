@@ -0,0 +1,90 @@
+import shutil
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# ioctl FICLONE (Linux: btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+
+class ContentCatalog:
+    """Соответствие хеша содержимого и путей файлов на одной стороне"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths: Dict[str, Set[str]] = defaultdict(set)
+        self._hashes: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes)
+
+    def _remove(self, path: str):
+        content_hash = self._hashes.pop(path, None)
+        if content_hash:
+            paths = self._paths[content_hash]
+            paths.discard(path)
+            if not paths:
+                del self._paths[content_hash]
+
+    def add(self, path: str, content_hash: Optional[str]):
+        with self._lock:
+            self._remove(path)
+            if content_hash:
+                self._hashes[path] = content_hash
+                self._paths[content_hash].add(path)
+
+    def remove(self, path: str):
+        with self._lock:
+            self._remove(path)
+
+    def move(self, old_path: str, new_path: str, is_dir: bool = False):
+        with self._lock:
+            if is_dir:
+                prefix = old_path + '/'
+                pairs = [(path, new_path + path[len(old_path):])
+                         for path in self._hashes if path.startswith(prefix)]
+            else:
+                pairs = [(old_path, new_path)]
+            for old, new in pairs:
+                content_hash = self._hashes.get(old)
+                self._remove(old)
+                self._remove(new)
+                if content_hash:
+                    self._hashes[new] = content_hash
+                    self._paths[content_hash].add(new)
+
+    def rebuild(self, items: Iterable[Tuple[str, Optional[str]]]):
+        """Заполнить каталог заново парами (путь, хеш)"""
+        with self._lock:
+            self._paths.clear()
+            self._hashes.clear()
+            for path, content_hash in items:
+                if content_hash:
+                    self._hashes[path] = content_hash
+                    self._paths[content_hash].add(path)
+
+    def candidates(self, content_hash: Optional[str], exclude: str = '') -> list:
+        """Пути с таким же содержимым (кандидаты нужно перепроверить перед копированием)"""
+        if not content_hash:
+            return []
+        with self._lock:
+            return [path for path in self._paths.get(content_hash, ()) if path != exclude]
+
+
+def clone_file(src: Path, dst: Path):
+    """
+    Локальная копия файла: reflink, если файловая система его поддерживает,
+    иначе обычное копирование средствами ОС.
+    """
+    if sys.platform.startswith('linux'):
+        import fcntl
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
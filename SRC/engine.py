@@ -0,0 +1,16 @@
+def create_service(window, logger, configure, language):
+    """
+    Сервис синхронизации движка, выбранного в config.json ('threads' или 'asyncio');
+    при заданном 'pairs' - менеджер нескольких пар.
+    Модули сервиса (yadisk, requests, httpx) импортируются только здесь.
+    """
+    if configure.get('engine') == 'asyncio':
+        from SRC.service_async import AsyncYandexDiskSync as engine
+    else:
+        from SRC.service_new import TwoWayYandexDiskSync as engine
+
+    # Несколько пар синхронизации - один процесс с общими ресурсами
+    if configure.get('pairs'):
+        from SRC.sync_manager import SyncManager
+        return SyncManager(window, logger, configure, language, engine)
+    return engine(window, logger, configure, language)
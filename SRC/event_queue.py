@@ -0,0 +1,327 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """Размер и mtime файла (None - файла нет)"""
+    try:
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    except OSError:
+        return None
+
+
+class CoalescingEventQueue:
+    """
+    Очередь локальных событий с объединением по пути.
+    Несколько событий одного файла сливаются в одно (created+modified -> created,
+    created+deleted -> ничего), а файл отдаётся на обработку только после того,
+    как его размер и mtime не менялись в течение quiet_period секунд.
+    """
+
+    def __init__(self, local_root: Path, quiet_period: float = 1.0):
+        self.local_root = local_root
+        self.quiet_period = quiet_period
+        self._pending: 'OrderedDict[str, dict]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._first_seen: Optional[float] = None
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def oldest_age(self) -> float:
+        """Сколько секунд ждёт самое старое необработанное событие"""
+        with self._cond:
+            if not self._pending:
+                return 0.0
+            return time.monotonic() - min(event['queued'] for event in self._pending.values())
+
+    def _signature(self, relative_path: str) -> Optional[Tuple[int, int]]:
+        return file_signature(self.local_root / relative_path)
+
+    def _set(self, path: str, event: dict):
+        event['time'] = time.monotonic()
+        # Время первого события, слитого в это (для возраста очереди)
+        event.setdefault('queued', self._first_seen or event['time'])
+        event['signature'] = None if event['type'] == 'deleted' else self._signature(path)
+        self._pending[path] = event
+        self._pending.move_to_end(path)
+
+    def _merge(self, event: dict):
+        """Слияние нового события с уже ожидающим событием того же файла"""
+        event_type, src, dest = event['type'], event['src'], event.get('dest')
+        pending = self._pending.get(src)
+        self._first_seen = pending['queued'] if pending else None
+
+        if event_type == 'moved':
+            if not dest:
+                return
+            self._pending.pop(src, None)
+            if pending and pending['type'] == 'created':
+                # Файла ещё нет на диске - выгружаем сразу под новым именем
+                self._set(dest, {'type': 'created', 'src': dest, 'dest': None})
+            elif pending and pending['type'] == 'moved':
+                # a -> b -> c превращается в a -> c
+                self._set(dest, dict(pending, dest=dest))
+            else:
+                modified = bool(pending and pending['type'] == 'modified')
+                self._set(dest, {'type': 'moved', 'src': src, 'dest': dest,
+                                 'modified': modified})
+            return
+
+        if pending is None:
+            self._set(src, {'type': event_type, 'src': src, 'dest': None})
+            return
+
+        last_type = pending['type']
+        if event_type == 'deleted':
+            if last_type == 'created':
+                del self._pending[src]
+            elif last_type == 'moved':
+                # Перемещённый файл удалён - удаляем исходный путь
+                del self._pending[src]
+                self._set(pending['src'], {'type': 'deleted', 'src': pending['src'], 'dest': None})
+            else:
+                self._set(src, {'type': 'deleted', 'src': src, 'dest': None})
+        elif last_type == 'deleted':
+            # Файл удалили и создали заново - это изменение
+            self._set(src, {'type': 'modified', 'src': src, 'dest': None})
+        elif last_type == 'moved':
+            self._set(src, dict(pending, modified=True))
+        else:
+            # created + modified -> created, modified + modified -> modified
+            self._set(src, dict(pending))
+
+    def put(self, event: dict):
+        """Добавить событие в очередь"""
+        with self._cond:
+            self._merge(event)
+            self._cond.notify()
+
+    def _is_ready(self, path: str, event: dict, now: float) -> bool:
+        if now - event['time'] < self.quiet_period:
+            return False
+        if event['type'] == 'deleted':
+            return True
+        # Файл ещё пишется - откладываем до следующей паузы
+        signature = self._signature(path)
+        if signature == event['signature']:
+            return True
+        event['signature'] = signature
+        event['time'] = now
+        self._pending.move_to_end(path)
+        return False
+
+    def get(self, timeout: float = 0.5) -> Optional[dict]:
+        """
+        Ждать готовое событие не дольше timeout секунд.
+        Возвращает None, если готовых событий нет или очередь закрыта.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                for path, event in list(self._pending.items()):
+                    if now - event['time'] < self.quiet_period:
+                        break
+                    if self._is_ready(path, event, now):
+                        del self._pending[path]
+                        return event
+
+                wait = deadline - now
+                if self._pending:
+                    oldest = next(iter(self._pending.values()))
+                    wait = min(wait, oldest['time'] + self.quiet_period - now)
+                if deadline - now <= 0:
+                    return None
+                self._cond.wait(max(wait, 0.01))
+        return None
+
+    def open(self):
+        with self._cond:
+            self._closed = False
+
+    def close(self):
+        """Закрыть очередь и разбудить ожидающие потоки"""
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._cond.notify_all()
+
+
+class EchoRegistry:
+    """
+    Собственные записи синхронизатора в локальной папке (скачивания, удаления,
+    перемещения). События наблюдателя, которые они вызывают, - эхо: их не нужно
+    отправлять обратно на диск. Пока запись идёт, события её путей отбрасываются,
+    а ещё ttl секунд после неё - если файл в том состоянии (размер, mtime),
+    в котором его оставила запись. Правка пользователя меняет состояние
+    и проходит как обычно.
+    """
+
+    def __init__(self, local_root: Path, ttl: float = 10.0):
+        self.local_root = local_root
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # путь -> число незавершённых записей (для папок - все пути внутри)
+        self._writing: Dict[str, int] = {}
+        # путь -> (ожидаемое состояние, срок), в порядке срока
+        self._expected: 'OrderedDict[str, Tuple[Optional[Tuple[int, int]], float]]' = OrderedDict()
+
+    def _files(self, path: str) -> List[str]:
+        """Файлы внутри папки path (пути относительно local_root)"""
+        files = []
+        for dirpath, _, names in os.walk(self.local_root / path):
+            rel = Path(dirpath).relative_to(self.local_root).as_posix()
+            files.extend(f'{rel}/{name}' for name in names)
+        return files
+
+    @contextmanager
+    def writing(self, *paths: Optional[str], is_dir: bool = False):
+        """Запись в paths (папки - is_dir): её события - эхо"""
+        paths = [path for path in paths if path]
+        with self._lock:
+            for path in paths:
+                self._writing[path] = self._writing.get(path, 0) + 1
+        files = set(paths)
+        try:
+            if is_dir:
+                files.update(file for path in paths for file in self._files(path))
+            yield
+        finally:
+            if is_dir:
+                files.update(file for path in paths for file in self._files(path))
+            states = {file: file_signature(self.local_root / file) for file in files}
+            now = time.monotonic()
+            with self._lock:
+                for path in paths:
+                    if self._writing[path] > 1:
+                        self._writing[path] -= 1
+                    else:
+                        del self._writing[path]
+                while self._expected and next(iter(self._expected.values()))[1] < now:
+                    self._expected.popitem(last=False)
+                for file, state in states.items():
+                    self._expected[file] = (state, now + self.ttl)
+                    self._expected.move_to_end(file)
+
+    def _in_flight(self, path: str) -> bool:
+        return any(path == busy or path.startswith(busy + '/') for busy in self._writing)
+
+    def is_echo(self, path: str, dest: Optional[str] = None) -> bool:
+        """
+        Событие path (перемещение - в dest) вызвано собственной записью.
+        Одна запись даёт несколько событий (created, modified...), поэтому
+        ожидаемое состояние живёт до истечения ttl и снимается раньше,
+        только если файл уже изменили.
+        """
+        paths = [p for p in (path, dest) if p]
+        with self._lock:
+            if not self._writing and not self._expected:
+                return False
+            if any(self._in_flight(p) for p in paths):
+                return True
+            expected = [self._expected.get(p) for p in paths]
+        now = time.monotonic()
+        if any(entry is None or entry[1] < now for entry in expected):
+            return False
+        changed = [p for p, entry in zip(paths, expected)
+                   if file_signature(self.local_root / p) != entry[0]]
+        if changed:
+            # Правка пользователя: следующие события путей - тоже не эхо
+            with self._lock:
+                for p, entry in zip(paths, expected):
+                    if p in changed and self._expected.get(p) is entry:
+                        del self._expected[p]
+        return not changed
+
+
+class PathClaims:
+    """
+    Пути, которые сейчас обрабатываются. Событие и действие полной
+    синхронизации над одним путём выполняются по очереди.
+    """
+
+    def __init__(self):
+        self._busy = set()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def hold(self, *paths: Optional[str]):
+        paths = {path for path in paths if path}
+        with self._cond:
+            while self._busy & paths:
+                self._cond.wait()
+            self._busy |= paths
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._busy -= paths
+                self._cond.notify_all()
+
+
+class SharedLock:
+    """
+    Блокировка «читатели - писатель»: with lock - монопольный захват (полная
+    синхронизация), with lock.shared() - совместный (события и изменения
+    на диске обрабатываются одновременно). Ожидающий монопольный захват
+    не пропускает новых совместных, чтобы полная синхронизация не ждала вечно.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+
+    def release(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def acquire_shared(self, blocking: bool = True) -> bool:
+        """Совместный захват; с blocking=False - False, если пришлось бы ждать"""
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                if not blocking:
+                    return False
+                self._cond.wait()
+            self._readers += 1
+            return True
+
+    def release_shared(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    @contextmanager
+    def shared(self):
+        self.acquire_shared()
+        try:
+            yield
+        finally:
+            self.release_shared()
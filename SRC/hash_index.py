@@ -0,0 +1,173 @@
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from SRC.state_db import SyncStateDB
+
+# Размер блока чтения и порог, начиная с которого файл отображается в память
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_MMAP_THRESHOLD = 16 * 1024 * 1024
+
+Digest = Tuple[str, str]
+
+
+def hash_file(file_path: str, use_mmap: bool = False) -> Digest:
+    """
+    Вычисление MD5 и SHA256 файла за одно чтение.
+    use_mmap - большие файлы отображать в память. Только в пуле процессов:
+    если файл укоротят во время чтения, процесс получит SIGBUS.
+    """
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, HASH_MMAP_THRESHOLD):
+                        with view[offset:offset + HASH_MMAP_THRESHOLD] as chunk:
+                            md5.update(chunk)
+                            sha256.update(chunk)
+                finally:
+                    view.release()
+        else:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                md5.update(chunk)
+                sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+def _try_hash_file(file_path: str, use_mmap: bool = False) -> Optional[Digest]:
+    try:
+        return hash_file(file_path, use_mmap)
+    except OSError:
+        return None
+
+
+def _pool_hash_file(file_path: str) -> Optional[Digest]:
+    """Хеширование в процессе пула: его падение не затрагивает синхронизацию"""
+    return _try_hash_file(file_path, use_mmap=True)
+
+
+class HashIndex:
+    """
+    Индекс хешей локальных файлов.
+    Ключ - (устройство, inode), запись действительна, пока совпадают
+    размер и mtime_ns, поэтому неизменённый файл не хешируется повторно.
+    """
+
+    def __init__(self, state_db: SyncStateDB, workers: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self._db = state_db
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                dev INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (dev, inode)
+            )
+        """)
+        self._entries: Optional[Dict[Tuple[int, int], tuple]] = None
+
+    def _load(self):
+        if self._entries is None:
+            rows = self._db.execute('SELECT dev, inode, size, mtime_ns, md5, sha256 FROM hashes')
+            self._entries = {(row[0], row[1]): row[2:] for row in rows}
+
+    def _lookup(self, stat: os.stat_result) -> Optional[Digest]:
+        self._load()
+        entry = self._entries.get((stat.st_dev, stat.st_ino))
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2], entry[3]
+        return None
+
+    def _store(self, stat: os.stat_result, digest: Digest, commit: bool = True):
+        self._load()
+        row = (stat.st_size, stat.st_mtime_ns) + tuple(digest)
+        self._entries[(stat.st_dev, stat.st_ino)] = row
+        self._db.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)',
+                         (stat.st_dev, stat.st_ino) + row, commit=commit)
+
+    def lookup(self, dev: int, inode: int, size: int, mtime_ns: int) -> Optional[Digest]:
+        """Хеши из индекса без чтения файла"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get((dev, inode))
+        if entry and entry[0] == size and entry[1] == mtime_ns:
+            return entry[2], entry[3]
+        return None
+
+    def get(self, file_path: Path) -> Optional[Digest]:
+        """Хеши файла из индекса, при необходимости вычисляются заново"""
+        try:
+            stat = os.stat(file_path)
+            with self._lock:
+                digest = self._lookup(stat)
+            if digest:
+                return digest
+            digest = hash_file(str(file_path))
+            # Файл изменился во время чтения - хеш не запоминаем
+            if os.stat(file_path).st_mtime_ns == stat.st_mtime_ns:
+                with self._lock:
+                    self._store(stat, digest)
+            return digest
+        except OSError:
+            return None
+
+    def put(self, file_path: Path, md5: Optional[str], sha256: Optional[str]):
+        """Запомнить известные хеши файла (например, после скачивания)"""
+        if not (md5 and sha256):
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        with self._lock:
+            self._store(stat, (md5, sha256))
+
+    def prefetch(self, file_paths: Iterable[Path]):
+        """Массовое хеширование файлов, которых нет в индексе, в пуле процессов"""
+        missing = []
+        with self._lock:
+            for file_path in file_paths:
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                if self._lookup(stat) is None:
+                    missing.append((file_path, stat))
+        if not missing:
+            return
+
+        names = [str(file_path) for file_path, _ in missing]
+        if len(missing) == 1 or self.workers == 1:
+            results = [_try_hash_file(name) for name in names]
+        else:
+            try:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                    results = list(executor.map(_pool_hash_file, names, chunksize=16))
+            except BrokenProcessPool:
+                # Процесс пула упал (файл укоротили во время чтения) - читаем обычным способом
+                results = [_try_hash_file(name) for name in names]
+
+        with self._lock:
+            for (file_path, stat), digest in zip(missing, results):
+                if digest is None:
+                    continue
+                try:
+                    if os.stat(file_path).st_mtime_ns != stat.st_mtime_ns:
+                        continue
+                except OSError:
+                    continue
+                self._store(stat, digest, commit=False)
+        self._db.commit()
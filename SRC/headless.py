@@ -0,0 +1,122 @@
+import signal
+import threading
+import time
+from typing import Optional
+
+from SRC.config import LANGUAGE
+from SRC.utils import config_relative, load_config, setup_logging
+
+
+class HeadlessRunner:
+    """
+    Синхронизация без окна: для серверов и запуска по расписанию.
+    SIGTERM/SIGINT останавливают синхронизацию, SIGHUP перечитывает config.json.
+    """
+
+    def __init__(self, config_path: str = 'config.json', started: Optional[float] = None,
+                 profile: Optional[dict] = None):
+        self.config_path = config_path
+        self.started = time.perf_counter() if started is None else started
+        self.config = load_config(config_path)
+        # Настройки профилирования из командной строки (поверх config.json)
+        self.profile = profile
+        if profile:
+            self.config.update(profile)
+        self.logger = setup_logging(self.config['logsize'],
+                                    log_file=config_relative(config_path, 'yd_sync.log'),
+                                    transfer_log=self.config.get('transfer_log', ''))
+        self.service = None
+        self._stop = threading.Event()
+        self._reload = threading.Event()
+
+    def _create_service(self):
+        from SRC.engine import create_service
+        self.service = create_service(None, self.logger, self.config, LANGUAGE)
+
+    def _report_startup(self):
+        """Время от запуска процесса до конца первого сканирования"""
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        target_ms = self.config.get('startup_target_ms', 500)
+        if elapsed_ms > target_ms:
+            self.logger.warning(f"[STARTUP] {elapsed_ms:.0f} ms to first scan "
+                                f"(target {target_ms} ms)")
+        else:
+            self.logger.info(f"[STARTUP] {elapsed_ms:.0f} ms to first scan")
+
+    def _report_after_first_scan(self):
+        """Отчёт о запуске - когда сканирование первой полной синхронизации закончится"""
+        phases = []
+
+        def on_status(status: dict):
+            if phases == ['scan'] and status['phase'] != 'scan':
+                phases.append(status['phase'])
+                self._report_startup()
+            elif not phases and status['phase'] == 'scan':
+                phases.append('scan')
+
+        self.service.add_status_listener(on_status)
+
+    def _install_signals(self):
+        signal.signal(signal.SIGTERM, lambda *_: self._stop.set())
+        signal.signal(signal.SIGINT, lambda *_: self._stop.set())
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda *_: self._reload.set())
+
+    def run_once(self) -> int:
+        """
+        Одна полная синхронизация (для cron); код возврата 0 - успех.
+        С профилированием - через force_resync, который его и выполняет.
+        """
+        self._create_service()
+        try:
+            if not self.service.check_token():
+                self.logger.error(LANGUAGE['token_error'][self.config['language']])
+                return 1
+            self._report_after_first_scan()
+            from SRC.metrics import start_exporter, stop_exporter
+            start_exporter(self.config, self.logger)
+            try:
+                sync = self.service.force_resync if self.profile else self.service.full_sync
+                return 0 if sync() else 1
+            finally:
+                # Последний снимок метрик записывается при остановке
+                stop_exporter()
+        finally:
+            # Незафиксированные записи состояния сбрасываются при закрытии базы
+            self.service.close()
+
+    def run(self) -> int:
+        """Непрерывная синхронизация до SIGTERM"""
+        self._install_signals()
+        self._create_service()
+        self._report_after_first_scan()
+        if not self.service.start_sync():
+            self.service.close()
+            return 1
+
+        while not self._stop.is_set():
+            self._stop.wait(1)
+            if self._reload.is_set():
+                self._reload.clear()
+                self.logger.info("[RELOAD] config.json")
+                self.service.stop_sync()
+                # Соединение с базой состояния старого сервиса больше не нужно
+                self.service.close()
+                self.config = load_config(self.config_path)
+                self._create_service()
+                if not self.service.start_sync():
+                    self.service.close()
+                    return 1
+
+        self.service.stop_sync()
+        self.service.close()
+        from SRC.metrics import stop_exporter
+        stop_exporter()
+        return 0
+
+
+def run_headless(config_path: str = 'config.json', once: bool = False,
+                 started: Optional[float] = None, profile: Optional[dict] = None) -> int:
+    """Запуск синхронизации без GUI (с профилированием - один прогон)"""
+    runner = HeadlessRunner(config_path, started, profile)
+    return runner.run_once() if once or profile else runner.run()
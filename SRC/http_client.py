@@ -0,0 +1,219 @@
+import socket
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection
+from yadisk import YaDisk, settings as yadisk_settings
+from yadisk.exceptions import RequestError
+from yadisk.sessions.requests_session import RequestsResponse, RequestsSession, convert_requests_exception
+
+from SRC.metrics import METRICS
+from SRC.rate_limiter import RETRY_STATUSES, RateLimiter, parse_retry_after
+
+# Таймаут установки соединения, секунды
+CONNECT_TIMEOUT = 10
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """Адаптер с TCP keep-alive, чтобы простаивающие соединения пула не обрывались"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+def replayable(data) -> bool:
+    """Тело запроса можно отправить повторно (не поток и не файл)"""
+    return data is None or isinstance(data, (bytes, str, dict))
+
+
+def idempotent(method: str, params: Optional[dict]) -> bool:
+    """
+    Повтор запроса не меняет результат. POST (copy, move) и PUT без overwrite
+    (создание папки) могли выполниться на сервере до обрыва или 5xx - их повтор
+    сообщил бы о ложном конфликте, поэтому они повторяются только после 429.
+    """
+    method = method.upper()
+    if method in ('GET', 'HEAD', 'DELETE'):
+        return True
+    return method == 'PUT' and str((params or {}).get('overwrite', '')).lower() == 'true'
+
+
+def should_retry(status, safe: bool) -> bool:
+    """Повторить после ответа status (None - ошибка соединения); 429 - запрос не выполнялся"""
+    if status is None:
+        return safe
+    return status in RETRY_STATUSES and (safe or status == 429)
+
+
+def api_request(url: str) -> bool:
+    """Запрос к REST API (расходует квоту), а не передача по прямой ссылке"""
+    return url.startswith(yadisk_settings.BASE_API_URL)
+
+
+def request_endpoint(url: str) -> str:
+    """Метка запроса для метрик: путь API или 'transfer' для прямых ссылок"""
+    path = urlsplit(url).path
+    if not api_request(url) or not path.startswith('/v1/'):
+        return 'transfer'
+    # Идентификаторы операций не должны размножать метки
+    return '/v1/disk/operations' if path.startswith('/v1/disk/operations/') else path
+
+
+def record_request(endpoint: str, method: str, status, started: float, retry: bool = False):
+    """Учесть попытку запроса в метриках"""
+    METRICS.inc('ydsync_api_requests_total', endpoint=endpoint, method=method, status=status)
+    METRICS.observe('ydsync_api_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+    if retry:
+        METRICS.inc('ydsync_api_retries_total', endpoint=endpoint)
+
+
+class _SharedRequestsSession(RequestsSession):
+    """
+    Сессия yadisk с одним пулом соединений на все потоки.
+    Стандартная RequestsSession заводит сессию на каждый поток,
+    и каждый новый рабочий поток заново устанавливает TLS-соединение.
+    Запросы к API проходят через общий RateLimiter; запросы без файла в теле
+    повторяются при 429, а идемпотентные - и при 5xx и ошибках соединения
+    (загрузку файла повторяет сам yadisk, перемотав файл).
+    """
+
+    def __init__(self, session: requests.Session, limiter: RateLimiter, retries: int = 5):
+        super().__init__()
+        self._shared = session
+        self.limiter = limiter
+        self.retries = retries
+
+    @property
+    def requests_session(self) -> requests.Session:
+        return self._shared
+
+    def _send(self, method, url, params=None, data=None, headers=None, stream=False,
+              **kwargs) -> Tuple[RequestsResponse, requests.Response]:
+        """Запрос, как в RequestsSession, но с исходным ответом requests (нужны заголовки)"""
+        request_headers = CaseInsensitiveDict(self._shared.headers)
+        request_headers.update(headers or {})
+        request_kwargs = {'params': params, 'data': data, 'headers': request_headers,
+                          'stream': stream}
+        if 'timeout' in kwargs:
+            request_kwargs['timeout'] = kwargs['timeout']
+        request_kwargs.update(kwargs.get('requests_args') or {})
+        try:
+            raw = self._shared.request(method, url, **request_kwargs)
+        except requests.RequestException as e:
+            raise convert_requests_exception(e) from e
+        return RequestsResponse(raw), raw
+
+    def send_request(self, method, url, **kwargs):
+        attempts = self.retries + 1 if replayable(kwargs.get('data')) else 1
+        safe = idempotent(method, kwargs.get('params'))
+        endpoint = request_endpoint(url)
+        limited = api_request(url)
+        for attempt in range(attempts):
+            last = attempt + 1 >= attempts
+            if limited:
+                self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response, raw = self._send(method, url, **kwargs)
+            except (RequestError, requests.RequestException):
+                retry = should_retry(None, safe) and not last
+                record_request(endpoint, method, 'error', started, retry=retry)
+                if limited:
+                    self.limiter.release(None)
+                if not retry:
+                    raise
+                time.sleep(self.limiter.backoff(attempt))
+                continue
+
+            retry = should_retry(response.status, safe) and not last
+            record_request(endpoint, method, response.status, started, retry)
+            retry_after = parse_retry_after(raw.headers.get('Retry-After'))
+            if limited:
+                self.limiter.release(response.status, retry_after)
+            if not retry:
+                return response
+            response.close()
+            time.sleep(self.limiter.backoff(attempt, retry_after))
+
+    def close(self):
+        self._shared.close()
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """Сессия requests с пулом на pool_size соединений к каждому хосту"""
+    session = requests.Session()
+    adapter = _KeepAliveAdapter(pool_connections=8, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class HttpClient:
+    """Клиент Яндекс.Диска и сессия для прямых передач с общим пулом соединений"""
+
+    def __init__(self, token: str, pool_size: int,
+                 metadata_timeout: float, transfer_timeout: float,
+                 rate: float = 20, burst: float = 40, retries: int = 5):
+        self.settings = (pool_size, metadata_timeout, transfer_timeout, rate, burst, retries)
+        self.session = make_session(pool_size)
+        self.metadata_timeout = (CONNECT_TIMEOUT, metadata_timeout)
+        self.transfer_timeout = (CONNECT_TIMEOUT, transfer_timeout)
+        self.retries = retries
+        # Один ограничитель на токен: квота API общая для всех потоков и пар
+        self.limiter = RateLimiter(rate, burst, max_concurrency=pool_size)
+        # Повторы - в сессии; собственные повторы yadisk (без пауз) отключены,
+        # upload/download передают n_retries явно
+        self.disk = YaDisk(token=token,
+                           session=_SharedRequestsSession(self.session, self.limiter, retries),
+                           default_args={'timeout': self.metadata_timeout, 'n_retries': 0})
+
+    def close(self):
+        self.session.close()
+
+
+_clients: Dict[str, HttpClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token: str, pool_size: int = 10,
+               metadata_timeout: float = 15, transfer_timeout: float = 120,
+               rate: float = 20, burst: float = 40, retries: int = 5) -> HttpClient:
+    """
+    Клиент для токена. Один и тот же клиент (с открытыми соединениями)
+    переиспользуется при перезапусках сервиса синхронизации.
+    """
+    settings: Tuple = (pool_size, metadata_timeout, transfer_timeout, rate, burst, retries)
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is not None and client.settings == settings:
+            return client
+        if client is not None:
+            client.close()
+        client = _clients[token] = HttpClient(token, *settings)
+        return client
+
+
+def client_from_config(config: dict, pool_size: int) -> HttpClient:
+    """Клиент с таймаутами и ограничением запросов из config.json"""
+    return get_client(config['token'], pool_size=pool_size,
+                      metadata_timeout=config.get('metadata_timeout', 15),
+                      transfer_timeout=config.get('transfer_timeout', 120),
+                      rate=config.get('api_rate_limit', 20),
+                      burst=config.get('api_burst', 40),
+                      retries=config.get('api_retries', 5))
+
+
+def close_clients():
+    """Закрыть все соединения (при выходе из программы)"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,155 @@
+import posixpath
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+# Файл с правилами исключения внутри синхронизируемых папок
+IGNORE_FILE = '.ydsyncignore'
+
+
+class _Rule(NamedTuple):
+    regex: 're.Pattern'
+    negate: bool
+    dir_only: bool
+    anchored: bool
+
+
+def _glob_regex(pattern: str) -> str:
+    """Glob в стиле .gitignore ('*', '?', '[...]', '**') -> регулярное выражение"""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+                continue
+            if pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[' and pattern.find(']', i + 1) != -1:
+            j = pattern.find(']', i + 1)
+            body = pattern[i + 1:j].replace('\\', '\\\\')
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append(f'[{body}]')
+            i = j
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def compile_rules(lines: Iterable[str]) -> List[_Rule]:
+    """Строки в формате .gitignore -> список правил"""
+    rules = []
+    for line in lines:
+        line = line.rstrip('\n\r').strip()
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if line:
+            rules.append(_Rule(re.compile(_glob_regex(line) + '$'), negate, dir_only, anchored))
+    return rules
+
+
+class IgnoreRules:
+    """
+    Скомпилированные правила исключения файлов из синхронизации:
+    расширения, точные имена, glob-шаблоны в стиле .gitignore
+    и файлы .ydsyncignore в папках (действуют на свою папку и вложенные).
+    Решения по папкам кэшируются, поэтому проверка события - это
+    несколько поисков в словаре и проверка имени файла.
+    """
+
+    def __init__(self, root: Path, extensions: Iterable[str] = (), names: Iterable[str] = (),
+                 patterns: Iterable[str] = (), reserved: Iterable[str] = ()):
+        self.root = Path(root)
+        # Служебные папки в корне: исключены всегда, на обеих сторонах
+        self.reserved = frozenset(reserved)
+        self.extensions = tuple('.' + ext.strip().lstrip('.').lower()
+                                for ext in extensions if ext.strip().lstrip('.'))
+        self.names = frozenset(name.strip() for name in names if name.strip())
+        self.patterns = compile_rules(patterns)
+        self._dir_rules: Dict[str, List[_Rule]] = {}
+        self._dir_ignored: Dict[str, bool] = {}
+
+    def _rules_in(self, folder: str) -> List[_Rule]:
+        """Правила из .ydsyncignore папки (читаются один раз)"""
+        rules = self._dir_rules.get(folder)
+        if rules is None:
+            try:
+                with open(self.root / folder / IGNORE_FILE, encoding='utf-8') as f:
+                    rules = compile_rules(f)
+            except (OSError, UnicodeDecodeError):
+                rules = []
+            self._dir_rules[folder] = rules
+        return rules
+
+    @staticmethod
+    def _apply(rules: List[_Rule], path: str, name: str, is_dir: bool, ignored: bool) -> bool:
+        for rule in rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(path if rule.anchored else name):
+                ignored = not rule.negate
+        return ignored
+
+    def match_entry(self, relative_path: str, is_dir: bool = False) -> bool:
+        """
+        Исключён ли сам путь без учёта исключённых родительских папок
+        (для обхода, который не заходит в исключённые папки).
+        """
+        if relative_path in self.reserved:
+            return True
+        name = posixpath.basename(relative_path)
+        if name in self.names:
+            return True
+        if not is_dir and self.extensions and name.lower().endswith(self.extensions):
+            return True
+
+        ignored = self._apply(self.patterns, relative_path, name, is_dir, False)
+        # Правила более глубоких .ydsyncignore важнее
+        folder = ''
+        parts = relative_path.split('/')
+        for i in range(len(parts)):
+            if i:
+                folder = '/'.join(parts[:i])
+            rules = self._rules_in(folder)
+            if rules:
+                sub_path = '/'.join(parts[i:])
+                ignored = self._apply(rules, sub_path, name, is_dir, ignored)
+        return ignored
+
+    def match(self, relative_path: str, is_dir: bool = False) -> bool:
+        """Исключён ли путь (с учётом родительских папок)"""
+        parts = relative_path.split('/')
+        for i in range(1, len(parts)):
+            folder = '/'.join(parts[:i])
+            ignored = self._dir_ignored.get(folder)
+            if ignored is None:
+                ignored = self._dir_ignored[folder] = self.match_entry(folder, is_dir=True)
+            if ignored:
+                return True
+        return self.match_entry(relative_path, is_dir)
+
+    def invalidate(self, folder: Optional[str] = None):
+        """Файл .ydsyncignore изменился - перечитать правила"""
+        if folder is None:
+            self._dir_rules.clear()
+        else:
+            self._dir_rules.pop(folder, None)
+        self._dir_ignored.clear()
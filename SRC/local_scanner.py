@@ -0,0 +1,137 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Пакет результатов одного потока обхода
+BATCH_SIZE = 1000
+
+# Путь относительно корня ('a/b.txt') -> пропустить
+SkipRule = Callable[[str], bool]
+
+
+def file_info(stat: os.stat_result) -> dict:
+    """Информация о локальном файле из результата stat"""
+    return {
+        'size': stat.st_size,
+        'modified': stat.st_mtime,
+        'mtime_ns': stat.st_mtime_ns,
+        'dev': stat.st_dev,
+        'inode': stat.st_ino,
+        'type': 'file'
+    }
+
+
+def under(path: str, prefixes: Iterable[str]) -> bool:
+    """Путь совпадает с одним из префиксов или лежит внутри него ('' - всё)"""
+    return any(not prefix or path == prefix or path.startswith(prefix + '/')
+               for prefix in prefixes)
+
+
+class LocalScanner:
+    """
+    Потоковое сканирование локальной папки на os.scandir.
+    Подпапки верхнего уровня обходятся параллельно, stat берётся из DirEntry,
+    пропускаемые папки не обходятся вовсе. Пути - относительные, через '/'.
+    Папки и записи, которые не удалось прочитать, попадают в failed
+    ('' - корень): их содержимое неизвестно, а не удалено.
+    """
+
+    def __init__(self, root: Path, logger, workers: int = 8,
+                 skip_dir: Optional[SkipRule] = None, skip_file: Optional[SkipRule] = None):
+        self.root = str(root)
+        self.logger = logger
+        self.workers = max(1, workers)
+        self.skip_dir = skip_dir or (lambda rel: False)
+        self.skip_file = skip_file or (lambda rel: False)
+        self.failed: List[str] = []
+
+    def _entry_info(self, entry: os.DirEntry) -> dict:
+        stat = entry.stat()
+        if not stat.st_ino:
+            # Windows: DirEntry не заполняет st_ino и st_dev
+            stat = os.stat(entry.path)
+        return file_info(stat)
+
+    def _scan_dir(self, path: str, prefix: str,
+                  files: List[Tuple[str, dict]], dirs: List[Tuple[str, str]]):
+        """Файлы папки - в files, подпапки для обхода - в dirs"""
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    rel = prefix + entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self.skip_dir(rel):
+                                dirs.append((entry.path, rel + '/'))
+                        elif entry.is_file() and not self.skip_file(rel):
+                            files.append((rel, self._entry_info(entry)))
+                    except OSError as e:
+                        self.failed.append(rel)
+                        self.logger.warning("Scan ERROR %s: %s", rel, e)
+        except OSError as e:
+            self.failed.append(prefix.rstrip('/'))
+            self.logger.warning("Scan ERROR %s: %s", path, e)
+
+    def _walk(self, path: str, prefix: str, put: Callable[[list], bool]):
+        """Обход поддерева; put возвращает False, если сканирование прервано"""
+        stack = [(path, prefix)]
+        batch = []
+        while stack:
+            dirs = []
+            self._scan_dir(*stack.pop(), batch, dirs)
+            stack.extend(dirs)
+            if len(batch) >= BATCH_SIZE:
+                if not put(batch):
+                    return
+                batch = []
+        if batch:
+            put(batch)
+
+    def scan(self) -> Iterator[Tuple[str, dict]]:
+        """Генератор пар (относительный путь, информация о файле)"""
+        self.failed = []
+        files, top_dirs = [], []
+        self._scan_dir(self.root, '', files, top_dirs)
+        yield from files
+
+        if not top_dirs:
+            return
+
+        results: queue.Queue = queue.Queue(maxsize=self.workers * 4)
+        stopped = threading.Event()
+        done = object()
+
+        def put(batch) -> bool:
+            while not stopped.is_set():
+                try:
+                    results.put(batch, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def walk(path, prefix):
+            try:
+                self._walk(path, prefix, put)
+            finally:
+                put(done)
+
+        executor = ThreadPoolExecutor(max_workers=min(self.workers, len(top_dirs)),
+                                      thread_name_prefix='local-scan')
+        try:
+            for path, prefix in top_dirs:
+                executor.submit(walk, path, prefix)
+            remaining = len(top_dirs)
+            while remaining:
+                batch = results.get()
+                if batch is done:
+                    remaining -= 1
+                else:
+                    yield from batch
+        finally:
+            # Потребитель мог прервать генератор - останавливаем потоки
+            stopped.set()
+            executor.shutdown(wait=True)
@@ -0,0 +1,180 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+from pathlib import PurePath
+from typing import List, Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Журнал передач (JSON lines) - отдельный логгер, в общий журнал не попадает
+TRANSFER_LOGGER = 'YandexDiskSync.transfers'
+
+# Аргументы, которые не меняются до записи: их можно форматировать позже
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None), PurePath, BaseException)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь без форматирования: текст сообщения собирается
+    в фоновом потоке журнала, а не в рабочем потоке синхронизации.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args and not (isinstance(args, tuple) and
+                         all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args)):
+            # Изменяемые аргументы могут поменяться до записи - фиксируем текст сразу
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class _BatchFlush:
+    """Буфер сбрасывается не после каждой записи, а после пачки (flush_batch)"""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class BatchRotatingFileHandler(_BatchFlush, RotatingFileHandler):
+    pass
+
+
+class BatchStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Запись журнала передач: одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'ts': round(record.created, 3)}
+        entry.update(getattr(record, 'transfer', None) or {'msg': record.getMessage()})
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class LogWriter:
+    """
+    Фоновый поток журнала: забирает из очереди всё накопившееся, форматирует,
+    пишет и сбрасывает буферы один раз на пачку. Проверки ротации файла
+    тоже выполняются здесь.
+    """
+
+    def __init__(self, log_queue: queue.Queue, handlers: List[logging.Handler],
+                 transfer_handler: Optional[logging.Handler] = None, batch_size: int = 512):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.transfer_handler = transfer_handler
+        self.batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+
+    def _all_handlers(self) -> List[logging.Handler]:
+        return self.handlers + ([self.transfer_handler] if self.transfer_handler else [])
+
+    def _handle(self, record: logging.LogRecord):
+        if record.name == TRANSFER_LOGGER:
+            handlers = [self.transfer_handler] if self.transfer_handler else []
+        else:
+            handlers = self.handlers
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for record in batch:
+                if record is None:
+                    stop = True
+                else:
+                    self._handle(record)
+            for handler in self._all_handlers():
+                try:
+                    handler.flush_batch()
+                except Exception:
+                    pass
+            if stop:
+                return
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Дописать очередь и закрыть файлы"""
+        self.queue.put(None)
+        self._thread.join(timeout=5)
+        for handler in self._all_handlers():
+            handler.close()
+
+
+_writer: Optional[LogWriter] = None
+_writer_lock = threading.Lock()
+_transfer_logger = logging.getLogger(TRANSFER_LOGGER)
+
+
+def start_log_writer(max_bytes: int, log_file: str, transfer_log: str = '') -> LogWriter:
+    """
+    Журнал через очередь: корневой логгер только ставит записи в очередь,
+    файл и консоль обслуживает фоновый поток (один раз на процесс).
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            return _writer
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [BatchRotatingFileHandler(log_file, maxBytes=max_bytes), BatchStreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        transfer_handler = None
+        if transfer_log:
+            transfer_handler = BatchRotatingFileHandler(transfer_log, maxBytes=max_bytes,
+                                                        backupCount=1, encoding='utf-8')
+            transfer_handler.setFormatter(JsonLinesFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.handlers = [queue_handler]
+        if transfer_handler:
+            _transfer_logger.handlers = [queue_handler]
+            _transfer_logger.setLevel(logging.INFO)
+        _transfer_logger.propagate = False
+
+        _writer = LogWriter(log_queue, handlers, transfer_handler)
+        _writer.start()
+        atexit.register(stop_log_writer)
+        return _writer
+
+
+def stop_log_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.stop()
+            _writer = None
+
+
+def log_transfer(op: str, path: str, ok: bool = True, **fields):
+    """Запись в журнал передач (JSON lines), если он включён (transfer_log)"""
+    if _transfer_logger.handlers:
+        _transfer_logger.info(op, extra={'transfer': dict(op=op, path=path, ok=ok, **fields)})
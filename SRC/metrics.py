@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+# Границы корзин гистограмм длительности, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Описания метрик для формата Prometheus: имя -> (тип, описание)
+METRIC_HELP = {
+    'ydsync_transferred_files_total': ('counter', 'Files transferred, by direction'),
+    'ydsync_transferred_bytes_total': ('counter', 'Bytes transferred, by direction'),
+    'ydsync_api_requests_total': ('counter', 'HTTP requests, by endpoint and status'),
+    'ydsync_api_request_seconds': ('histogram', 'HTTP request latency, by endpoint'),
+    'ydsync_api_retries_total': ('counter', 'Retried HTTP requests, by endpoint'),
+    'ydsync_transfer_retries_total': ('counter', 'Retried chunked transfers, by direction'),
+    'ydsync_operation_seconds': ('histogram', 'Sync operation latency, by operation'),
+    'ydsync_operation_errors_total': ('counter', 'Failed sync operations, by operation'),
+    'ydsync_event_seconds': ('histogram', 'Local event handling latency, by event type'),
+    'ydsync_scan_seconds': ('histogram', 'Scan duration, by side'),
+    'ydsync_full_sync_seconds': ('histogram', 'Full sync duration'),
+    'ydsync_echo_events_total': ('counter', 'Local events dropped as echoes of own writes'),
+    'ydsync_event_queue_depth': ('gauge', 'Pending local events'),
+    'ydsync_event_queue_age_seconds': ('gauge', 'Age of the oldest pending local event'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class Metrics:
+    """
+    Счётчики, гистограммы и показатели (gauge) процесса синхронизации.
+    Показатели вычисляются функциями в момент выгрузки метрик.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # [счётчики корзин..., сумма, количество]
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+        self._gauges: Dict[Tuple[str, Labels], Callable[[], float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Записать длительность блока в гистограмму name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def gauge(self, name: str, func: Callable[[], float], **labels):
+        """Зарегистрировать показатель, вычисляемый функцией"""
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = func
+
+    def remove_gauges(self, **labels):
+        """Убрать показатели с заданными метками (сервис остановлен)"""
+        wanted = set(_labels(labels))
+        with self._lock:
+            for key in [key for key in self._gauges if wanted <= set(key[1])]:
+                del self._gauges[key]
+
+    def _gauge_values(self) -> Dict[Tuple[str, Labels], float]:
+        with self._lock:
+            gauges = list(self._gauges.items())
+        values = {}
+        for key, func in gauges:
+            try:
+                values[key] = float(func())
+            except Exception:
+                continue
+        return values
+
+    def snapshot(self) -> dict:
+        """Все метрики в виде словаря (для JSON)"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+        result = {'time': time.time(), 'counters': [], 'histograms': [], 'gauges': []}
+        for (name, labels), value in sorted(counters.items()):
+            result['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+        for (name, labels), value in sorted(histograms.items()):
+            result['histograms'].append({
+                'name': name, 'labels': dict(labels), 'count': value[-1], 'sum': value[-2],
+                'buckets': dict(zip(map(str, self.buckets), value[:-2])),
+            })
+        for (name, labels), value in sorted(self._gauge_values().items()):
+            result['gauges'].append({'name': name, 'labels': dict(labels), 'value': value})
+        return result
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+        series: Dict[str, list] = {}
+        for (name, labels), value in sorted(counters.items()):
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), value in sorted(self._gauge_values().items()):
+            series.setdefault(name, []).append(f'{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), value in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(self.buckets, value[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", f"{bound:g}"))} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]:g}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+
+        out = []
+        for name in sorted(series):
+            kind, text = METRIC_HELP.get(name, ('untyped', name))
+            out.append(f'# HELP {name} {text}')
+            out.append(f'# TYPE {name} {kind}')
+            out.extend(series[name])
+        return '\n'.join(out) + '\n'
+
+
+# Метрики процесса: общие для всех пар синхронизации и HTTP-клиентов
+METRICS = Metrics()
+
+
+class MetricsExporter:
+    """
+    Выгрузка метрик: HTTP на 127.0.0.1 (/metrics - Prometheus, /metrics.json - JSON)
+    и/или периодическая запись JSON-снимка в файл.
+    """
+
+    def __init__(self, metrics: Metrics, logger, port: int = 0,
+                 snapshot_path: str = '', interval: float = 30):
+        self.metrics = metrics
+        self.logger = logger
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/metrics':
+                    body = metrics.render().encode()
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.rstrip('/') == '/metrics.json':
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def write_snapshot(self):
+        """Записать JSON-снимок (через временный файл, чтобы читатель не видел половину)"""
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.metrics.snapshot(), f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            self.logger.warning(f"Metrics snapshot error: {e}")
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write_snapshot()
+
+    def start(self):
+        if self.port:
+            try:
+                self._httpd = ThreadingHTTPServer(('127.0.0.1', self.port), self._handler())
+            except OSError as e:
+                self.logger.error(f"Metrics endpoint error on port {self.port}: {e}")
+            else:
+                self._httpd.daemon_threads = True
+                threading.Thread(target=self._httpd.serve_forever, name='metrics-http',
+                                 daemon=True).start()
+                self.logger.info(f"[METRICS] http://127.0.0.1:{self.port}/metrics")
+        if self.snapshot_path:
+            self._writer = threading.Thread(target=self._write_loop, name='metrics-snapshot',
+                                            daemon=True)
+            self._writer.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        if self.snapshot_path:
+            self.write_snapshot()
+
+
+_exporter: Optional[MetricsExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(config: dict, logger) -> Optional[MetricsExporter]:
+    """
+    Запустить выгрузку метрик по настройкам config.json (один раз на процесс;
+    при изменении настроек выгрузка перезапускается).
+    """
+    global _exporter
+    settings = (int(config.get('metrics_port', 0) or 0), config.get('metrics_snapshot', '') or '',
+                float(config.get('metrics_snapshot_interval', 30)))
+    with _exporter_lock:
+        if _exporter is not None:
+            if (_exporter.port, _exporter.snapshot_path, _exporter.interval) == settings:
+                return _exporter
+            _exporter.stop()
+            _exporter = None
+        if settings[0] or settings[1]:
+            _exporter = MetricsExporter(METRICS, logger, *settings)
+            _exporter.start()
+        return _exporter
+
+
+def stop_exporter():
+    """Остановить выгрузку (последний снимок записывается)"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is not None:
+            _exporter.stop()
+            _exporter = None
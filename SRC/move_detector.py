@@ -0,0 +1,82 @@
+from collections import defaultdict
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Отпечаток содержимого: (размер, хеш)
+Fingerprint = Tuple[int, Optional[str]]
+
+
+def pair_moves(disappeared: Dict[str, Fingerprint],
+               appeared: Dict[str, Fingerprint]) -> List[Tuple[str, str]]:
+    """
+    Сопоставляет исчезнувшие и появившиеся пути с одинаковым содержимым.
+    Файлы без хеша не сопоставляются. При нескольких кандидатах
+    предпочитается путь с тем же именем файла.
+    Возвращает список (старый путь, новый путь).
+    """
+    candidates: Dict[Fingerprint, List[str]] = defaultdict(list)
+    for path, fingerprint in appeared.items():
+        if fingerprint[1]:
+            candidates[fingerprint].append(path)
+
+    moves = []
+    for old_path, fingerprint in sorted(disappeared.items()):
+        paths = candidates.get(fingerprint)
+        if not fingerprint[1] or not paths:
+            continue
+        name = PurePosixPath(old_path).name
+        new_path = next((path for path in paths if PurePosixPath(path).name == name), paths[0])
+        paths.remove(new_path)
+        moves.append((old_path, new_path))
+    return moves
+
+
+def _split_common_tail(old_path: str, new_path: str) -> Optional[Tuple[str, str]]:
+    """'A/x/f', 'B/x/f' -> ('A', 'B'); None, если общего хвоста нет"""
+    old_parts = PurePosixPath(old_path).parts
+    new_parts = PurePosixPath(new_path).parts
+    tail = 0
+    while tail < min(len(old_parts), len(new_parts)) and \
+            old_parts[-1 - tail] == new_parts[-1 - tail]:
+        tail += 1
+    if tail == 0 or tail == len(old_parts) or tail == len(new_parts):
+        return None
+    return ('/'.join(old_parts[:len(old_parts) - tail]),
+            '/'.join(new_parts[:len(new_parts) - tail]))
+
+
+def _under(path: str, folder: str) -> bool:
+    return path.startswith(folder + '/')
+
+
+def collapse_moves(moves: List[Tuple[str, str]], source_paths: Iterable[str],
+                   target_paths: Iterable[str]) -> List[Tuple[str, str, List[Tuple[str, str]]]]:
+    """
+    Заменяет перемещения всех файлов папки одним перемещением папки.
+    source_paths - все известные пути на стороне, где выполняется перемещение,
+    target_paths - пути, которые там уже есть (новая папка должна быть свободна).
+    Возвращает список (старый путь, новый путь, перемещённые файлы).
+    """
+    groups: Dict[Tuple[str, str], List[Tuple[str, str]]] = defaultdict(list)
+    single = []
+    for old_path, new_path in moves:
+        folders = _split_common_tail(old_path, new_path)
+        if folders:
+            groups[folders].append((old_path, new_path))
+        else:
+            single.append((old_path, new_path))
+
+    source_paths = list(source_paths)
+    target_paths = list(target_paths)
+    result = []
+    for (old_dir, new_dir), pairs in groups.items():
+        moved = {old_path for old_path, _ in pairs}
+        whole_folder = all(path in moved for path in source_paths if _under(path, old_dir))
+        target_free = not any(_under(path, new_dir) or path == new_dir for path in target_paths)
+        if whole_folder and target_free:
+            result.append((old_dir, new_dir, pairs))
+        else:
+            single.extend(pairs)
+
+    result.extend((old_path, new_path, [(old_path, new_path)]) for old_path, new_path in single)
+    return result
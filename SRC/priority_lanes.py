@@ -0,0 +1,252 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+
+# Приоритеты задач: меньше - раньше
+INTERACTIVE = 0  # правки пользователя в локальной папке
+NORMAL = 1       # изменения на Яндекс.Диске
+BULK = 2         # план полной синхронизации
+
+LANES = ('metadata', 'small', 'large')
+
+# Приоритет текущей задачи asyncio (наследуется задачами, созданными из неё)
+current_priority: ContextVar[int] = ContextVar('ydsync_priority', default=BULK)
+
+
+def lane_workers(config: dict) -> Dict[str, int]:
+    """Число потоков каждой полосы по настройкам config.json"""
+    return {'metadata': int(config.get('metadata_workers', 2)),
+            'small': int(config.get('small_file_workers', 4)),
+            'large': int(config.get('large_file_workers', 1))}
+
+
+def lane_for(kind: str, size: Optional[int], large_threshold: int) -> str:
+    """
+    Полоса задачи: перемещения и удаления - metadata, передачи - small
+    или large по размеру файла (неизвестный размер - small).
+    """
+    if kind in ('deleted', 'moved', 'delete_remote', 'delete_local', 'move_remote', 'move_local'):
+        return 'metadata'
+    return 'large' if size is not None and size >= large_threshold else 'small'
+
+
+class Deferred(Exception):
+    """Задача полосы не может выполняться сейчас - вернуть её в очередь владельца"""
+
+
+def deadline(priority: int, aging: float) -> float:
+    """
+    Ключ очереди: время постановки плюс задержка за приоритет. Задача с низким
+    приоритетом, прождав aging секунд на каждую ступень, обгоняет новые
+    приоритетные задачи, поэтому никто не ждёт бесконечно.
+    """
+    return time.monotonic() + priority * aging
+
+
+class LaneScheduler:
+    """
+    Полосы задач со своими потоками: большая передача занимает только
+    полосу large, а правки небольших файлов идут по small. Внутри полосы
+    у каждого владельца (пары синхронизации) своя очередь по deadline,
+    потоки берут задачи владельцев по кругу, поэтому под SyncManager
+    одни полосы делят все пары. Задачи одного ключа (пути) выполняются
+    по очереди, в порядке постановки. Задачи приостановленного владельца
+    (пара на полной синхронизации) ждут в очереди, не занимая потоки.
+    """
+
+    def __init__(self, logger, workers: Dict[str, int], aging: float = 30.0):
+        self.logger = logger
+        self.aging = aging
+        self._cond = threading.Condition()
+        # полоса -> владелец -> куча задач
+        self._heaps: Dict[str, 'OrderedDict[str, list]'] = {lane: OrderedDict() for lane in LANES}
+        self._seq = itertools.count()
+        # (владелец, ключ) -> задачи, ждущие завершения предыдущей задачи того же ключа
+        self._keys: Dict[Tuple[str, Hashable], Deque[tuple]] = {}
+        self._paused: Set[str] = set()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, args=(lane,), name=f'yd-{lane}-{i}', daemon=True)
+            for lane in LANES for i in range(max(1, int(workers.get(lane, 1))))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return sum(len(heap) for owners in self._heaps.values() for heap in owners.values()) + \
+                sum(len(waiting) for waiting in self._keys.values())
+
+    def submit(self, lane: str, priority: int, func: Callable[[], object],
+               key: Optional[Hashable] = None, owner: str = '') -> Future:
+        future = Future()
+        if key is not None:
+            key = (owner, key)
+        job = (lane, deadline(priority, self.aging), next(self._seq), owner, future, func, key)
+        with self._cond:
+            if self._closed:
+                future.cancel()
+                return future
+            if key is not None:
+                if key in self._keys:
+                    self._keys[key].append(job)
+                    return future
+                self._keys[key] = deque()
+            self._push(job)
+        return future
+
+    def _push(self, job: tuple):
+        lane, when, seq, owner = job[:4]
+        heapq.heappush(self._heaps[lane].setdefault(owner, []), (when, seq, job))
+        self._cond.notify_all()
+
+    def _ready_owner(self, lane: str) -> Optional[str]:
+        return next((owner for owner in self._heaps[lane] if owner not in self._paused), None)
+
+    def _next(self, lane: str) -> Optional[tuple]:
+        owners = self._heaps[lane]
+        with self._cond:
+            owner = self._ready_owner(lane)
+            while owner is None and not self._closed:
+                self._cond.wait()
+                owner = self._ready_owner(lane)
+            if self._closed:
+                return None
+            # Владелец, задачу которого взяли, уходит в конец очереди
+            heap = owners.pop(owner)
+            job = heapq.heappop(heap)[2]
+            if heap:
+                owners[owner] = heap
+            return job
+
+    def _done(self, key: Optional[Hashable]):
+        if key is None:
+            return
+        with self._cond:
+            waiting = self._keys.get(key)
+            if waiting:
+                self._push(waiting.popleft())
+            else:
+                self._keys.pop(key, None)
+
+    def _work(self, lane: str):
+        while True:
+            job = self._next(lane)
+            if job is None:
+                return
+            future, func, key = job[4:]
+            if future.cancelled():
+                self._done(key)
+                continue
+            try:
+                result, error = func(), None
+            except Deferred:
+                # Ключ остаётся занят этой задачей - порядок задач пути сохраняется
+                with self._cond:
+                    self._push(job)
+                continue
+            except Exception as e:
+                self.logger.error(f"Task ERROR: {e}")
+                result, error = None, e
+            try:
+                if future.set_running_or_notify_cancel():
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        future.set_exception(error)
+            finally:
+                self._done(key)
+
+    def pause(self, owner: str):
+        """Не выдавать задачи владельца потокам до resume"""
+        with self._cond:
+            self._paused.add(owner)
+
+    def resume(self, owner: str):
+        with self._cond:
+            self._paused.discard(owner)
+            self._cond.notify_all()
+
+    @contextmanager
+    def paused(self, owner: str):
+        self.pause(owner)
+        try:
+            yield
+        finally:
+            self.resume(owner)
+
+    def cancel(self, owner: str):
+        """Отменить ждущие задачи владельца (остановка одной пары)"""
+        with self._cond:
+            for owners in self._heaps.values():
+                for _, _, job in owners.pop(owner, ()):
+                    job[4].cancel()
+            for key in [key for key in self._keys if key[0] == owner]:
+                for job in self._keys.pop(key):
+                    job[4].cancel()
+
+    def close(self):
+        """Отменить ждущие задачи и дождаться потоков"""
+        with self._cond:
+            self._closed = True
+            for owners in self._heaps.values():
+                for heap in owners.values():
+                    for _, _, job in heap:
+                        job[4].cancel()
+                owners.clear()
+            for waiting in self._keys.values():
+                for job in waiting:
+                    job[4].cancel()
+            self._keys.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+
+class PrioritySemaphore:
+    """
+    Семафор asyncio, который отдаёт освободившееся место ждущему с наименьшим
+    deadline (приоритет - из current_priority, со старением).
+    """
+
+    def __init__(self, value: int, aging: float = 30.0):
+        self._value = value
+        self.aging = aging
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    async def acquire(self):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (deadline(current_priority.get(), self.aging),
+                                       next(self._seq), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Место уже отдано этой задаче - возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)[2]
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self._value += 1
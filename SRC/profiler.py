@@ -0,0 +1,210 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+# Пустой участок: при выключенном профилировании span ничего не делает
+_NULL_SPAN = nullcontext()
+
+
+class SpanRecorder:
+    """
+    Длительность именованных участков синхронизации (сканирование, сравнение,
+    передачи, события). Записывает только во время сеанса профилирования.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        # имя -> [количество, сумма, максимум]
+        self._spans: Dict[str, list] = {}
+        # Профилировщики рабочих потоков (режим cprofile)
+        self._thread_profiles: Optional[List[cProfile.Profile]] = None
+        self._local = threading.local()
+
+    def span(self, name: str, profile_thread: bool = False):
+        """
+        Участок кода с именем name. profile_thread - профилировать поток
+        на время участка (задачи пула передач).
+        """
+        if not self.active:
+            return _NULL_SPAN
+        return self._span(name, profile_thread)
+
+    @contextmanager
+    def _span(self, name: str, profile_thread: bool):
+        profile = None
+        if profile_thread and self._thread_profiles is not None and \
+                not getattr(self._local, 'profiled', False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Другой профилировщик уже активен (Python 3.12+)
+                profile = None
+            else:
+                self._local.profiled = True
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+                self._local.profiled = False
+                with self._lock:
+                    if self._thread_profiles is not None:
+                        self._thread_profiles.append(profile)
+            with self._lock:
+                stats = self._spans.get(name)
+                if stats is None:
+                    stats = self._spans[name] = [0, 0.0, 0.0]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+    def begin(self, profile_threads: bool):
+        with self._lock:
+            self._spans = {}
+            self._thread_profiles = [] if profile_threads else None
+        self.active = True
+
+    def end(self):
+        self.active = False
+        with self._lock:
+            spans, self._spans = self._spans, {}
+            profiles, self._thread_profiles = self._thread_profiles or [], None
+        return spans, profiles
+
+
+class StackSampler:
+    """
+    Выборочный профилировщик: раз в interval секунд снимает стеки всех потоков.
+    Результат - свёрнутые стеки (формат flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                                 f':{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def format_spans(spans: Dict[str, list], wall: float) -> str:
+    """Таблица участков: количество, сумма, среднее, максимум, доля от общего времени"""
+    lines = [f'wall time {wall:.3f} s (parallel spans overlap, shares may exceed 100%)',
+             f'{"phase":<28} {"count":>7} {"total s":>10} {"mean ms":>10} '
+             f'{"max ms":>10} {"share":>7}']
+    for name, (count, total, longest) in sorted(spans.items(), key=lambda item: -item[1][1]):
+        share = total / wall * 100 if wall else 0
+        lines.append(f'{name:<28} {count:>7} {total:>10.3f} {total / count * 1000:>10.1f} '
+                     f'{longest * 1000:>10.1f} {share:>6.1f}%')
+    return '\n'.join(lines)
+
+
+class ProfileSession:
+    """
+    Профилирование одного прогона: участки SpanRecorder и cProfile
+    (вызывающий поток и задачи передач) или выборка стеков всех потоков.
+    Результат - файл профиля и таблица участков в папке directory.
+    """
+
+    def __init__(self, recorder: SpanRecorder, logger, mode: str = 'cprofile',
+                 directory: str = '.', label: str = 'ydsync'):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.recorder = recorder
+        self.logger = logger
+        self.mode = mode
+        self.directory = directory or '.'
+        self.label = label
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[StackSampler] = None
+        self._started = 0.0
+
+    def __enter__(self):
+        self.recorder.begin(profile_threads=self.mode == 'cprofile')
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError as e:
+                self.logger.warning(f"[PROFILE] cProfile unavailable: {e}")
+                self._profile = None
+            else:
+                self.recorder._local.profiled = True
+        else:
+            self._sampler = StackSampler()
+            self._sampler.start()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+            self.recorder._local.profiled = False
+        if self._sampler is not None:
+            self._sampler.stop()
+        spans, thread_profiles = self.recorder.end()
+
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f'{self.label}-{time.strftime("%Y%m%d-%H%M%S")}')
+        try:
+            if self._sampler is not None:
+                profile_path = base + '.folded'
+                self._sampler.dump(profile_path)
+            else:
+                profiles = [p for p in [self._profile] + thread_profiles if p is not None]
+                profile_path = base + '.prof'
+                if profiles:
+                    stats = pstats.Stats(profiles[0])
+                    for profile in profiles[1:]:
+                        stats.add(profile)
+                    stats.dump_stats(profile_path)
+            report = format_spans(spans, wall)
+            with open(base + '-phases.txt', 'w', encoding='utf-8') as f:
+                f.write(report + '\n')
+        except OSError as e:
+            self.logger.error(f"[PROFILE] Write error: {e}")
+            return False
+
+        self.logger.info(f"[PROFILE] {profile_path}\n{report}")
+        return False
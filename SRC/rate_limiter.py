@@ -0,0 +1,109 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+# Ответы, после которых запрос повторяется
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Ответы-признаки перегрузки: число одновременных запросов уменьшается
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Заголовок Retry-After (секунды или дата) -> секунды ожидания"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class RateLimiter:
+    """
+    Общий для всех потоков ограничитель запросов к API.
+    Корзина токенов задаёт частоту запросов; допустимое число одновременных
+    запросов подстраивается по AIMD: растёт на единицу за каждое «окно»
+    успешных ответов и уменьшается вдвое при 429/503.
+    Ответ 429 (и Retry-After) приостанавливает все запросы.
+    """
+
+    def __init__(self, rate: float = 20, burst: float = 40, max_concurrency: int = 16,
+                 base_delay: float = 0.5, max_delay: float = 60):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.concurrency = float(self.max_concurrency)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._active = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> float:
+        """Занять токен и место; 0 - занято, иначе - сколько подождать"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._active >= int(self.concurrency):
+                return 0.05
+            if self.rate > 0:
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens < 1:
+                    return (1 - self._tokens) / self.rate
+                self._tokens -= 1
+            self._active += 1
+            return 0
+
+    def acquire(self):
+        """Дождаться разрешения на запрос (после него - release)"""
+        while True:
+            delay = self._try_acquire()
+            if not delay:
+                return
+            time.sleep(min(delay, 1.0))
+
+    async def acquire_async(self):
+        while True:
+            delay = self._try_acquire()
+            if not delay:
+                return
+            await asyncio.sleep(min(delay, 1.0))
+
+    def release(self, status: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        Запрос завершён с кодом status (None - ошибка соединения).
+        Успех увеличивает допустимое число запросов, перегрузка - уменьшает.
+        """
+        with self._lock:
+            self._active -= 1
+            if status is not None and status < 500 and status not in THROTTLE_STATUSES:
+                self.concurrency = min(self.max_concurrency,
+                                       self.concurrency + 1 / self.concurrency)
+                return
+
+            now = time.monotonic()
+            # Одновременные отказы - одна перегрузка, а не несколько
+            if status in THROTTLE_STATUSES and now - self._last_decrease > 1.0:
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self._last_decrease = now
+            if status == 429 or retry_after:
+                pause = retry_after if retry_after else self.backoff(0)
+                self._paused_until = max(self._paused_until, now + min(pause, self.max_delay))
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Пауза перед повтором: экспоненциальная со случайным разбросом"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, min(retry_after or 0, self.max_delay))
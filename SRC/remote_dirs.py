@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Iterable, Set
+
+from yadisk.exceptions import (DirectoryExistsError, ParentNotFoundError, RequestError,
+                               RetriableYaDiskError)
+
+# Повторы mkdir после 5xx и обрыва: сессия их не повторяет (запрос мог выполниться),
+# а здесь "папка уже есть" - тоже успех
+MKDIR_RETRIES = 3
+MKDIR_RETRY_DELAY = 0.5
+
+
+def _ancestors(remote_dir: str) -> list:
+    """'a/b/c' -> ['a', 'a/b', 'a/b/c']"""
+    parts = [part for part in remote_dir.strip('/').split('/') if part]
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class RemoteDirCache:
+    """
+    Потокобезопасный кэш папок, которые точно есть на Яндекс.Диске.
+    Недостающие папки создаются один раз, сверху вниз.
+    """
+
+    def __init__(self, disk, logger):
+        self.disk = disk
+        self.logger = logger
+        self._known: Set[str] = set()
+        self._lock = threading.Lock()
+        self._mkdir_lock = threading.Lock()
+
+    def __contains__(self, remote_dir: str) -> bool:
+        with self._lock:
+            return remote_dir.strip('/') in self._known
+
+    def reset(self, remote_dirs: Iterable[str]):
+        """Заполнить кэш папками, найденными сканированием (с их предками)"""
+        known = set()
+        for remote_dir in remote_dirs:
+            remote_dir = remote_dir.strip('/')
+            if remote_dir and remote_dir not in known:
+                known.update(_ancestors(remote_dir))
+        with self._lock:
+            self._known = known
+
+    def add(self, remote_dir: str):
+        with self._lock:
+            self._known.update(_ancestors(remote_dir))
+
+    def forget(self, remote_dir: str):
+        """Папка (со всеми вложенными) удалена или её больше нельзя считать существующей"""
+        remote_dir = remote_dir.strip('/')
+        prefix = remote_dir + '/'
+        with self._lock:
+            self._known = {path for path in self._known
+                           if path != remote_dir and not path.startswith(prefix)}
+
+    def move(self, old_dir: str, new_dir: str):
+        old_dir, new_dir = old_dir.strip('/'), new_dir.strip('/')
+        prefix = old_dir + '/'
+        with self._lock:
+            moved = {path for path in self._known if path == old_dir or path.startswith(prefix)}
+            self._known -= moved
+            self._known.update(new_dir + path[len(old_dir):] for path in moved)
+            self._known.update(_ancestors(new_dir))
+
+    def ensure(self, remote_dir: str):
+        """Создать папку и недостающих предков; известные папки не запрашиваются"""
+        try:
+            self._ensure(remote_dir)
+        except ParentNotFoundError:
+            # Кто-то из "известных" предков удалён на диске - проверяем цепочку заново
+            with self._lock:
+                self._known.difference_update(_ancestors(remote_dir))
+            self._ensure(remote_dir)
+
+    def _ensure(self, remote_dir: str):
+        for path in _ancestors(remote_dir):
+            with self._lock:
+                if path in self._known:
+                    continue
+            with self._mkdir_lock:
+                with self._lock:
+                    if path in self._known:
+                        continue
+                self._mkdir(path)
+                with self._lock:
+                    self._known.add(path)
+
+    def _mkdir(self, path: str):
+        for attempt in range(MKDIR_RETRIES + 1):
+            try:
+                self.disk.mkdir(path)
+                self.logger.debug("[MKDIR] Yandex.Disk: %s", path)
+                return
+            except DirectoryExistsError:
+                return
+            except (RetriableYaDiskError, RequestError) as e:
+                if attempt == MKDIR_RETRIES:
+                    raise
+                self.logger.debug("[MKDIR] retry %s: %s", path, e)
+                time.sleep(MKDIR_RETRY_DELAY * 2 ** attempt)
+
+    def ensure_many(self, remote_dirs: Iterable[str]):
+        """Создать все нужные папки заранее, перед передачами"""
+        for remote_dir in sorted(set(remote_dirs), key=lambda path: path.count('/')):
+            self.ensure(remote_dir)
@@ -0,0 +1,147 @@
+import posixpath
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from yadisk.exceptions import PathNotFoundError
+
+from SRC.remote_scanner import RESOURCE_FIELDS, file_info
+
+
+def folders_of(paths: Iterable[str]) -> set:
+    """Все папки (с предками), в которых лежат файлы; '' - корень"""
+    folders = {''}
+    for path in paths:
+        folder = posixpath.dirname(path)
+        while folder and folder not in folders:
+            folders.add(folder)
+            folder = posixpath.dirname(folder)
+    return folders
+
+
+class RemoteMetaCache:
+    """
+    Кэш метаданных файлов Яндекс.Диска с временем жизни.
+    Устаревшая папка обновляется одним листингом родителя,
+    а не запросом get_meta на каждый файл.
+    """
+
+    def __init__(self, disk, logger, remote_root: str, ttl: float = 60, page_size: int = 1000):
+        self.disk = disk
+        self.logger = logger
+        self.remote_root = remote_root.strip('/')
+        self.ttl = ttl
+        self.page_size = page_size
+        # папка -> {путь файла: информация}: обновление папки не перебирает весь кэш
+        self._folders: Dict[str, Dict[str, dict]] = {}
+        self._listed: Dict[str, float] = {}
+        self._folder_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, folder: str) -> bool:
+        listed = self._listed.get(folder)
+        return listed is not None and time.monotonic() - listed < self.ttl
+
+    def _remote_folder(self, folder: str) -> str:
+        return f"{self.remote_root}/{folder}" if folder else self.remote_root
+
+    def _file(self, relative_path: str) -> Optional[dict]:
+        return self._folders.get(posixpath.dirname(relative_path), {}).get(relative_path)
+
+    def _subfolders(self, relative_path: str) -> list:
+        """Папка relative_path и все вложенные в неё папки кэша"""
+        prefix = relative_path + '/'
+        return [folder for folder in self._folders
+                if folder == relative_path or folder.startswith(prefix)]
+
+    def seed(self, files: Dict[str, dict]):
+        """Заполнить кэш результатом полного сканирования"""
+        now = time.monotonic()
+        folders: Dict[str, Dict[str, dict]] = {}
+        for path, info in files.items():
+            folders.setdefault(posixpath.dirname(path), {})[path] = info
+        with self._lock:
+            self._folders = folders
+            self._listed = dict.fromkeys(folders_of(files), now)
+
+    def get(self, relative_path: str) -> Optional[dict]:
+        """Информация о файле; None - файла на диске нет"""
+        folder = posixpath.dirname(relative_path)
+        with self._lock:
+            if self._fresh(folder):
+                return self._file(relative_path)
+            folder_lock = self._folder_locks.setdefault(folder, threading.Lock())
+
+        # Одновременные запросы к одной папке ждут один листинг
+        with folder_lock:
+            with self._lock:
+                if self._fresh(folder):
+                    return self._file(relative_path)
+            try:
+                self._refresh(folder)
+            except Exception as e:
+                self.logger.debug("Ошибка получения информации о %s: %s", relative_path, e)
+        with self._lock:
+            return self._file(relative_path)
+
+    def peek(self, relative_path: str) -> Tuple[bool, Optional[dict]]:
+        """Ответ без запросов к диску: (папка актуальна, информация о файле)"""
+        with self._lock:
+            if self._fresh(posixpath.dirname(relative_path)):
+                return True, self._file(relative_path)
+        return False, None
+
+    def _refresh(self, folder: str):
+        """Перечитать файлы папки одним листингом"""
+        try:
+            listed = [(posixpath.join(folder, item['name']), file_info(item))
+                      for item in self.disk.listdir(self._remote_folder(folder),
+                                                    limit=self.page_size,
+                                                    fields=RESOURCE_FIELDS + ('name',))
+                      if item['type'] == 'file']
+        except PathNotFoundError:
+            listed = []
+        self._replace(folder, listed)
+
+    def _replace(self, folder: str, listed: Iterable[Tuple[str, dict]]):
+        files = dict(listed)
+        with self._lock:
+            if files:
+                self._folders[folder] = files
+            else:
+                self._folders.pop(folder, None)
+            self._listed[folder] = time.monotonic()
+
+    def put(self, relative_path: str, info: dict):
+        """Файл записан на диск этим процессом"""
+        with self._lock:
+            self._folders.setdefault(posixpath.dirname(relative_path), {})[relative_path] = info
+
+    def drop(self, relative_path: str, is_dir: bool = False):
+        """Файл (или папка со всем содержимым) удалён на диске"""
+        with self._lock:
+            if is_dir:
+                for folder in self._subfolders(relative_path):
+                    del self._folders[folder]
+                return
+            files = self._folders.get(posixpath.dirname(relative_path))
+            if files is not None:
+                files.pop(relative_path, None)
+
+    def move(self, old_path: str, new_path: str, is_dir: bool = False):
+        with self._lock:
+            if is_dir:
+                for folder in self._subfolders(old_path):
+                    files = self._folders.pop(folder)
+                    self._folders.setdefault(new_path + folder[len(old_path):], {}).update(
+                        (new_path + path[len(old_path):], info) for path, info in files.items())
+                return
+            files = self._folders.get(posixpath.dirname(old_path))
+            if files is not None and old_path in files:
+                self._folders.setdefault(posixpath.dirname(new_path), {})[new_path] = \
+                    files.pop(old_path)
+
+    def invalidate(self, relative_path: str):
+        """Считать папку файла устаревшей - следующий запрос перечитает её"""
+        with self._lock:
+            self._listed.pop(posixpath.dirname(relative_path), None)
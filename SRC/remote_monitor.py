@@ -0,0 +1,197 @@
+import posixpath
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from yadisk.exceptions import PathNotFoundError
+
+from SRC.move_detector import pair_moves
+from SRC.remote_meta import folders_of
+from SRC.remote_scanner import RESOURCE_FIELDS, file_info
+from SRC.utils import to_timestamp
+
+# Изменение: (change_type, path, dest), dest заполнен только для 'moved'
+Change = Tuple[str, str, Optional[str]]
+
+
+def remote_changed(old: dict, new: dict) -> bool:
+    """Изменился ли файл на Яндекс.Диске"""
+    if old['size'] != new['size']:
+        return True
+    if old.get('md5') and new.get('md5'):
+        return old['md5'] != new['md5']
+    return to_timestamp(old.get('modified')) != to_timestamp(new.get('modified'))
+
+
+class RemoteChangeDetector:
+    """
+    Обнаружение изменений на Яндекс.Диске.
+    Между редкими полными сканированиями используется дешёвая проверка:
+    список последних загруженных файлов, дата изменения корневой папки
+    и, по кругу, probe_folders вложенных папок за опрос. Удаление или
+    переименование в папке меняет её дату, поэтому вложенные изменения
+    видны не позже чем через (число папок / probe_folders) опросов,
+    а не только при полном сканировании раз в full_scan_interval.
+    Интервал опроса растёт, пока на диске ничего не меняется,
+    и сбрасывается до минимального после изменений.
+    """
+
+    def __init__(self, disk, logger, remote_root: str,
+                 relative_path: Callable[[str], str],
+                 scan: Callable[[], Dict[str, dict]],
+                 state: Dict[str, dict], state_lock: threading.Lock,
+                 min_interval: float = 5, max_interval: float = 60,
+                 full_scan_interval: float = 600, probe_limit: int = 20,
+                 probe_folders: int = 20):
+        self.disk = disk
+        self.logger = logger
+        self.remote_root = remote_root.strip('/')
+        self.relative_path = relative_path
+        self.scan = scan
+        self.state = state
+        self.state_lock = state_lock
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.full_scan_interval = full_scan_interval
+        self.probe_limit = probe_limit
+        self.probe_folders = probe_folders
+
+        self.interval = min_interval
+        self._last_full_scan = 0.0
+        self._root_modified: Optional[float] = None
+        self._need_full_scan = True
+        # Вложенные папки известных файлов, проверяемые по кругу, и их даты изменения
+        self._folders: List[str] = []
+        self._folder_modified: Dict[str, float] = {}
+        self._next_folder = 0
+
+    def seed(self):
+        """Состояние только что получено полной синхронизацией"""
+        self._last_full_scan = time.monotonic()
+        self._need_full_scan = False
+        self._root_modified = self._probe_root()
+        self._watch_folders()
+        self.interval = self.min_interval
+
+    def request_full_scan(self):
+        self._need_full_scan = True
+
+    def poll(self) -> List[Change]:
+        """Возвращает список изменений (change_type, path, dest)"""
+        if self._need_full_scan or \
+                time.monotonic() - self._last_full_scan >= self.full_scan_interval:
+            changes = self._full_scan()
+        else:
+            changes = self._probe()
+
+        if changes or self._need_full_scan:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        return changes
+
+    def _full_scan(self) -> List[Change]:
+        """Полное сканирование и сравнение с известным состоянием"""
+        current = self.scan()
+        self._last_full_scan = time.monotonic()
+        self._need_full_scan = False
+
+        changes = []
+        with self.state_lock:
+            deleted = {path: (self.state[path]['size'], self.state[path].get('md5'))
+                       for path in self.state.keys() - current.keys()}
+            created = {path: (current[path]['size'], current[path].get('md5'))
+                       for path in current.keys() - self.state.keys()}
+            for path, info in current.items():
+                last = self.state.get(path)
+                if last is not None and remote_changed(last, info):
+                    changes.append(('modified', path, None))
+            self.state.clear()
+            self.state.update(current)
+        self._watch_folders()
+
+        # Удалённый и появившийся файл с тем же содержимым - это перемещение
+        for old_path, new_path in pair_moves(deleted, created):
+            del deleted[old_path]
+            del created[new_path]
+            changes.append(('moved', old_path, new_path))
+        changes.extend(('deleted', path, None) for path in deleted)
+        changes.extend(('created', path, None) for path in created)
+        return changes
+
+    def _watch_folders(self):
+        """Обновить список проверяемых папок по известному состоянию"""
+        with self.state_lock:
+            folders = folders_of(self.state)
+        folders.discard('')
+        self._folders = sorted(folders)
+        self._folder_modified = {folder: modified for folder, modified
+                                 in self._folder_modified.items() if folder in folders}
+        self._next_folder = 0
+
+    def _probe_folders(self):
+        """
+        Очередная порция вложенных папок. Первая проверка папки запоминает
+        её дату, изменённая или исчезнувшая папка - повод для полного сканирования.
+        """
+        end = self._next_folder + self.probe_folders
+        batch = self._folders[self._next_folder:end]
+        self._next_folder = end if end < len(self._folders) else 0
+        for folder in batch:
+            try:
+                meta = self.disk.get_meta(posixpath.join(self.remote_root, folder),
+                                          fields=['modified'])
+            except PathNotFoundError:
+                self._need_full_scan = True
+                return
+            except Exception as e:
+                self.logger.debug("Remote folder probe error %s: %s", folder, e)
+                continue
+            modified = to_timestamp(meta['modified'])
+            last = self._folder_modified.get(folder)
+            self._folder_modified[folder] = modified
+            if last is not None and last != modified:
+                self._need_full_scan = True
+                return
+
+    def _probe_root(self) -> Optional[float]:
+        try:
+            meta = self.disk.get_meta(self.remote_root, fields=['modified'])
+            return to_timestamp(meta['modified'])
+        except Exception as e:
+            self.logger.debug("Remote root probe error: %s", e)
+            return None
+
+    def _probe(self) -> List[Change]:
+        """Дешёвая проверка: последние загруженные файлы, корневая и вложенные папки"""
+        changes = []
+        prefix = f"/{self.remote_root}/" if self.remote_root else '/'
+        fields = ['items.' + field for field in RESOURCE_FIELDS]
+        for item in self.disk.get_last_uploaded(limit=self.probe_limit, fields=fields):
+            path = item['path']
+            if path.startswith('disk:'):
+                path = path[5:]
+            if not path.startswith(prefix) or item['type'] != 'file':
+                continue
+            rel = self.relative_path(item['path'])
+            info = file_info(item)
+            with self.state_lock:
+                last = self.state.get(rel)
+                if last is None:
+                    changes.append(('created', rel, None))
+                elif remote_changed(last, info):
+                    changes.append(('modified', rel, None))
+                else:
+                    continue
+                self.state[rel] = info
+
+        # Удаления и переименования видны только по дате изменения папки
+        root_modified = self._probe_root()
+        if root_modified is not None and root_modified != self._root_modified:
+            if self._root_modified is not None:
+                self._need_full_scan = True
+            self._root_modified = root_modified
+        if not self._need_full_scan:
+            self._probe_folders()
+
+        return changes
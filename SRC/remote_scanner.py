@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from yadisk.exceptions import PathNotFoundError
+
+from SRC.ignore_rules import IgnoreRules
+
+# Поля ресурса, которые нужны для синхронизации
+RESOURCE_FIELDS = ('path', 'type', 'size', 'modified', 'md5', 'sha256')
+
+
+def file_info(item) -> dict:
+    """Информация о файле из ресурса Яндекс.Диска"""
+    return {
+        'size': item['size'],
+        'modified': item['modified'],
+        # Объекты yadisk не поддерживают .get(), отсутствующее поле - None
+        'md5': item['md5'],
+        'sha256': item['sha256'],
+        'type': 'file'
+    }
+
+
+class RemoteScanError(Exception):
+    """Сканирование Яндекс.Диска завершилось не полностью"""
+
+
+class RemoteScanner:
+    """
+    Потоковое сканирование файлов на Яндекс.Диске.
+    Сначала используется плоский список всех файлов диска (большие страницы,
+    только нужные поля), при ошибке - параллельный обход папок в ширину.
+    """
+
+    def __init__(self, disk, logger, remote_root: str,
+                 relative_path: Callable[[str], str],
+                 page_size: int = 1000, max_listings: int = 8, flat: bool = True,
+                 ignore: Optional[IgnoreRules] = None):
+        self.disk = disk
+        self.logger = logger
+        self.remote_root = remote_root.strip('/')
+        self.relative_path = relative_path
+        self.page_size = page_size
+        self.max_listings = max(1, max_listings)
+        self.flat = flat
+        self.ignore = ignore
+
+    def scan(self) -> Iterator[Tuple[str, dict]]:
+        """Генератор пар (относительный путь, информация о файле)"""
+        if self.flat:
+            try:
+                yield from self._scan_flat()
+                return
+            except Exception as e:
+                self.logger.warning(f"Flat remote scan failed, walking folders: {e}")
+        yield from self._scan_tree()
+
+    def _scan_flat(self) -> Iterator[Tuple[str, dict]]:
+        """Плоский список файлов диска с фильтром по папке синхронизации"""
+        prefix = f"/{self.remote_root}/" if self.remote_root else '/'
+        fields = ['items.' + field for field in RESOURCE_FIELDS]
+        for item in self.disk.get_files(limit=self.page_size, fields=fields):
+            path = item['path']
+            if path.startswith('disk:'):
+                path = path[5:]
+            if path.startswith(prefix):
+                relative_path = self.relative_path(item['path'])
+                if not (self.ignore and self.ignore.match(relative_path)):
+                    yield relative_path, file_info(item)
+
+    def _list(self, remote_path: str) -> List:
+        return list(self.disk.listdir(remote_path, limit=self.page_size,
+                                      fields=RESOURCE_FIELDS))
+
+    def _scan_tree(self) -> Iterator[Tuple[str, dict]]:
+        """Параллельный обход папок с ограничением числа одновременных запросов"""
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.max_listings,
+                                thread_name_prefix='yd-scan') as executor:
+            futures = {executor.submit(self._list, self.remote_root): self.remote_root}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    remote_path = futures.pop(future)
+                    try:
+                        items = future.result()
+                    except PathNotFoundError:
+                        if remote_path != self.remote_root:
+                            failed.append(remote_path)
+                        continue
+                    except Exception as e:
+                        self.logger.error(f"Scan ERROR {remote_path}: {e}")
+                        failed.append(remote_path)
+                        continue
+
+                    for item in items:
+                        relative_path = self.relative_path(item['path'])
+                        is_dir = item['type'] == 'dir'
+                        # В исключённые папки не заходим
+                        if self.ignore and self.ignore.match_entry(relative_path, is_dir):
+                            continue
+                        if item['type'] == 'file':
+                            yield relative_path, file_info(item)
+                        elif is_dir:
+                            futures[executor.submit(self._list, item['path'])] = item['path']
+
+        if failed:
+            raise RemoteScanError(f"{len(failed)} folders were not listed")
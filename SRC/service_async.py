@@ -0,0 +1,555 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+import httpx
+from yadisk import AsyncClient
+from yadisk.exceptions import ParentNotFoundError, PathNotFoundError, RequestError
+from yadisk.sessions.async_httpx_session import (AsyncHTTPXResponse, AsyncHTTPXSession,
+                                                 convert_args_for_httpx, convert_httpx_exception)
+
+from SRC.http_client import (api_request, idempotent, record_request, replayable,
+                              request_endpoint, should_retry)
+from SRC.log_pipeline import log_transfer
+from SRC.metrics import METRICS
+from SRC.priority_lanes import INTERACTIVE, NORMAL, PrioritySemaphore, current_priority
+from SRC.rate_limiter import RateLimiter, parse_retry_after
+from SRC.service_new import TwoWayYandexDiskSync
+from SRC.utils import to_timestamp
+
+
+class _LimitedAsyncSession(AsyncHTTPXSession):
+    """Асинхронная сессия с тем же RateLimiter и повторами, что и у потоков"""
+
+    def __init__(self, limiter: RateLimiter, retries: int, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.retries = retries
+
+    async def _send(self, method, url, **kwargs) -> Tuple[AsyncHTTPXResponse, httpx.Response]:
+        """Запрос, как в AsyncHTTPXSession, но с исходным ответом httpx (нужны заголовки)"""
+        request_kwargs, send_kwargs = convert_args_for_httpx(self.httpx_session, kwargs)
+        try:
+            request = self.httpx_session.build_request(method, url, **request_kwargs)
+            raw = await self.httpx_session.send(request, **send_kwargs)
+        except httpx.HTTPError as e:
+            raise convert_httpx_exception(e) from e
+        return AsyncHTTPXResponse(raw), raw
+
+    async def send_request(self, method, url, **kwargs):
+        attempts = self.retries + 1 if replayable(kwargs.get('data')) else 1
+        safe = idempotent(method, kwargs.get('params'))
+        endpoint = request_endpoint(url)
+        limited = api_request(url)
+        for attempt in range(attempts):
+            last = attempt + 1 >= attempts
+            if limited:
+                await self.limiter.acquire_async()
+            started = time.perf_counter()
+            try:
+                response, raw = await self._send(method, url, **kwargs)
+            except (RequestError, httpx.HTTPError):
+                retry = should_retry(None, safe) and not last
+                record_request(endpoint, method, 'error', started, retry=retry)
+                if limited:
+                    self.limiter.release(None)
+                if not retry:
+                    raise
+                await asyncio.sleep(self.limiter.backoff(attempt))
+                continue
+
+            retry = should_retry(response.status, safe) and not last
+            record_request(endpoint, method, response.status, started, retry)
+            retry_after = parse_retry_after(raw.headers.get('Retry-After'))
+            if limited:
+                self.limiter.release(response.status, retry_after)
+            if not retry:
+                return response
+            await response.close()
+            await asyncio.sleep(self.limiter.backoff(attempt, retry_after))
+
+
+class _LocalFile:
+    """
+    Файл с асинхронными методами для AsyncClient (вместо aiofiles).
+    Асинхронно передаются только файлы меньше chunked_threshold,
+    поэтому чтение и запись выполняются прямо в цикле событий.
+    """
+
+    def __init__(self, file):
+        self._file = file
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    async def write(self, data: bytes) -> int:
+        return self._file.write(data)
+
+    async def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    async def tell(self) -> int:
+        return self._file.tell()
+
+    async def seekable(self) -> bool:
+        return self._file.seekable()
+
+    async def close(self):
+        self._file.close()
+
+
+async def _open_local_file(path, mode) -> _LocalFile:
+    return _LocalFile(open(path, mode))
+
+
+class AsyncYandexDiskSync(TwoWayYandexDiskSync):
+    """
+    Синхронизация на asyncio и асинхронном клиенте Яндекс.Диска.
+    Небольшие передачи, удаления и обработка событий выполняются корутинами
+    в одном цикле событий, число одновременных запросов ограничено семафорами
+    (места передач - сначала правкам пользователя). Большие файлы и копии
+    дубликатов выполняет реализация базового класса в потоках полосы large,
+    перемещения - в ограниченном пуле потоков цикла.
+    """
+
+    def __init__(self, window, logger, configure, language, shared=None):
+        super().__init__(window, logger, configure, language, shared)
+
+        # Ограничения числа одновременных запросов
+        self.metadata_limit = int(self.config.get('async_metadata_limit', 32))
+        self.transfer_limit = int(self.config.get('async_transfer_limit', 64))
+
+        self.adisk: Optional[AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        self._large_executor: Optional[ThreadPoolExecutor] = None
+        self._workers = []
+        # Последняя задача по каждому пути: задачи одного пути выполняются по очереди
+        self._path_tasks: Dict[str, asyncio.Task] = {}
+
+    # ============================================================
+    #  Цикл событий
+    # ============================================================
+
+    def _ensure_loop(self):
+        """Запустить цикл событий в отдельном потоке (один раз)"""
+        with self._loop_lock:
+            if self._loop:
+                return
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(
+                max_workers=self.upload_workers + self.download_workers,
+                thread_name_prefix='yd-async-io'))
+            # Большие файлы - в своих потоках, не занимая потоки цикла
+            if self.shared is None:
+                self._large_executor = ThreadPoolExecutor(
+                    max_workers=self.lane_workers['large'], thread_name_prefix='yd-async-large')
+            self._loop_thread = threading.Thread(target=loop.run_forever,
+                                                 name='yd-async', daemon=True)
+            self._loop_thread.start()
+            # Цикл публикуется, когда очередь и семафоры созданы: до этого
+            # события watchdog идут в обычную очередь (см. _enqueue_event)
+            asyncio.run_coroutine_threadsafe(self._open_client(), loop).result()
+            self._loop = loop
+
+    def _call(self, coro):
+        """Выполнить корутину в цикле и дождаться результата"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _open_client(self):
+        self._metadata = asyncio.Semaphore(self.metadata_limit)
+        # Места передач достаются сначала правкам пользователя (со старением)
+        self._transfers = PrioritySemaphore(self.transfer_limit,
+                                            aging=float(self.config.get('lane_aging', 30)))
+        self._events: asyncio.Queue = asyncio.Queue()
+        connections = self.metadata_limit + self.transfer_limit
+        session = _LimitedAsyncSession(self.http.limiter, self.http.retries,
+                                       limits=httpx.Limits(max_connections=connections,
+                                                           max_keepalive_connections=connections))
+        self.adisk = AsyncClient(token=self.config['token'], session=session,
+                                 open_file=_open_local_file,
+                                 default_args={'timeout': self.http.metadata_timeout,
+                                               'n_retries': 0})
+
+    async def _close_client(self):
+        tasks = list(self._path_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.adisk:
+            await self.adisk.close()
+            self.adisk = None
+
+    def _close_loop(self):
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if not loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._close_client(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join(timeout=2)
+        loop.close()
+        if self._large_executor is not None:
+            self._large_executor.shutdown(wait=False)
+
+    def close(self):
+        """Закрыть цикл событий (после --once он остаётся открытым) и базу состояния"""
+        self._close_loop()
+        super().close()
+
+    def _spawn(self, path: str, coro) -> asyncio.Task:
+        """Запустить задачу после завершения предыдущей задачи того же пути"""
+        previous = self._path_tasks.get(path)
+        task = self._loop.create_task(self._after(previous, coro))
+        self._path_tasks[path] = task
+
+        def forget(done):
+            if self._path_tasks.get(path) is done:
+                del self._path_tasks[path]
+        task.add_done_callback(forget)
+        return task
+
+    async def _after(self, previous: Optional[asyncio.Task], coro):
+        if previous:
+            await asyncio.wait([previous])
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Task ERROR: {e}")
+
+    # ============================================================
+    #  Операции
+    # ============================================================
+
+    async def _large(self, func, *args):
+        """Передача большого файла (или копия) в потоках полосы large (под SyncManager - общей)"""
+        if self.shared is not None and self.shared.lanes is not None:
+            return await asyncio.wrap_future(self.shared.lanes.submit(
+                'large', current_priority.get(), partial(func, *args), owner=self.state_db.pair))
+        return await self._loop.run_in_executor(self._large_executor, func, *args)
+
+    async def _upload_async(self, relative_path: str) -> bool:
+        """Загрузить файл на Яндекс.Диск"""
+        local_path = self.local_root / relative_path
+        local_info = self._get_local_info(relative_path)
+        if not local_info:
+            return False
+        digest = await asyncio.to_thread(self.hash_index.get, local_path)
+
+        # Большие файлы и копии на сервере - обычной реализацией
+        if local_info['size'] >= self.chunked_threshold or \
+                (digest and self.remote_catalog.candidates(digest[0], exclude=relative_path)):
+            return await self._large(self.upload_file, relative_path)
+
+        remote_path = self._get_remote_path(relative_path)
+        remote_dir = os.path.dirname(remote_path)
+        try:
+            if remote_dir not in self.remote_dirs:
+                async with self._metadata:
+                    await asyncio.to_thread(self.remote_dirs.ensure, remote_dir)
+            async with self._transfers:
+                await self.adisk.upload(str(local_path), remote_path, overwrite=True,
+                                        timeout=self.http.transfer_timeout,
+                                        n_retries=self.transfer_engine.retries)
+        except (ParentNotFoundError, PathNotFoundError):
+            # Папку удалили на диске - базовая реализация создаст её заново
+            return await asyncio.to_thread(self.upload_file, relative_path)
+        except Exception as e:
+            self.logger.error(f"Upload error {relative_path}: {e}")
+            return False
+
+        self.logger.info("[UPLOAD]: %s", relative_path)
+        self._remember_upload(relative_path, local_info, digest)
+        return True
+
+    async def _download_async(self, relative_path: str, remote_info: Optional[dict] = None) -> bool:
+        """Скачать файл с Яндекс.Диска"""
+        if remote_info is None:
+            with self.cache_lock:
+                remote_info = self.remote_state_cache.get(relative_path)
+
+        # Большие файлы и локальные копии - обычной реализацией
+        md5 = remote_info.get('md5') if remote_info else None
+        if (remote_info and remote_info['size'] >= self.chunked_threshold) or \
+                self.local_catalog.candidates(md5, exclude=relative_path):
+            return await self._large(self._download_current, relative_path, remote_info)
+
+        local_path = self.local_root / relative_path
+        try:
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            async with self._transfers:
+                if self._superseded(relative_path):
+                    return False
+                with self.echoes.writing(relative_path):
+                    await self.adisk.download(self._get_remote_path(relative_path),
+                                              str(local_path),
+                                              timeout=self.http.transfer_timeout,
+                                              n_retries=self.transfer_engine.retries)
+        except Exception as e:
+            self.logger.error(f"Download error {relative_path}: {e}")
+            return False
+
+        self.logger.info("[DOWNLOAD]: %s", relative_path)
+        self._remember_download(relative_path, remote_info)
+        return True
+
+    def _superseded(self, relative_path: str) -> bool:
+        """
+        Путь изменён после запуска начальной синхронизации: её скачивание
+        устарело (проверяем перед самой записью, после ожидания очереди)
+        """
+        return self.initial_sync and self._touched_since_start(relative_path)
+
+    def _download_current(self, relative_path: str, remote_info: Optional[dict]) -> bool:
+        if self._superseded(relative_path):
+            return False
+        return self.download_file(relative_path, remote_info)
+
+    async def _delete_remote_async(self, relative_path: str) -> bool:
+        """Удалить файл на Яндекс.Диске"""
+        try:
+            async with self._metadata:
+                await self.adisk.remove(self._get_remote_path(relative_path), permanently=True)
+            self.logger.info("[DELETE] on Yandex.Disk: %s", relative_path)
+            log_transfer('delete_remote', self._get_remote_path(relative_path))
+        except PathNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Delete error {relative_path}: {e}")
+            return False
+        self.state_db.forget([relative_path])
+        self._uncache_remote(relative_path)
+        return True
+
+    async def _remote_info_async(self, relative_path: str) -> Optional[dict]:
+        """Информация о файле на диске: из памяти или листингом папки"""
+        cached, info = self.remote_meta.peek(relative_path)
+        if cached:
+            return info
+        async with self._metadata:
+            return await asyncio.to_thread(self.remote_meta.get, relative_path)
+
+    async def _apply_action_async(self, action: str, relative_path: str,
+                                  remote_info: Optional[dict] = None, dest: Optional[str] = None,
+                                  is_dir: bool = False) -> bool:
+        """Выполняет действие синхронизации для одного файла"""
+        if self.stop_event.is_set():
+            return False
+
+        if action not in ('upload', 'download', 'delete_remote'):
+            # Перемещения и локальное удаление - редкие и быстрые операции
+            return await asyncio.to_thread(self._apply_action, action, relative_path,
+                                           remote_info, dest, is_dir)
+
+        with METRICS.timer('ydsync_operation_seconds', operation=action), \
+                self.profiler.span(f'transfer:{action}'):
+            if action == 'upload':
+                ok = await self._upload_async(relative_path)
+            elif action == 'download':
+                ok = await self._download_async(relative_path, remote_info)
+            else:
+                ok = await self._delete_remote_async(relative_path)
+        if not ok:
+            METRICS.inc('ydsync_operation_errors_total', operation=action)
+            log_transfer(action, self._get_remote_path(relative_path), ok=False)
+        return ok
+
+    # ============================================================
+    #  Полная синхронизация
+    # ============================================================
+
+    def full_sync(self) -> bool:
+        """Полная синхронизация всех файлов"""
+        if self._loop:
+            # Новые события ждут, начатые - завершаются до сканирования
+            # (они могут ждать sync_lock, который занимает полная синхронизация)
+            self.syncing = True
+            self._call(self._drain())
+        return super().full_sync()
+
+    def _lanes_paused(self):
+        # В общих полосах - только передачи самой полной синхронизации (_large)
+        return nullcontext()
+
+    async def _drain(self):
+        if self._path_tasks:
+            await asyncio.wait(list(self._path_tasks.values()))
+
+    def _run_plan(self, stages: list, on_result) -> int:
+        """Выполняет этапы плана по очереди, действия этапа - одновременно"""
+        self._ensure_loop()
+        return self._call(self._run_stages(stages, on_result))
+
+    async def _run_stages(self, stages: list, on_result) -> int:
+        async def step(action, path, kwargs) -> bool:
+            if self.initial_sync:
+                # События обрабатываются одновременно: действие встаёт в очередь пути
+                ok = bool(await self._spawn(path, self._initial_action_async(action, path,
+                                                                             kwargs)))
+            else:
+                ok = await self._apply_action_async(action, path, **kwargs)
+            on_result(action, path, ok)
+            return ok
+
+        synced = 0
+        for stage in stages:
+            if self.stop_event.is_set():
+                break
+            results = await asyncio.gather(*(step(action, path, kwargs)
+                                             for action, path, kwargs in stage))
+            synced += sum(results)
+        return synced
+
+    async def _initial_action_async(self, action: str, path: str, kwargs: dict) -> bool:
+        """Действие начальной синхронизации, если путь не изменился после запуска"""
+        if self._touched_since_start(path, kwargs.get('dest'), kwargs.get('is_dir', False)):
+            self.logger.debug("Skip %s %s: changed during initial sync", action, path)
+            return False
+        return await self._apply_action_async(action, path, **kwargs)
+
+    # ============================================================
+    #  События
+    # ============================================================
+
+    def _enqueue_event(self, event: dict):
+        """Передать событие watchdog в очередь asyncio"""
+        loop = self._loop
+        if loop is None:
+            super()._enqueue_event(event)
+            return
+        loop.call_soon_threadsafe(self._events.put_nowait, event)
+
+    async def _collect_events(self):
+        """Объединение событий по пути (ожидание паузы в записи файла)"""
+        while True:
+            self.event_queue.put(await self._events.get())
+
+    async def _dispatch_events(self):
+        """Готовые события обрабатываются одновременно, по очереди для одного пути"""
+        tick = min(self.event_queue.quiet_period / 4, 0.25) or 0.05
+        while not self.stop_event.is_set():
+            paused = self.syncing and not self.initial_sync
+            event = None if paused else self.event_queue.get(timeout=0)
+            if event is None:
+                await asyncio.sleep(tick)
+                continue
+            self._spawn(event['src'], self._handle_event_async(event))
+
+    async def _handle_event_async(self, event: dict):
+        current_priority.set(INTERACTIVE)
+        with METRICS.timer('ydsync_event_seconds', type=event['type']), \
+                self.profiler.span(f"event:{event['type']}"):
+            await self._process_event_async(event)
+
+    async def _process_event_async(self, event: dict):
+        """Обработка одного события"""
+        event_type = event['type']
+        src = event['src']
+
+        if event_type in ('created', 'modified'):
+            local_info = self._get_local_info(src)
+            if not local_info:
+                return
+            remote_info = await self._remote_info_async(src)
+            same = await asyncio.to_thread(self._same_content, src, local_info, remote_info)
+            if same:
+                self.state_db.put(src, local_info, remote_info)
+                return
+            # Новый файл уже есть на диске в более свежей версии
+            if event_type == 'created' and remote_info and \
+                    to_timestamp(local_info['modified']) <= to_timestamp(remote_info['modified']):
+                return
+            await self._upload_async(src)
+
+        elif event_type == 'deleted':
+            self.local_catalog.remove(src)
+            await self._delete_remote_async(src)
+
+        else:
+            await asyncio.to_thread(self._handle_event_locked, event)
+
+    def _handle_event_locked(self, event: dict):
+        lock = nullcontext() if self.initial_sync else self.sync_lock.shared()
+        with lock, self._claims.hold(event['src'], event.get('dest')):
+            self._handle_event(event)
+
+    def _apply_remote_move_locked(self, old_path: str, new_path: str):
+        with self.sync_lock.shared():
+            self._apply_remote_move(old_path, new_path)
+
+    # ============================================================
+    #  Изменения на Яндекс.Диске
+    # ============================================================
+
+    async def _monitor_remote_async(self):
+        """Мониторинг удалённых изменений"""
+        while not self.stop_event.is_set():
+            await asyncio.sleep(self.remote_detector.interval)
+            if self.syncing:
+                continue
+            try:
+                changes = await asyncio.to_thread(self.remote_detector.poll)
+            except Exception as e:
+                self.logger.error(f"Ошибка мониторинга удалённых файлов: {e}")
+                continue
+            for change in changes:
+                if self.syncing or self.stop_event.is_set():
+                    # Изменения подхватит следующее полное сканирование
+                    self.remote_detector.request_full_scan()
+                    break
+                change = self._unignored_change(*change)
+                if change:
+                    self._spawn(change[1], self._remote_change_async(*change))
+
+    async def _remote_change_async(self, change_type: str, path: str, dest: Optional[str]):
+        """Обработка удалённого изменения"""
+        current_priority.set(NORMAL)
+        if change_type == 'moved':
+            await asyncio.to_thread(self._apply_remote_move_locked, path, dest)
+            return
+
+        remote_info = self._track_remote_change(path)
+        if change_type == 'deleted':
+            await asyncio.to_thread(self.delete_local, path)
+            return
+
+        local_info = self._get_local_info(path)
+        if change_type == 'created':
+            # Побеждает более новая версия
+            if not local_info or (remote_info and to_timestamp(remote_info['modified']) >
+                                  to_timestamp(local_info['modified'])):
+                await self._download_async(path, remote_info)
+            else:
+                await self._upload_async(path)
+            return
+
+        same = await asyncio.to_thread(self._same_content, path, local_info, remote_info)
+        if same:
+            self.state_db.put(path, local_info, remote_info)
+        else:
+            await self._download_async(path, remote_info)
+
+    # ============================================================
+    #  Управление синхронизацией
+    # ============================================================
+
+    def _start_workers(self):
+        """Сбор событий, их обработка и мониторинг диска - корутины в цикле"""
+        self._ensure_loop()
+        self._workers = [asyncio.run_coroutine_threadsafe(coro, self._loop)
+                         for coro in (self._collect_events(), self._dispatch_events(),
+                                      self._monitor_remote_async())]
+
+    def _stop_workers(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._close_loop()
@@ -1,55 +1,175 @@
 import os
+import posixpath
 import time
 import threading
-import hashlib
 from pathlib import Path
-from collections import deque
-from datetime import datetime
-from typing import Dict, Optional, Tuple
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-from yadisk import YaDisk
+from stat import S_ISREG
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+from yadisk.exceptions import ParentNotFoundError, PathNotFoundError
+
+from SRC.dedup import ContentCatalog, clone_file
+from SRC.event_queue import CoalescingEventQueue, EchoRegistry, PathClaims, SharedLock
+from SRC.hash_index import HashIndex
+from SRC.http_client import client_from_config
+from SRC.metrics import METRICS, start_exporter
+from SRC.priority_lanes import INTERACTIVE, LANES, NORMAL, Deferred, LaneScheduler, lane_for, lane_workers
+from SRC.ignore_rules import IGNORE_FILE, IgnoreRules
+from SRC.local_scanner import LocalScanner, file_info, under
+from SRC.log_pipeline import log_transfer
+from SRC.move_detector import collapse_moves, pair_moves
+from SRC.profiler import ProfileSession, SpanRecorder
+from SRC.remote_dirs import RemoteDirCache
+from SRC.remote_meta import RemoteMetaCache
+from SRC.remote_monitor import RemoteChangeDetector
+from SRC.remote_scanner import RemoteScanner
+from SRC.state_db import SyncStateDB
+from SRC.sync_progress import SyncProgress
+from SRC.transfer_engine import CHUNK_SIZE, PARTIAL_DIR, TransferEngine
+from SRC.transfer_pool import TransferPool
+from SRC.utils import to_timestamp
+
+# Серверное копирование дубликата - это copy и проверка get_meta; файлы меньше
+# блока выгрузки (и пустые) дешевле загрузить одним запросом
+REMOTE_COPY_MIN_SIZE = CHUNK_SIZE
+
 
 class TwoWayYandexDiskSync:
     """Двухсторонняя синхронизация с Яндекс.Диском"""
     
-    def __init__(self, window, logger, configure, language):
+    def __init__(self, window, logger, configure, language, shared=None):
         self.window = window
         self.logger = logger
         self.config = configure
         self.language = language
         
-        # Инициализация API
-        self.disk = YaDisk(token=self.config['token'])
+        # Количество параллельных передач
+        self.upload_workers = int(self.config.get('upload_workers', 4))
+        self.download_workers = int(self.config.get('download_workers', 4))
+        
+        # Потоки полос обработки событий: metadata (перемещения, удаления),
+        # small и large (передачи небольших и больших файлов)
+        self.lane_workers = lane_workers(self.config)
+        self.lanes: Optional[LaneScheduler] = None
+        
+        # Ресурсы, общие для нескольких пар синхронизации (SyncManager)
+        self.shared = shared
+        
+        # Инициализация API: общий пул соединений на все рабочие потоки,
+        # клиент переживает перезапуск сервиса
+        if shared is not None:
+            self.http = shared.http
+        else:
+            self.http = client_from_config(
+                self.config,
+                pool_size=self.upload_workers + self.download_workers +
+                sum(self.lane_workers.values()) +
+                int(self.config.get('remote_scan_workers', 8)) + 2,
+            )
+        self.disk = self.http.disk
         self.local_root = Path(self.config['local']).resolve()
         self.remote_root = self.config['yddir'].strip('/')
         
+        # Исключения: расширения, имена, шаблоны и файлы .ydsyncignore
+        self.ignore = IgnoreRules(self.local_root,
+                                  extensions=self.config.get('ignoreextensions', []),
+                                  names=self.config.get('ignorefiles', []),
+                                  patterns=self.config.get('ignorepatterns', []),
+                                  reserved=[PARTIAL_DIR])
+        
         # Состояние синхронизатора
         self.is_running = False
         self.stop_event = threading.Event()
         
-        # Очередь событий
-        self.event_queue = deque()
-        self.queue_lock = threading.Lock()
+        # Очередь событий с объединением и ожиданием паузы в записи файла
+        self.event_queue = CoalescingEventQueue(self.local_root,
+                                                self.config.get('event_quiet_period', 1.0))
         
-        # Блокировка для предотвращения циклов
-        self.sync_lock = threading.Lock()
+        # Собственные записи в локальную папку: их события не уходят обратно на диск
+        self.echoes = EchoRegistry(self.local_root, self.config.get('echo_ttl', 10))
+        
+        # Полная синхронизация захватывает блокировку монопольно, события
+        # и изменения на диске - совместно (выполняются одновременно)
+        self.sync_lock = SharedLock()
         self.syncing = False
         
+        # Начальная синхронизация идёт в фоне одновременно с обработкой событий:
+        # действия над одним путём выполняются по очереди, а пути, изменённые
+        # после запуска, план начальной синхронизации не трогает
+        self.initial_sync = False
+        self._initial_thread = None
+        self._claims = PathClaims()
+        self._touched = set()
+        self._touched_lock = threading.Lock()
+        
         # Кэш состояния удалённых файлов
         self.remote_state_cache: Dict[str, dict] = {}
         self.cache_lock = threading.Lock()
         
+        # Последнее согласованное состояние файлов (рядом с config.json)
+        state_path = self.config.get('state_db', 'sync_state.db')
+        pair = f"{self.local_root}|{self.remote_root}"
+        self.state_db = shared.state_db(state_path, pair) if shared is not None \
+            else SyncStateDB(state_path, pair)
+        
+        # Индекс хешей локальных файлов (в той же базе)
+        self.hash_index = HashIndex(self.state_db, self.config.get('hash_workers', 0))
+        
+        # Каталоги md5 -> пути для копирования дубликатов вместо передачи
+        self.remote_catalog = ContentCatalog()
+        self.local_catalog = ContentCatalog()
+        
+        # Папки, которые уже есть на Яндекс.Диске (без лишних exists/mkdir)
+        self.remote_dirs = RemoteDirCache(self.disk, self.logger)
+        
+        # Метаданные файлов диска для обработки событий (обновляются листингом папок)
+        self.remote_meta = RemoteMetaCache(self.disk, self.logger, self.remote_root,
+                                           ttl=self.config.get('remote_meta_ttl', 60),
+                                           page_size=self.config.get('remote_page_size', 1000))
+        
+        # Участки для профилирования; следующий force_resync профилируется,
+        # если включено profile_resync
+        self.profiler = SpanRecorder()
+        self.profile_next = bool(self.config.get('profile_resync', False))
+        
         # Интервалы
         self.poll_interval = 5  # секунды для опроса Яндекс.Диска
         
+        # Обнаружение изменений на Яндекс.Диске (состояние - remote_state_cache)
+        self.remote_detector = RemoteChangeDetector(
+            self.disk, self.logger, self.remote_root, self._extract_relative_path,
+            self._scan_remote_files, self.remote_state_cache, self.cache_lock,
+            min_interval=self.poll_interval,
+            max_interval=self.config.get('remote_poll_max_interval', 60),
+            full_scan_interval=self.config.get('remote_full_scan_interval', 600),
+            probe_folders=int(self.config.get('remote_probe_folders', 20)),
+        )
+        
+        # Передача больших файлов по частям с докачкой и прогрессом
+        self.chunked_threshold = int(self.config.get('chunked_threshold_mb', 32)) * 1024 * 1024
+        self.progress_listeners = []
+        self._progress_steps: Dict[Tuple[str, str], int] = {}
+        self._progress_lock = threading.Lock()
+        self.sync_progress = SyncProgress(str(self.local_root), self.event_queue.__len__)
+        self.transfer_engine = TransferEngine(self.disk, self.logger, self.stop_event,
+                                              self._report_progress,
+                                              retries=self.config.get('transfer_retries', 3),
+                                              timeout=self.http.transfer_timeout,
+                                              session=self.http.session,
+                                              limiter=self.http.limiter,
+                                              partial_dir=self.local_root / PARTIAL_DIR)
+        
         # Потоки
         self.local_observer = None
+        self._local_watch = None
         self.remote_monitor_thread = None
         self.queue_processor_thread = None
         
-        # Создаём локальную папку
-        self.local_root.mkdir(parents=True, exist_ok=True)
+        # Создаём локальную папку, только если пара ещё не синхронизировалась:
+        # пропавшая папка (диск не подключён, переименована) - не пустая папка
+        if not self.local_root.exists() and not self.state_db.has_records():
+            self.local_root.mkdir(parents=True, exist_ok=True)
         
     # ============================================================
     #  Базовые операции с Яндекс.Диском
@@ -68,40 +188,95 @@ class TwoWayYandexDiskSync:
         return f"{self.remote_root}/{relative_path}".replace('\\', '/')
     
     def _get_remote_info(self, relative_path: str) -> Optional[dict]:
-        """Получить информацию о файле на Яндекс.Диске"""
-        try:
-            remote_path = self._get_remote_path(relative_path)
-            if self.disk.exists(remote_path):
-                info = self.disk.get_meta(remote_path)
-                return {
-                    'size': info['size'],
-                    'modified': info['modified'],
-                    'etag': info.get('etag', ''),
-                    'type': info['type']
-                }
-        except Exception as e:
-            self.logger.debug(f"Ошибка получения информации о {relative_path}: {e}")
-        return None
+        """Получить информацию о файле на Яндекс.Диске (из кэша метаданных)"""
+        return self.remote_meta.get(relative_path)
     
     def _get_local_info(self, relative_path: str) -> Optional[dict]:
         """Получить информацию о локальном файле"""
         local_path = self.local_root / relative_path
-        if local_path.exists() and local_path.is_file():
+        try:
             stat = local_path.stat()
-            return {
-                'size': stat.st_size,
-                'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                'type': 'file'
-            }
-        return None
-    
-    def _compute_md5(self, file_path: Path) -> str:
-        """Вычисление MD5 хеша файла"""
-        hash_md5 = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+        except OSError:
+            return None
+        return file_info(stat) if S_ISREG(stat.st_mode) else None
+    
+    def _cache_remote(self, relative_path: str, info: dict):
+        """Запомнить известное состояние файла на Яндекс.Диске"""
+        with self.cache_lock:
+            self.remote_state_cache[relative_path] = info
+        self.remote_catalog.add(relative_path, info.get('md5'))
+        self.remote_meta.put(relative_path, info)
+    
+    def _uncache_remote(self, relative_path: str) -> Optional[dict]:
+        self.remote_catalog.remove(relative_path)
+        self.remote_meta.drop(relative_path)
+        with self.cache_lock:
+            return self.remote_state_cache.pop(relative_path, None)
+    
+    def _move_cached_remote(self, old_path: str, new_path: str, is_dir: bool = False):
+        """Перенести известное состояние файла (или файлов папки) на новый путь"""
+        self.remote_catalog.move(old_path, new_path, is_dir)
+        self.remote_meta.move(old_path, new_path, is_dir)
+        with self.cache_lock:
+            if is_dir:
+                prefix = old_path + '/'
+                moved = [path for path in self.remote_state_cache if path.startswith(prefix)]
+                for path in moved:
+                    self.remote_state_cache[new_path + path[len(old_path):]] = \
+                        self.remote_state_cache.pop(path)
+            elif old_path in self.remote_state_cache:
+                self.remote_state_cache[new_path] = self.remote_state_cache.pop(old_path)
+    
+    def _local_digest(self, local_info: dict):
+        """Хеши локального файла из индекса без чтения файла"""
+        return self.hash_index.lookup(local_info['dev'], local_info['inode'],
+                                      local_info['size'], local_info['mtime_ns'])
+    
+    def add_progress_listener(self, listener):
+        """Подписаться на прогресс передач: listener(direction, path, done, total)"""
+        self.progress_listeners.append(listener)
+    
+    def add_status_listener(self, listener):
+        """Подписаться на прогресс полной синхронизации: listener(словарь состояния)"""
+        self.sync_progress.listeners.append(listener)
+    
+    def _report_progress(self, direction: str, relative_path: str, done: int, total: int):
+        """Прогресс передачи (уже прорежен TransferEngine): в лог каждые 10%, подписчикам - всё"""
+        step = done * 10 // total if total else 10
+        key = (direction, relative_path)
+        with self._progress_lock:
+            if self._progress_steps.get(key) != step:
+                self._progress_steps[key] = step
+                self.logger.info("[%s] %s: %d%%", direction.upper(), relative_path, step * 10)
+            if done >= total:
+                self._progress_steps.pop(key, None)
+        for listener in self.progress_listeners:
+            listener(direction, relative_path, done, total)
+    
+    def _compute_md5(self, file_path: Path) -> Optional[str]:
+        """Вычисление MD5 хеша файла (через индекс хешей)"""
+        digest = self.hash_index.get(file_path)
+        return digest[0] if digest else None
+    
+    def _same_content(self, relative_path: str, local_info: Optional[dict],
+                      remote_info: Optional[dict]) -> Optional[bool]:
+        """
+        Совпадает ли содержимое локального файла и файла на Яндекс.Диске.
+        None - сравнить не удалось (нет хеша на диске или файл не прочитан).
+        """
+        if not (local_info and remote_info):
+            return None
+        if local_info['size'] != remote_info['size']:
+            return False
+        remote_md5, remote_sha256 = remote_info.get('md5'), remote_info.get('sha256')
+        if not (remote_md5 or remote_sha256):
+            return None
+        digest = self.hash_index.get(self.local_root / relative_path)
+        if digest is None:
+            return None
+        if remote_md5:
+            return digest[0] == remote_md5
+        return digest[1] == remote_sha256
     
     # ============================================================
     #  Синхронизация файлов и папок
@@ -116,21 +291,69 @@ class TwoWayYandexDiskSync:
             
             remote_path = self._get_remote_path(relative_path)
             
-            # Создаём удалённые папки
+            # Создаём недостающие удалённые папки
             remote_dir = os.path.dirname(remote_path)
-            if remote_dir and not self.disk.exists(remote_dir):
-                self.disk.mkdir(remote_dir)
+            self.remote_dirs.ensure(remote_dir)
+            
+            local_info = self._get_local_info(relative_path)
+            digest = self.hash_index.get(local_path)
+            
+            try:
+                self._send_file(relative_path, local_path, remote_path, local_info, digest)
+            except (ParentNotFoundError, PathNotFoundError):
+                # Папку удалили на диске после сканирования - создаём заново
+                self.remote_dirs.forget(remote_dir)
+                self.remote_dirs.ensure(remote_dir)
+                self._send_file(relative_path, local_path, remote_path, local_info, digest)
             
-            # Загружаем файл с перезаписью
-            self.disk.upload(str(local_path), remote_path, overwrite=True)
-            self.logger.info(f"[UPLOAD]: {relative_path}")
+            self._remember_upload(relative_path, local_info, digest)
             return True
             
         except Exception as e:
             self.logger.error(f"Upload error {relative_path}: {e}")
             return False
     
-    def download_file(self, relative_path: str) -> bool:
+    def _copy_remote_duplicate(self, relative_path: str, md5: str, size: int) -> bool:
+        """Серверное копирование файла с тем же содержимым"""
+        for candidate in self.remote_catalog.candidates(md5, exclude=relative_path):
+            with self.cache_lock:
+                info = self.remote_state_cache.get(candidate)
+            if not info or info.get('md5') != md5 or info['size'] != size:
+                continue
+            remote_path = self._get_remote_path(relative_path)
+            try:
+                self.disk.copy(self._get_remote_path(candidate), remote_path, overwrite=True)
+                # Источник могли изменить после сканирования - проверяем копию
+                meta = self.disk.get_meta(remote_path, fields=['md5', 'size'])
+            except Exception as e:
+                self.logger.debug("Remote copy error %s -> %s: %s", candidate, relative_path, e)
+                continue
+            if meta.md5 == md5 and meta.size == size:
+                self.logger.info("[COPY] Yandex.Disk: %s -> %s", candidate, relative_path)
+                return True
+            self.logger.warning("Remote copy mismatch %s -> %s, uploading", candidate, relative_path)
+            self.remote_catalog.remove(candidate)
+        return False
+    
+    def _copy_local_duplicate(self, relative_path: str, remote_info: Optional[dict]) -> bool:
+        """Локальное копирование файла с тем же содержимым вместо скачивания"""
+        md5 = remote_info.get('md5') if remote_info else None
+        for candidate in self.local_catalog.candidates(md5, exclude=relative_path):
+            local_info = self._get_local_info(candidate)
+            if not local_info or local_info['size'] != remote_info['size']:
+                continue
+            digest = self._local_digest(local_info)
+            if not digest or digest[0] != md5:
+                continue
+            try:
+                clone_file(self.local_root / candidate, self.local_root / relative_path)
+                self.logger.info("[COPY] local: %s -> %s", candidate, relative_path)
+                return True
+            except OSError as e:
+                self.logger.debug("Local copy error %s -> %s: %s", candidate, relative_path, e)
+        return False
+    
+    def download_file(self, relative_path: str, remote_info: Optional[dict] = None) -> bool:
         """Скачать файл с Яндекс.Диска"""
         try:
             remote_path = self._get_remote_path(relative_path)
@@ -139,22 +362,92 @@ class TwoWayYandexDiskSync:
             # Создаём локальные папки
             local_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Скачиваем файл с перезаписью
-            self.disk.download(remote_path, str(local_path), overwrite=True)
-            self.logger.info(f"[DOWNLOAD]: {relative_path}")
+            if remote_info is None:
+                with self.cache_lock:
+                    remote_info = self.remote_state_cache.get(relative_path)
+            
+            # Такое же содержимое уже есть локально - копируем,
+            # иначе скачиваем файл с перезаписью
+            with self.echoes.writing(relative_path):
+                if not self._copy_local_duplicate(relative_path, remote_info):
+                    if remote_info and remote_info['size'] >= self.chunked_threshold:
+                        self.transfer_engine.download(remote_path, local_path, relative_path,
+                                                      remote_info['size'], remote_info.get('md5'))
+                    else:
+                        self.disk.download(remote_path, str(local_path), overwrite=True,
+                                           timeout=self.http.transfer_timeout,
+                                           n_retries=self.transfer_engine.retries)
+                    self.logger.info("[DOWNLOAD]: %s", relative_path)
+            
+            self._remember_download(relative_path, remote_info)
             return True
             
         except Exception as e:
             self.logger.error(f"Download error {relative_path}: {e}")
             return False
     
+    def _remember_upload(self, relative_path: str, local_info: Optional[dict],
+                         digest: Optional[Tuple[str, str]]):
+        """Содержимое на диске теперь совпадает с локальным файлом"""
+        if not local_info:
+            return
+        if digest:
+            self.local_catalog.add(relative_path, digest[0])
+        remote_info = dict(local_info,
+                           md5=digest[0] if digest else None,
+                           sha256=digest[1] if digest else None)
+        self.state_db.put(relative_path, local_info, remote_info)
+        self._cache_remote(relative_path, remote_info)
+        METRICS.inc('ydsync_transferred_files_total', direction='upload')
+        METRICS.inc('ydsync_transferred_bytes_total', local_info['size'], direction='upload')
+        log_transfer('upload', self._get_remote_path(relative_path), size=local_info['size'],
+                     md5=remote_info['md5'])
+    
+    def _remember_download(self, relative_path: str, remote_info: Optional[dict]):
+        """Локальный файл теперь совпадает с файлом на диске"""
+        local_info = self._get_local_info(relative_path)
+        if local_info:
+            METRICS.inc('ydsync_transferred_files_total', direction='download')
+            METRICS.inc('ydsync_transferred_bytes_total', local_info['size'], direction='download')
+            log_transfer('download', self._get_remote_path(relative_path), size=local_info['size'],
+                         md5=remote_info.get('md5') if remote_info else None)
+            self.state_db.put(relative_path, local_info, remote_info)
+            if remote_info:
+                self.hash_index.put(self.local_root / relative_path, remote_info.get('md5'),
+                                    remote_info.get('sha256'))
+                self.local_catalog.add(relative_path, remote_info.get('md5'))
+    
+    def _send_file(self, relative_path: str, local_path: Path, remote_path: str,
+                   local_info: Optional[dict], digest: Optional[Tuple[str, str]]):
+        """
+        Такое же содержимое уже есть на диске - копируем на сервере,
+        иначе загружаем файл с перезаписью
+        """
+        if digest and local_info and local_info['size'] >= REMOTE_COPY_MIN_SIZE and \
+                self._copy_remote_duplicate(relative_path, digest[0], local_info['size']):
+            return
+        if local_info and local_info['size'] >= self.chunked_threshold:
+            self.transfer_engine.upload(local_path, remote_path, relative_path,
+                                        digest[0] if digest else None)
+        else:
+            self.disk.upload(str(local_path), remote_path, overwrite=True,
+                             timeout=self.http.transfer_timeout,
+                             n_retries=self.transfer_engine.retries)
+        self.logger.info("[UPLOAD]: %s", relative_path)
+    
     def delete_remote(self, relative_path: str, is_dir: bool = False) -> bool:
         """Удалить файл/папку на Яндекс.Диске"""
         try:
             remote_path = self._get_remote_path(relative_path)
             if self.disk.exists(remote_path):
                 self.disk.remove(remote_path, permanently=True)
-                self.logger.info(f"[DELETE] on Yandex.Disk: {relative_path}")
+                self.logger.info("[DELETE] on Yandex.Disk: %s", relative_path)
+                log_transfer('delete_remote', remote_path)
+            if is_dir:
+                self.remote_dirs.forget(remote_path)
+                self.remote_meta.drop(relative_path, is_dir=True)
+            self.state_db.forget([relative_path])
+            self._uncache_remote(relative_path)
             return True
         except Exception as e:
             self.logger.error(f"Delete error {relative_path}: {e}")
@@ -165,37 +458,45 @@ class TwoWayYandexDiskSync:
         try:
             local_path = self.local_root / relative_path
             if local_path.exists():
-                if local_path.is_dir():
-                    import shutil
-                    shutil.rmtree(local_path)
-                else:
-                    local_path.unlink()
-                self.logger.info(f"[DELETE] local: {relative_path}")
+                is_dir = local_path.is_dir()
+                with self.echoes.writing(relative_path, is_dir=is_dir):
+                    if is_dir:
+                        import shutil
+                        shutil.rmtree(local_path)
+                    else:
+                        local_path.unlink()
+                self.logger.info("[DELETE] local: %s", relative_path)
+                log_transfer('delete_local', self._get_remote_path(relative_path))
+            self.state_db.forget([relative_path])
+            self.local_catalog.remove(relative_path)
             return True
         except Exception as e:
             self.logger.error(f"Local delele error {relative_path}: {e}")
             return False
     
-    def move_remote(self, old_path: str, new_path: str) -> bool:
-        """Переместить файл на Яндекс.Диске"""
+    def move_remote(self, old_path: str, new_path: str, is_dir: bool = False) -> bool:
+        """Переместить файл или папку на Яндекс.Диске"""
         try:
             old_remote = self._get_remote_path(old_path)
             new_remote = self._get_remote_path(new_path)
             
             # Создаём целевую папку
-            new_dir = os.path.dirname(new_remote)
-            if new_dir and not self.disk.exists(new_dir):
-                self.disk.mkdir(new_dir)
+            self.remote_dirs.ensure(os.path.dirname(new_remote))
             
             self.disk.move(old_remote, new_remote)
-            self.logger.info(f"[MOVE] Yandex.Disk: {old_path} -> {new_path}")
+            if is_dir:
+                self.remote_dirs.move(old_remote, new_remote)
+            self.logger.info("[MOVE] Yandex.Disk: %s -> %s", old_path, new_path)
+            log_transfer('move_remote', old_remote, dest=new_remote)
+            self.state_db.move(old_path, new_path, is_dir)
+            self._move_cached_remote(old_path, new_path, is_dir)
             return True
         except Exception as e:
             self.logger.error(f"Move error {old_path} -> {new_path}: {e}")
             return False
     
-    def move_local(self, old_path: str, new_path: str) -> bool:
-        """Переместить локальный файл"""
+    def move_local(self, old_path: str, new_path: str, is_dir: bool = False) -> bool:
+        """Переместить локальный файл или папку"""
         try:
             old_local = self.local_root / old_path
             new_local = self.local_root / new_path
@@ -203,8 +504,13 @@ class TwoWayYandexDiskSync:
             # Создаём целевую папку
             new_local.parent.mkdir(parents=True, exist_ok=True)
             
-            old_local.rename(new_local)
-            self.logger.info(f"[MOVE] local: {old_path} -> {new_path}")
+            with self.echoes.writing(old_path, new_path, is_dir=is_dir):
+                old_local.rename(new_local)
+            self.logger.info("[MOVE] local: %s -> %s", old_path, new_path)
+            log_transfer('move_local', self._get_remote_path(old_path),
+                         dest=self._get_remote_path(new_path))
+            self.state_db.move(old_path, new_path, is_dir)
+            self.local_catalog.move(old_path, new_path, is_dir)
             return True
         except Exception as e:
             self.logger.error(f"Local move error: {e}")
@@ -214,49 +520,45 @@ class TwoWayYandexDiskSync:
     #  Сбор состояния файлов
     # ============================================================
     
-    def _scan_local_files(self) -> Dict[str, dict]:
-        """Сканирование всех локальных файлов"""
-        files = {}
-        for file_path in self.local_root.rglob('*'):
-            if file_path.is_file():
-                rel_path = str(file_path.relative_to(self.local_root))
-                stat = file_path.stat()
-                files[rel_path] = {
-                    'size': stat.st_size,
-                    'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    'type': 'file'
-                }
-        return files
+    def _local_scanner(self) -> LocalScanner:
+        return LocalScanner(self.local_root, self.logger,
+                            workers=self.config.get('local_scan_workers', 8),
+                            skip_dir=lambda rel: self.ignore.match_entry(rel, is_dir=True),
+                            skip_file=self.ignore.match_entry)
+    
+    def iter_local_files(self) -> Iterator[Tuple[str, dict]]:
+        """Потоковое сканирование локальных файлов"""
+        return self._local_scanner().scan()
+    
+    def _scan_local_files(self) -> Tuple[Dict[str, dict], List[str]]:
+        """
+        Сканирование всех локальных файлов.
+        Возвращает (файлы, непрочитанные папки и записи).
+        """
+        with METRICS.timer('ydsync_scan_seconds', side='local'), \
+                self.profiler.span('scan_local'):
+            scanner = self._local_scanner()
+            return dict(scanner.scan()), scanner.failed
+    
+    def iter_remote_files(self) -> Iterator[Tuple[str, dict]]:
+        """Потоковое сканирование удалённых файлов"""
+        scanner = RemoteScanner(self.disk, self.logger, self.remote_root,
+                                self._extract_relative_path,
+                                page_size=self.config.get('remote_page_size', 1000),
+                                max_listings=self.config.get('remote_scan_workers', 8),
+                                flat=self.config.get('remote_flat_scan', True),
+                                ignore=self.ignore)
+        return scanner.scan()
     
     def _scan_remote_files(self) -> Dict[str, dict]:
-        """Сканирование всех удалённых файлов (рекурсивно)"""
-        files = {}
-        
-        def scan(remote_path: str, base_path: str = ''):
-            try:
-                for item in self.disk.listdir(remote_path):
-                    item_path = item['path']
-                    # Извлекаем относительный путь
-                    rel = self._extract_relative_path(item_path)
-                    
-                    if item['type'] == 'file':
-                        files[rel] = {
-                            'size': item['size'],
-                            'modified': item['modified'],
-                            'type': 'file'
-                        }
-                    elif item['type'] == 'dir':
-                        scan(item_path, rel)
-            except Exception as e:
-                self.logger.error(f"Scan ERROR {remote_path}: {e}")
-        
-        try:
-            if self.disk.exists(self.remote_root):
-                scan(self.remote_root)
-        except Exception as e:
-            self.logger.error(f"Romote file SCAN Error: {e}")
-        
-        return files
+        """
+        Сканирование всех удалённых файлов.
+        Неполное сканирование вызывает RemoteScanError, чтобы не принять
+        непрочитанные папки за удалённые.
+        """
+        with METRICS.timer('ydsync_scan_seconds', side='remote'), \
+                self.profiler.span('scan_remote'):
+            return dict(self.iter_remote_files())
     
     def _extract_relative_path(self, full_path: str) -> str:
         """Извлечение относительного пути из полного пути Яндекс.Диска"""
@@ -278,12 +580,29 @@ class TwoWayYandexDiskSync:
     # ============================================================
     
     def _determine_action(self, local_info: Optional[dict], 
-                         remote_info: Optional[dict]) -> Tuple[str, Optional[str]]:
+                         remote_info: Optional[dict],
+                         record: Optional[dict] = None) -> Tuple[str, Optional[str]]:
         """
         Определяет, какое действие нужно выполнить.
+        record - последнее согласованное состояние файла из state_db.
         Возвращает (action, reason)
         action: 'upload', 'download', 'delete_local', 'delete_remote', 'none'
         """
+        # Сравниваем обе стороны с последним согласованным состоянием
+        if record and (record['remote_md5'] or record['remote_modified']):
+            local_same = SyncStateDB.local_matches(record, local_info)
+            remote_same = SyncStateDB.remote_matches(record, remote_info)
+            if local_same and remote_same:
+                return ('none', 'без изменений')
+            if local_same and not remote_info:
+                return ('delete_local', 'удалён на диске')
+            if remote_same and not local_info:
+                return ('delete_remote', 'удалён локально')
+            if local_same and remote_info:
+                return ('download', 'изменён на диске')
+            if remote_same and local_info:
+                return ('upload', 'изменён локально')
+        
         # Только локальный
         if local_info and not remote_info:
             return ('upload', 'только локально')
@@ -301,7 +620,7 @@ class TwoWayYandexDiskSync:
             # Сравниваем размер и дату
             if local_info['size'] != remote_info['size']:
                 # Определяем, что новее
-                if local_info['modified'] > remote_info['modified']:
+                if to_timestamp(local_info['modified']) > to_timestamp(remote_info['modified']):
                     return ('upload', 'локальная версия новее')
                 else:
                     return ('download', 'удалённая версия новее')
@@ -320,86 +639,413 @@ class TwoWayYandexDiskSync:
         if action == 'none':
             return True
         
-        self.logger.debug(f"Synhronize {relative_path}: {action} ({reason})")
+        self.logger.debug("Synhronize %s: %s (%s)", relative_path, action, reason)
+        return self._apply_action(action, relative_path, remote_info)
+    
+    def _touched_since_start(self, path: str, dest: Optional[str] = None,
+                             is_dir: bool = False) -> bool:
+        """Путь изменился после запуска: план начальной синхронизации для него устарел"""
+        with self._touched_lock:
+            if path in self._touched or (dest and dest in self._touched):
+                return True
+            if is_dir:
+                prefixes = tuple(f'{p}/' for p in (path, dest) if p)
+                return any(touched.startswith(prefixes) for touched in self._touched)
+        return False
+    
+    def _apply_action(self, action: str, relative_path: str,
+                      remote_info: Optional[dict] = None, dest: Optional[str] = None,
+                      is_dir: bool = False) -> bool:
+        """Выполняет действие синхронизации для одного файла"""
+        if self.stop_event.is_set():
+            return False
+        if not self.initial_sync:
+            return self._perform_action(action, relative_path, remote_info, dest, is_dir)
         
-        if action == 'upload':
-            return self.upload_file(relative_path)
-        elif action == 'download':
-            return self.download_file(relative_path)
-        elif action == 'delete_local':
-            return self.delete_local(relative_path)
+        # События обрабатываются параллельно с начальной синхронизацией
+        with self._claims.hold(relative_path, dest):
+            if self._touched_since_start(relative_path, dest, is_dir):
+                self.logger.debug("Skip %s %s: changed during initial sync", action, relative_path)
+                return False
+            return self._perform_action(action, relative_path, remote_info, dest, is_dir)
+    
+    def _perform_action(self, action: str, relative_path: str, remote_info: Optional[dict],
+                        dest: Optional[str], is_dir: bool) -> bool:
+        ok = False
+        with METRICS.timer('ydsync_operation_seconds', operation=action), \
+                self.profiler.span(f'transfer:{action}', profile_thread=True):
+            if action == 'move_remote':
+                ok = self.move_remote(relative_path, dest, is_dir)
+            elif action == 'move_local':
+                ok = self.move_local(relative_path, dest, is_dir)
+            elif action == 'upload':
+                ok = self.upload_file(relative_path)
+            elif action == 'download':
+                ok = self.download_file(relative_path, remote_info)
+            elif action == 'delete_local':
+                ok = self.delete_local(relative_path)
+            elif action == 'delete_remote':
+                ok = self.delete_remote(relative_path)
+        
+        if not ok:
+            METRICS.inc('ydsync_operation_errors_total', operation=action)
+            log_transfer(action, self._get_remote_path(relative_path), ok=False)
+        return ok
+    
+    def _run_plan(self, stages: list, on_result) -> int:
+        """
+        Выполняет этапы плана по очереди, действия этапа - в пуле потоков.
+        Действие этапа: (action, path, аргументы _apply_action).
+        Возвращает число успешных действий.
+        """
+        synced = 0
+        if self.shared is not None:
+            # Общие потоки передач, задачи пар чередуются
+            for stage in stages:
+                synced += self.shared.scheduler.run(
+                    self.state_db.pair,
+                    [(action, path, partial(self._apply_action, action, path, **kwargs))
+                     for action, path, kwargs in stage],
+                    self.stop_event, on_result)
+            return synced
+        with TransferPool(self.logger, self.stop_event,
+                          self.upload_workers, self.download_workers) as pool:
+            for stage in stages:
+                synced += pool.run([(action, path, partial(self._apply_action, action, path, **kwargs))
+                                    for action, path, kwargs in stage], on_result)
+        return synced
+    
+    def _plan_rank(self, item: tuple, local_files: Dict[str, dict],
+                   remote_files: Dict[str, dict]) -> Tuple[int, float]:
+        """Порядок действия в плане: полоса (metadata, small, large), затем свежесть"""
+        action, path, _ = item
+        info = local_files.get(path) if action == 'upload' else \
+            remote_files.get(path) if action == 'download' else None
+        lane = lane_for(action, info['size'] if info else None, self.chunked_threshold)
+        modified = to_timestamp(info['modified']) if info else 0.0
+        return LANES.index(lane), -modified
+    
+    def _move_fallback(self, failed_moves: list, replaced: Dict[str, list],
+                       local_files: Dict[str, dict], remote_files: Dict[str, dict],
+                       sizes: Dict[str, int]) -> list:
+        """Действия плана вместо неудавшихся перемещений"""
+        fallback = []
+        for old_path in failed_moves:
+            for path, (action, reason) in replaced.get(old_path, ()):
+                self.logger.debug("Synhronize %s: %s (%s, move failed)", path, action, reason)
+                info = local_files.get(path) if action == 'upload' else \
+                    remote_files.get(path) if action == 'download' else None
+                if info:
+                    sizes[path] = info['size']
+                fallback.append((action, path, {'remote_info': remote_files.get(path)}))
+        return fallback
+    
+    def _on_transfer_result(self, remote_files: Dict[str, dict],
+                            moves: Dict[str, list], action: str, path: str, ok: bool):
+        """Обновляет состояние удалённых файлов по результату передачи"""
+        if not ok:
+            return
+        if action == 'move_remote':
+            for old_path, new_path in moves.get(path, ()):
+                if old_path in remote_files:
+                    remote_files[new_path] = remote_files.pop(old_path)
+        elif action == 'upload':
+            # upload_file уже записал в кэш состояние выгруженного файла
+            with self.cache_lock:
+                info = self.remote_state_cache.get(path)
+            if info:
+                remote_files[path] = info
         elif action == 'delete_remote':
-            return self.delete_remote(relative_path)
+            remote_files.pop(path, None)
+    
+    def _remember_synced(self, path: str, local_info: Optional[dict],
+                         remote_info: Optional[dict], record: Optional[dict]):
+        """Обновляет state_db для файла, который уже синхронизирован"""
+        if not (local_info and remote_info):
+            if record:
+                self.state_db.forget([path])
+            return
+        if SyncStateDB.local_matches(record, local_info) and \
+                SyncStateDB.remote_matches(record, remote_info):
+            return
+        self.state_db.put(path, local_info, remote_info)
+    
+    def _detect_moves(self, actions: Dict[str, Tuple[str, str]],
+                      local_files: Dict[str, dict], remote_files: Dict[str, dict],
+                      states: Dict[str, dict]) -> list:
+        """
+        Находит переименования: пару "удалён на одной стороне" и
+        "появился на той же стороне" с одинаковым размером и хешем.
+        Возвращает список (action, старый путь, новый путь, перемещённые файлы).
+        """
+        # Переименования на Яндекс.Диске - повторяем локально
+        gone = {path: (states[path]['size'], states[path]['remote_md5'])
+                for path, (action, _) in actions.items()
+                if action == 'delete_local' and path in states}
+        new = {path: (remote_files[path]['size'], remote_files[path].get('md5'))
+               for path, (action, _) in actions.items()
+               if action == 'download' and path not in local_files}
+        remote_moves = pair_moves(gone, new) if gone and new else []
         
-        return False
+        # Локальные переименования - повторяем на Яндекс.Диске
+        gone = {path: (remote_files[path]['size'], remote_files[path].get('md5'))
+                for path, (action, _) in actions.items()
+                if action == 'delete_remote' and path in remote_files}
+        sizes = {size for size, _ in gone.values()}
+        appeared = [path for path, (action, _) in actions.items()
+                    if action == 'upload' and path not in remote_files
+                    and local_files[path]['size'] in sizes]
+        local_moves = []
+        if appeared:
+            self.hash_index.prefetch(self.local_root / path for path in appeared)
+            new = {}
+            for path in appeared:
+                digest = self.hash_index.get(self.local_root / path)
+                new[path] = (local_files[path]['size'], digest[0] if digest else None)
+            local_moves = pair_moves(gone, new)
+        
+        return [('move_local',) + move for move in
+                collapse_moves(remote_moves, local_files.keys(), local_files.keys())] + \
+               [('move_remote',) + move for move in
+                collapse_moves(local_moves, remote_files.keys(), remote_files.keys())]
     
     def full_sync(self) -> bool:
         """Полная синхронизация всех файлов"""
         self.logger.info("[SYNC] Full synhronize begin...")
         
-        with self.sync_lock:
+        with METRICS.timer('ydsync_full_sync_seconds'), self.profiler.span('full_sync'), \
+                self._lanes_paused(), self.sync_lock:
             self.syncing = True
+            self.sync_progress.scanning()
             try:
                 # Сканируем обе стороны
-                local_files = self._scan_local_files()
+                local_files, unread = self._scan_local_files()
                 remote_files = self._scan_remote_files()
+                self.remote_dirs.reset(os.path.dirname(self._get_remote_path(path))
+                                       for path in remote_files)
+                
+                with self.profiler.span('load_state'):
+                    states = self.state_db.load()
                 
-                # Синхронизируем все файлы
-                all_paths = set(local_files.keys()) | set(remote_files.keys())
+                with self.profiler.span('diff'):
+                    # Составляем план синхронизации
+                    all_paths = set(local_files.keys()) | set(remote_files.keys()) | \
+                        {path for path in states if not self.ignore.match(path)}
+                    
+                    decisions = []
+                    compare = []
+                    for path in all_paths:
+                        local_info = local_files.get(path)
+                        remote_info = remote_files.get(path)
+                        record = states.get(path)
+                        action, reason = self._determine_action(local_info, remote_info, record)
+                        decisions.append((path, action, reason))
+                    
+                        # Файлы одного размера, изменённые с прошлой синхронизации,
+                        # сверяем по содержимому
+                        if local_info and remote_info and \
+                                local_info['size'] == remote_info['size'] and \
+                                action in ('upload', 'download', 'none') and \
+                                not (SyncStateDB.local_matches(record, local_info) and
+                                     SyncStateDB.remote_matches(record, remote_info)):
+                            compare.append(path)
+                    
+                    # Хешируем их разом в пуле процессов
+                    with self.profiler.span('hash'):
+                        self.hash_index.prefetch(self.local_root / path for path in compare)
+                    compare = set(compare)
+                    
+                    # Каталоги содержимого обеих сторон для копирования дубликатов
+                    self.remote_catalog.rebuild((path, info.get('md5'))
+                                                for path, info in remote_files.items())
+                    self.local_catalog.rebuild(
+                        (path, digest[0]) for path, digest in
+                        ((path, self._local_digest(info)) for path, info in local_files.items())
+                        if digest
+                    )
+                    
+                    actions = {}
+                    for path, action, reason in decisions:
+                        local_info = local_files.get(path)
+                        remote_info = remote_files.get(path)
+                        if path in compare:
+                            same = self._same_content(path, local_info, remote_info)
+                            if same:
+                                action = 'none'
+                            elif same is False and action == 'none':
+                                # Размер совпал, а содержимое нет - побеждает более новая версия
+                                if to_timestamp(local_info['modified']) > \
+                                        to_timestamp(remote_info['modified']):
+                                    action, reason = 'upload', 'содержимое отличается'
+                                else:
+                                    action, reason = 'download', 'содержимое отличается'
+                        actions[path] = (action, reason)
+                    
+                    # Пустая сторона при непустом состоянии - скорее пропавшая папка
+                    # (диск не подключён, папку переименовали), чем удаление всех
+                    # файлов: ничего не удаляем и прерываем синхронизацию
+                    for side, files, delete in (('Local', local_files, 'delete_remote'),
+                                                ('Remote', remote_files, 'delete_local')):
+                        if not files and any(action == delete for action, _ in actions.values()):
+                            self.logger.error("[SYNC] %s folder is empty or missing, but %d files "
+                                              "were synced before; full sync aborted",
+                                              side, len(states))
+                            return False
+                    
+                    # Локальное состояние непрочитанных путей неизвестно: отсутствие
+                    # файла там не значит, что его удалили
+                    if unread:
+                        for path in [path for path in actions if path not in local_files
+                                     and under(path, unread)]:
+                            if actions[path][0] != 'none':
+                                self.logger.warning("Synhronize %s: skipped, local folder unreadable",
+                                                    path)
+                            del actions[path]
+                    
+                    # Удаление + появление того же содержимого - это перемещение
+                    move_plan = []
+                    moves = {}
+                    # Действия, которые заменило перемещение (нужны, если оно не удастся)
+                    replaced = {}
+                    remote_targets = []
+                    for action, old_path, new_path, pairs in self._detect_moves(
+                            actions, local_files, remote_files, states):
+                        replaced[old_path] = [(path, actions.pop(path)) for old, new in pairs
+                                              for path in (old, new) if path in actions]
+                        is_dir = pairs != [(old_path, new_path)]
+                        moves[old_path] = pairs
+                        if action == 'move_remote':
+                            remote_targets.append(new_path)
+                        self.logger.debug("Synhronize %s: %s -> %s", old_path, action, new_path)
+                        move_plan.append((action, old_path, {'dest': new_path, 'is_dir': is_dir}))
                 
                 synced = 0
-                for path in all_paths:
-                    if self.sync_file(path, 
-                                     local_files.get(path), 
-                                     remote_files.get(path)):
-                        synced += 1
+                plan = []
+                with self.state_db.batch():
+                    for path, (action, reason) in actions.items():
+                        local_info = local_files.get(path)
+                        remote_info = remote_files.get(path)
+                        if action == 'none':
+                            synced += 1
+                            self._remember_synced(path, local_info, remote_info, states.get(path))
+                            continue
+                        self.logger.debug("Synhronize %s: %s (%s)", path, action, reason)
+                        plan.append((action, path, {'remote_info': remote_info}))
+                    
+                    # Родительские папки создаём заранее одним проходом сверху вниз,
+                    # чтобы параллельные передачи не создавали их наперегонки
+                    with self.profiler.span('remote_dirs'):
+                        self.remote_dirs.ensure_many(
+                            os.path.dirname(self._get_remote_path(path)) for path in
+                            remote_targets + [path for action, path, _ in plan
+                                              if action == 'upload']
+                        )
+                    
+                    # Объём передач для прогресса
+                    sizes = {}
+                    for action, path, _ in plan:
+                        info = local_files.get(path) if action == 'upload' else \
+                            remote_files.get(path) if action == 'download' else None
+                        if info:
+                            sizes[path] = info['size']
+                    self.sync_progress.start(len(move_plan) + len(plan), sum(sizes.values()))
+                    
+                    # Удаления - первыми, затем небольшие файлы (недавно изменённые
+                    # раньше), большие - в конце, чтобы не задерживать остальные
+                    plan.sort(key=lambda item: self._plan_rank(item, local_files, remote_files))
+                    
+                    failed_moves = []
+                    
+                    def on_result(action: str, path: str, ok: bool):
+                        self._on_transfer_result(remote_files, moves, action, path, ok)
+                        self.sync_progress.advance(sizes.get(path, 0) if ok else 0)
+                        if not ok and action in ('move_remote', 'move_local'):
+                            failed_moves.append(path)
+                    
+                    # Перемещения выполняем до передач
+                    with self.profiler.span('transfers'):
+                        synced += self._run_plan([move_plan], on_result)
+                        
+                        # Перемещение не удалось - выполняем удаление и передачу, которые
+                        # оно заменяло, иначе эти пути так и останутся несинхронизированными
+                        fallback = self._move_fallback(failed_moves, replaced,
+                                                       local_files, remote_files, sizes)
+                        if fallback:
+                            self.remote_dirs.ensure_many(
+                                os.path.dirname(self._get_remote_path(path))
+                                for action, path, _ in fallback if action == 'upload')
+                            self.sync_progress.extend(len(fallback),
+                                                      sum(sizes.get(path, 0)
+                                                          for _, path, _ in fallback))
+                            plan.extend(fallback)
+                        synced += self._run_plan([plan], on_result)
                 
                 self.logger.info(f"[SYNC] Full sync end ({synced} files)")
                 
-                # Обновляем кэш
+                # Обновляем кэш, от него отталкивается мониторинг диска
                 with self.cache_lock:
-                    self.remote_state_cache = remote_files.copy()
+                    self.remote_state_cache.clear()
+                    self.remote_state_cache.update(remote_files)
+                self.remote_meta.seed(remote_files)
+                self.remote_detector.seed()
                 
-                return True
+                return not self.stop_event.is_set()
                 
             except Exception as e:
                 self.logger.error(f"Full synhronize Error: {e}")
                 return False
             finally:
                 self.syncing = False
+                self.sync_progress.finish()
     
     # ============================================================
     #  Обработка событий
     # ============================================================
     
-    class LocalEventHandler(FileSystemEventHandler):
+    class LocalEventHandler:
+        """
+        Обработчик событий watchdog. Наследовать FileSystemEventHandler не нужно:
+        наблюдатель вызывает только dispatch, а watchdog импортируется при запуске.
+        """
         def __init__(self, sync_manager):
             self.sync_manager = sync_manager
         
+        def dispatch(self, event):
+            handler = getattr(self, f'on_{event.event_type}', None)
+            if handler:
+                handler(event)
+        
         def on_created(self, event):
-            if self.sync_manager.syncing:
+            if self.sync_manager.events_paused():
                 return
             if not event.is_directory:
                 self.sync_manager._queue_event('created', event.src_path)
         
         def on_modified(self, event):
-            if self.sync_manager.syncing:
+            if self.sync_manager.events_paused():
                 return
             if not event.is_directory:
                 self.sync_manager._queue_event('modified', event.src_path)
         
         def on_deleted(self, event):
-            if self.sync_manager.syncing:
+            if self.sync_manager.events_paused():
                 return
             if not event.is_directory:
                 self.sync_manager._queue_event('deleted', event.src_path)
         
         def on_moved(self, event):
-            if self.sync_manager.syncing:
+            if self.sync_manager.events_paused():
                 return
             if not event.is_directory:
                 self.sync_manager._queue_event('moved', event.src_path, event.dest_path)
     
+    def events_paused(self) -> bool:
+        """
+        Во время полной синхронизации события не нужны (её же изменения),
+        кроме начальной: она идёт в фоне, и правки пользователя не ждут её конца
+        """
+        return self.syncing and not self.initial_sync
+    
     def _queue_event(self, event_type: str, src: str, dest: str = None):
         """Добавить событие в очередь"""
         try:
@@ -407,122 +1053,223 @@ class TwoWayYandexDiskSync:
             if not src_path.is_relative_to(self.local_root):
                 return
             
-            rel_src = str(src_path.relative_to(self.local_root))
+            rel_src = src_path.relative_to(self.local_root).as_posix()
             rel_dest = None
             
             if dest:
                 dest_path = Path(dest)
                 if dest_path.is_relative_to(self.local_root):
-                    rel_dest = str(dest_path.relative_to(self.local_root))
+                    rel_dest = dest_path.relative_to(self.local_root).as_posix()
+            
+            # Изменение .ydsyncignore меняет правила его папки
+            for rel in (rel_src, rel_dest):
+                if rel and posixpath.basename(rel) == IGNORE_FILE:
+                    self.ignore.invalidate(posixpath.dirname(rel))
             
-            with self.queue_lock:
-                self.event_queue.append({
-                    'type': event_type,
-                    'src': rel_src,
-                    'dest': rel_dest,
-                    'time': time.time()
-                })
+            change = self._unignored_change(event_type, rel_src, rel_dest)
+            if change is None:
+                return
+            event_type, rel_src, rel_dest = change
+            
+            # Эхо собственного скачивания, удаления или перемещения
+            if self.echoes.is_echo(rel_src, rel_dest):
+                METRICS.inc('ydsync_echo_events_total', type=event_type)
+                self.logger.debug("Echo dropped: %s - %s", event_type, rel_src)
+                return
             
-            self.logger.debug(f"Task in quelle: {event_type} - {rel_src}")
+            if self.initial_sync:
+                with self._touched_lock:
+                    self._touched.update(rel for rel in (rel_src, rel_dest) if rel)
+            
+            self._enqueue_event({
+                'type': event_type,
+                'src': rel_src,
+                'dest': rel_dest,
+            })
+            
+            self.logger.debug("Task in quelle: %s - %s", event_type, rel_src)
             
         except Exception as e:
             self.logger.error(f"Qwuelle Error: {e}")
     
+    def _unignored_change(self, change_type: str, path: str,
+                          dest: Optional[str] = None) -> Optional[Tuple[str, str, Optional[str]]]:
+        """
+        Изменение без исключённых путей: None - изменение целиком исключено,
+        перемещение из исключённого пути - создание, в исключённый - удаление
+        """
+        path_ignored = self.ignore.match(path)
+        if change_type == 'moved' and dest:
+            dest_ignored = self.ignore.match(dest)
+            if path_ignored and dest_ignored:
+                return None
+            if path_ignored:
+                return 'created', dest, None
+            if dest_ignored:
+                return 'deleted', path, None
+        elif path_ignored:
+            return None
+        return change_type, path, dest
+    
+    def _enqueue_event(self, event: dict):
+        self.event_queue.put(event)
+    
     def _process_events(self):
-        """Обработка очереди событий"""
+        """
+        Раздача готовых событий по полосам: правки пользователя идут
+        с наивысшим приоритетом и не ждут больших передач
+        """
         while not self.stop_event.is_set() and self.is_running:
             try:
-                with self.queue_lock:
-                    if not self.event_queue:
-                        time.sleep(0.1)
-                        continue
-                    event = self.event_queue.popleft()
-                
-                with self.sync_lock:
-                    self._handle_event(event)
+                event = self.event_queue.get()
+                if event is None:
+                    continue
+                self.lanes.submit(self._event_lane(event), INTERACTIVE,
+                                  partial(self._run_event, event), key=event['src'],
+                                  owner=self.state_db.pair)
                     
             except Exception as e:
                 self.logger.error(f"Quelle ERROR: {e}")
                 time.sleep(1)
     
+    def _event_lane(self, event: dict) -> str:
+        """Полоса события: по типу и размеру файла на момент постановки"""
+        kind = 'modified' if event.get('modified') else event['type']
+        signature = event.get('signature')
+        return lane_for(kind, signature[0] if signature else None, self.chunked_threshold)
+    
+    def _lanes_paused(self):
+        """На время полной синхронизации задачи пары ждут в очереди, не занимая потоки полос"""
+        return self.lanes.paused(self.state_db.pair) if self.lanes else nullcontext()
+    
+    @contextmanager
+    def _lane_lock(self):
+        """
+        Совместный захват sync_lock в потоке полосы: если пара занята полной
+        синхронизацией, задача возвращается в очередь, а поток не ждёт
+        """
+        if not self.sync_lock.acquire_shared(blocking=False):
+            raise Deferred()
+        try:
+            yield
+        finally:
+            self.sync_lock.release_shared()
+    
+    def _run_event(self, event: dict):
+        """Обработка события в потоке полосы"""
+        # Во время начальной синхронизации события не ждут её окончания
+        lock = nullcontext() if self.initial_sync else self._lane_lock()
+        with METRICS.timer('ydsync_event_seconds', type=event['type']), \
+                self.profiler.span(f"event:{event['type']}"), lock, \
+                self._claims.hold(event['src'], event.get('dest')):
+            self._handle_event(event)
+    
     def _handle_event(self, event: dict):
         """Обработка одного события"""
         event_type = event['type']
         src = event['src']
         dest = event.get('dest')
         
+        if event_type == 'deleted':
+            self.local_catalog.remove(src)
+        elif event_type == 'moved' and dest:
+            self.local_catalog.move(src, dest)
+        
         if event_type == 'created':
             # Проверяем, нет ли уже такого файла на диске
             remote_info = self._get_remote_info(src)
             if remote_info:
                 # Сравниваем, что новее
                 local_info = self._get_local_info(src)
-                if local_info and local_info['modified'] > remote_info['modified']:
+                if self._same_content(src, local_info, remote_info):
+                    self.state_db.put(src, local_info, remote_info)
+                elif local_info and \
+                        to_timestamp(local_info['modified']) > to_timestamp(remote_info['modified']):
                     self.upload_file(src)
             else:
                 self.upload_file(src)
                 
         elif event_type == 'modified':
-            # Загружаем изменённый файл
-            self.upload_file(src)
+            # Загружаем изменённый файл, если изменилось его содержимое
+            local_info = self._get_local_info(src)
+            remote_info = self._get_remote_info(src)
+            if self._same_content(src, local_info, remote_info):
+                self.state_db.put(src, local_info, remote_info)
+            else:
+                self.upload_file(src)
             
         elif event_type == 'deleted':
             # Удаляем на диске
             self.delete_remote(src)
             
         elif event_type == 'moved' and dest:
-            # Перемещаем на диске
-            self.move_remote(src, dest)
+            with self.cache_lock:
+                already_moved = src not in self.remote_state_cache and \
+                    dest in self.remote_state_cache
+            if already_moved and not event.get('modified'):
+                # Диск уже в таком состоянии (перемещение пришло с диска)
+                return
+            # Перемещаем на диске и выгружаем, если файл успели изменить
+            if self.move_remote(src, dest) and event.get('modified'):
+                self.upload_file(dest)
     
     def _monitor_remote(self):
         """Мониторинг удалённых изменений"""
-        last_state = {}
-        
         while not self.stop_event.is_set() and self.is_running:
             try:
-                time.sleep(self.poll_interval)
+                if self.stop_event.wait(self.remote_detector.interval):
+                    break
                 
                 if self.syncing:
                     continue
                 
-                # Сканируем текущее состояние
-                current_state = self._scan_remote_files()
-                
-                # Находим изменения
-                all_paths = set(last_state.keys()) | set(current_state.keys())
-                
-                for path in all_paths:
-                    if self.syncing:
+                for change in self.remote_detector.poll():
+                    if self.syncing or self.stop_event.is_set():
+                        # Изменения подхватит следующее полное сканирование
+                        self.remote_detector.request_full_scan()
                         break
-                    
-                    last = last_state.get(path)
-                    current = current_state.get(path)
-                    
-                    # Файл удалён
-                    if last and not current:
-                        self._queue_remote_change('deleted', path)
-                    
-                    # Файл создан
-                    elif not last and current:
-                        self._queue_remote_change('created', path)
-                    
-                    # Файл изменён
-                    elif last and current:
-                        if (last['size'] != current['size'] or 
-                            last['modified'] != current['modified']):
-                            self._queue_remote_change('modified', path)
-                
-                last_state = current_state
+                    change = self._unignored_change(*change)
+                    if change:
+                        self._submit_remote_change(*change)
                 
             except Exception as e:
                 self.logger.error(f"Ошибка мониторинга удалённых файлов: {e}")
     
-    def _queue_remote_change(self, change_type: str, path: str):
+    def _submit_remote_change(self, change_type: str, path: str, dest: Optional[str] = None):
+        """Изменение на диске - в полосу по типу и размеру, после правок пользователя"""
+        with self.cache_lock:
+            remote_info = self.remote_state_cache.get(dest or path)
+        kind = change_type
+        if change_type == 'moved' and self._remote_move_downloads(path, remote_info):
+            # Перемещение со сменой содержимого - это скачивание
+            kind = 'modified'
+        lane = lane_for(kind, remote_info['size'] if remote_info else None,
+                        self.chunked_threshold)
+        self.lanes.submit(lane, NORMAL, partial(self._queue_remote_change, change_type, path, dest),
+                          key=path, owner=self.state_db.pair)
+    
+    def _remote_move_downloads(self, old_path: str, remote_info: Optional[dict]) -> bool:
+        """Перемещение с диска, скорее всего, закончится скачиванием (по stat, без хеша)"""
+        local_info = self._get_local_info(old_path)
+        return not (local_info and remote_info) or local_info['size'] != remote_info['size']
+    
+    def _queue_remote_change(self, change_type: str, path: str, dest: Optional[str] = None):
         """Обработка удалённых изменений"""
         if self.syncing:
             return
         
-        with self.sync_lock:
+        with self._lane_lock():
+            self._apply_remote_change(change_type, path, dest)
+    
+    def _apply_remote_change(self, change_type: str, path: str, dest: Optional[str] = None):
+        """Обработка удалённого изменения (под совместным sync_lock)"""
+        if change_type == 'moved':
+            self._apply_remote_move(path, dest)
+            return
+        
+        self._track_remote_change(path)
+        
+        with self._claims.hold(path):
             if change_type == 'created':
                 # Скачиваем новый файл
                 local_info = self._get_local_info(path)
@@ -531,7 +1278,8 @@ class TwoWayYandexDiskSync:
                 else:
                     # Сравниваем, что новее
                     remote_info = self._get_remote_info(path)
-                    if remote_info and remote_info['modified'] > local_info['modified']:
+                    if remote_info and \
+                            to_timestamp(remote_info['modified']) > to_timestamp(local_info['modified']):
                         self.download_file(path)
                     else:
                         self.upload_file(path)
@@ -541,8 +1289,42 @@ class TwoWayYandexDiskSync:
                 self.delete_local(path)
                 
             elif change_type == 'modified':
-                # Скачиваем обновлённый файл
-                self.download_file(path)
+                # Скачиваем обновлённый файл, если содержимое отличается
+                local_info = self._get_local_info(path)
+                with self.cache_lock:
+                    remote_info = self.remote_state_cache.get(path)
+                if self._same_content(path, local_info, remote_info):
+                    self.state_db.put(path, local_info, remote_info)
+                else:
+                    self.download_file(path, remote_info)
+    
+    def _track_remote_change(self, path: str) -> Optional[dict]:
+        """Поддерживаем каталог содержимого и кэш метаданных диска в актуальном состоянии"""
+        with self.cache_lock:
+            remote_info = self.remote_state_cache.get(path)
+        self.remote_catalog.add(path, remote_info.get('md5') if remote_info else None)
+        if remote_info:
+            self.remote_meta.put(path, remote_info)
+        else:
+            self.remote_meta.drop(path)
+        return remote_info
+    
+    def _apply_remote_move(self, old_path: str, new_path: str):
+        """Повторить локально перемещение, сделанное на Яндекс.Диске (под совместным sync_lock)"""
+        self.remote_catalog.move(old_path, new_path)
+        self.remote_meta.move(old_path, new_path)
+        with self.cache_lock:
+            remote_info = self.remote_state_cache.get(new_path)
+        
+        with self._claims.hold(old_path, new_path):
+            if not self._get_local_info(old_path) or self._get_local_info(new_path):
+                self.download_file(new_path, remote_info)
+                return
+            if self.move_local(old_path, new_path):
+                # Локальная копия успела измениться - берём версию с диска
+                local_info = self._get_local_info(new_path)
+                if self._same_content(new_path, local_info, remote_info) is False:
+                    self.download_file(new_path, remote_info)
     
     # ============================================================
     #  Управление синхронизацией
@@ -554,40 +1336,71 @@ class TwoWayYandexDiskSync:
             msg = self.language.get('token_error', {}).get(self.config['language'], 'Ошибка токена')
             self.logger.error(msg)
             if self.window:
-                self.window.l_prompt.setText(msg)
+                self.window.show_message(msg)
             return False
         
         if self.is_running:
             self.logger.warning("Sync starting now...")
             return False
         
+        if not self.local_root.is_dir():
+            msg = self.language.get('local_missing', {}).get(
+                self.config['language'], 'Локальная папка не найдена: {path}').format(path=self.local_root)
+            self.logger.error(msg)
+            if self.window:
+                self.window.show_message(msg)
+            return False
+        
         self.is_running = True
         self.stop_event.clear()
+        self.event_queue.open()
+        
+        # Метрики: глубина и возраст очереди событий этой пары
+        start_exporter(self.config, self.logger)
+        METRICS.gauge('ydsync_event_queue_depth', self.event_queue.__len__, pair=self.state_db.pair)
+        METRICS.gauge('ydsync_event_queue_age_seconds', self.event_queue.oldest_age,
+                      pair=self.state_db.pair)
         
-        # Полная синхронизация при запуске
-        self.full_sync()
+        # Изменения, сделанные во время начальной синхронизации, обрабатываются сразу
+        self.initial_sync = True
+        self.syncing = True
+        with self._touched_lock:
+            self._touched.clear()
         
         # Запуск локального мониторинга
         event_handler = self.LocalEventHandler(self)
-        self.local_observer = Observer()
-        self.local_observer.schedule(event_handler, str(self.local_root), recursive=True)
-        self.local_observer.start()
+        if self.shared is not None:
+            self._local_watch = self.shared.observer.schedule(event_handler, str(self.local_root),
+                                                              recursive=True)
+        else:
+            from watchdog.observers import Observer
+            self.local_observer = Observer()
+            self.local_observer.schedule(event_handler, str(self.local_root), recursive=True)
+            self.local_observer.start()
         
-        # Запуск удалённого мониторинга
-        self.remote_monitor_thread = threading.Thread(target=self._monitor_remote, daemon=True)
-        self.remote_monitor_thread.start()
+        self._start_workers()
         
-        # Запуск обработчика очереди
-        self.queue_processor_thread = threading.Thread(target=self._process_events, daemon=True)
-        self.queue_processor_thread.start()
+        # Полная синхронизация при запуске - в фоне, наблюдение уже идёт
+        self._initial_thread = threading.Thread(target=self._run_initial_sync,
+                                                name='initial-sync', daemon=True)
+        self._initial_thread.start()
         
         msg = self.language.get('sync_start', {}).get(self.config['language'], 'Синхронизация запущена')
         self.logger.info(msg)
         if self.window:
-            self.window.l_prompt.setText(msg)
+            self.window.show_message(msg)
         
         return True
     
+    def _run_initial_sync(self):
+        """Начальная полная синхронизация параллельно с обработкой событий"""
+        try:
+            self.full_sync()
+        finally:
+            self.initial_sync = False
+            with self._touched_lock:
+                self._touched.clear()
+    
     def stop_sync(self):
         """Остановка синхронизации"""
         if not self.is_running:
@@ -595,28 +1408,71 @@ class TwoWayYandexDiskSync:
         
         self.is_running = False
         self.stop_event.set()
+        self.event_queue.close()
+        METRICS.remove_gauges(pair=self.state_db.pair)
         
         # Останавливаем локальный наблюдатель
+        if self._local_watch is not None:
+            self.shared.observer.unschedule(self._local_watch)
+            self._local_watch = None
         if self.local_observer:
             self.local_observer.stop()
             self.local_observer.join(timeout=2)
         
-        # Ждём завершения потоков
+        # Начальная синхронизация прерывается по stop_event
+        if self._initial_thread and self._initial_thread.is_alive():
+            self._initial_thread.join(timeout=5)
+        self._stop_workers()
+        
+        msg = self.language.get('sync_end', {}).get(self.config['language'], 'Синхронизация остановлена')
+        self.logger.info(msg)
+        if self.window:
+            self.window.show_message(msg)
+    
+    def close(self):
+        """Закрыть базу состояния (после stop_sync); общую базу закрывает SyncManager"""
+        if self.shared is None:
+            self.state_db.close()
+    
+    def _start_workers(self):
+        """Запуск полос (под SyncManager - общих), мониторинга диска и обработчика очереди"""
+        if self.shared is not None:
+            self.lanes = self.shared.lanes
+        else:
+            self.lanes = LaneScheduler(self.logger, self.lane_workers,
+                                       aging=float(self.config.get('lane_aging', 30)))
+        
+        self.remote_monitor_thread = threading.Thread(target=self._monitor_remote, daemon=True)
+        self.remote_monitor_thread.start()
+        
+        self.queue_processor_thread = threading.Thread(target=self._process_events, daemon=True)
+        self.queue_processor_thread.start()
+    
+    def _stop_workers(self):
+        """Ждём завершения потоков"""
         if self.remote_monitor_thread and self.remote_monitor_thread.is_alive():
             self.remote_monitor_thread.join(timeout=2)
         
         if self.queue_processor_thread and self.queue_processor_thread.is_alive():
             self.queue_processor_thread.join(timeout=2)
         
-        # Очищаем очередь
-        with self.queue_lock:
-            self.event_queue.clear()
-        
-        msg = self.language.get('sync_end', {}).get(self.config['language'], 'Синхронизация остановлена')
-        self.logger.info(msg)
-        if self.window:
-            self.window.l_prompt.setText(msg)
+        if self.lanes:
+            # Общие полосы закрывает SyncManager, здесь - только задачи пары
+            if self.shared is not None:
+                self.lanes.cancel(self.state_db.pair)
+            else:
+                self.lanes.close()
     
-    def force_resync(self):
-        """Принудительная полная синхронизация"""
-        self.full_sync()
\ No newline at end of file
+    def force_resync(self) -> bool:
+        """
+        Принудительная полная синхронизация. Если включено profile_resync,
+        прогон профилируется (один раз): профиль и таблица участков - в profile_dir.
+        """
+        if not self.profile_next:
+            return self.full_sync()
+        self.profile_next = False
+        label = 'ydsync-' + (self.remote_root.replace('/', '_') or 'disk')
+        with ProfileSession(self.profiler, self.logger,
+                            mode=self.config.get('profile_mode', 'cprofile'),
+                            directory=self.config.get('profile_dir', ''), label=label):
+            return self.full_sync()
\ No newline at end of file
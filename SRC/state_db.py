@@ -0,0 +1,156 @@
+import copy
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+from SRC.utils import iso_time
+
+
+class SyncStateDB:
+    """
+    Хранилище последнего согласованного состояния файлов (SQLite).
+    Для каждого пути хранится размер и mtime локального файла,
+    md5/etag и дата изменения файла на Яндекс.Диске.
+    """
+
+    def __init__(self, db_path: str, pair: str):
+        self.pair = pair
+        self._lock = threading.Lock()
+        self._batch_depth = 0
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                pair TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                remote_md5 TEXT,
+                remote_etag TEXT,
+                remote_modified TEXT,
+                PRIMARY KEY (pair, path)
+            )
+        """)
+        self._conn.commit()
+
+    def for_pair(self, pair: str) -> 'SyncStateDB':
+        """
+        Хранилище другой пары в том же соединении: несколько пар одного
+        процесса не блокируют базу друг другу незакрытыми транзакциями.
+        """
+        view = copy.copy(self)
+        view.pair = pair
+        view._batch_depth = 0
+        return view
+
+    def _commit(self):
+        if not self._batch_depth:
+            self._conn.commit()
+
+    def execute(self, sql: str, params: Iterable = (), commit: bool = True) -> list:
+        """Выполнить запрос в общем соединении (для других таблиц базы)"""
+        with self._lock:
+            rows = self._conn.execute(sql, tuple(params)).fetchall()
+            if commit:
+                self._commit()
+        return rows
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    @contextmanager
+    def batch(self):
+        """Откладывает фиксацию изменений до конца блока"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                self._commit()
+
+    def load(self) -> Dict[str, dict]:
+        """Загрузить все записи пары синхронизации"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path, size, mtime_ns, remote_md5, remote_etag, remote_modified '
+                'FROM files WHERE pair = ?', (self.pair,)
+            ).fetchall()
+        return {
+            row[0]: {
+                'size': row[1],
+                'mtime_ns': row[2],
+                'remote_md5': row[3],
+                'remote_etag': row[4],
+                'remote_modified': row[5],
+            }
+            for row in rows
+        }
+
+    def has_records(self) -> bool:
+        """Есть ли у пары записи (пара уже синхронизировалась)"""
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM files WHERE pair = ? LIMIT 1',
+                                      (self.pair,)).fetchone() is not None
+
+    def put(self, path: str, local_info: dict, remote_info: Optional[dict] = None):
+        """Запомнить согласованное состояние файла"""
+        remote_info = remote_info or {}
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO files '
+                '(pair, path, size, mtime_ns, remote_md5, remote_etag, remote_modified) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.pair, path, local_info['size'], local_info.get('mtime_ns'),
+                 remote_info.get('md5'), remote_info.get('etag'),
+                 iso_time(remote_info.get('modified')))
+            )
+            self._commit()
+
+    def forget(self, paths: Iterable[str]):
+        """Удалить записи о файлах"""
+        with self._lock:
+            self._conn.executemany('DELETE FROM files WHERE pair = ? AND path = ?',
+                                   ((self.pair, path) for path in paths))
+            self._commit()
+
+    def move(self, old_path: str, new_path: str, is_dir: bool = False):
+        """Перенести запись о файле (или о всех файлах папки) на новый путь"""
+        with self._lock:
+            self._conn.execute('DELETE FROM files WHERE pair = ? AND path = ?',
+                               (self.pair, new_path))
+            self._conn.execute('UPDATE files SET path = ? WHERE pair = ? AND path = ?',
+                               (new_path, self.pair, old_path))
+            if is_dir:
+                self._conn.execute(
+                    'UPDATE files SET path = ? || substr(path, ?) '
+                    'WHERE pair = ? AND substr(path, 1, ?) = ?',
+                    (new_path, len(old_path) + 1, self.pair, len(old_path) + 1, old_path + '/')
+                )
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    @staticmethod
+    def local_matches(record: Optional[dict], local_info: Optional[dict]) -> bool:
+        """Локальный файл не изменился с момента последней синхронизации"""
+        return bool(record and local_info
+                    and record['size'] == local_info['size']
+                    and record['mtime_ns'] == local_info.get('mtime_ns'))
+
+    @staticmethod
+    def remote_matches(record: Optional[dict], remote_info: Optional[dict]) -> bool:
+        """Файл на Яндекс.Диске не изменился с момента последней синхронизации"""
+        if not (record and remote_info) or record['size'] != remote_info['size']:
+            return False
+        if record['remote_md5'] and remote_info.get('md5'):
+            return record['remote_md5'] == remote_info['md5']
+        return bool(record['remote_modified']) and \
+            record['remote_modified'] == iso_time(remote_info.get('modified'))
@@ -0,0 +1,178 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+from SRC.http_client import client_from_config
+from SRC.priority_lanes import LaneScheduler, lane_workers
+from SRC.state_db import SyncStateDB
+from SRC.transfer_pool import FairScheduler
+
+
+def sync_pairs(config: dict) -> List[dict]:
+    """
+    Настройки каждой пары синхронизации: общие настройки config.json,
+    дополненные записью из 'pairs'. Пара local/yddir верхнего уровня
+    (если задана) - первая. Вложенные друг в друга папки пропускаются.
+    """
+    entries = list(config.get('pairs') or [])
+    if config.get('local') and config.get('yddir'):
+        entries.insert(0, {'local': config['local'], 'yddir': config['yddir']})
+
+    pairs, roots = [], []
+    for entry in entries:
+        if not entry.get('local') or not entry.get('yddir'):
+            continue
+        root = str(Path(entry['local']).resolve())
+        if any(os.path.commonpath([root, other]) in (root, other) for other in roots):
+            continue
+        roots.append(root)
+        pair = {key: value for key, value in config.items() if key != 'pairs'}
+        pair.update(entry)
+        pairs.append(pair)
+    return pairs
+
+
+class SharedResources:
+    """
+    Общее для всех пар: HTTP-клиент с пулом соединений и ограничителем
+    запросов, планировщик передач, полосы обработки событий и один
+    наблюдатель файловой системы.
+    """
+
+    def __init__(self, logger, config: dict, pairs: int):
+        self.logger = logger
+        self.config = config
+        self.upload_workers = int(config.get('upload_workers', 4))
+        self.download_workers = int(config.get('download_workers', 4))
+        self.lane_workers = lane_workers(config)
+        self.http = client_from_config(
+            config,
+            pool_size=self.upload_workers + self.download_workers +
+            sum(self.lane_workers.values()) +
+            (int(config.get('remote_scan_workers', 8)) + 2) * pairs,
+        )
+        self.scheduler = None
+        self.lanes = None
+        self.observer = None
+        self._lock = threading.Lock()
+        self._state_dbs: Dict[str, SyncStateDB] = {}
+
+    def state_db(self, db_path: str, pair: str) -> SyncStateDB:
+        """Состояние пары; пары с одним файлом базы делят соединение"""
+        with self._lock:
+            db = self._state_dbs.get(db_path)
+            if db is None:
+                db = self._state_dbs[db_path] = SyncStateDB(db_path, pair)
+                return db
+        return db.for_pair(pair)
+
+    def start(self):
+        with self._lock:
+            if self.scheduler is None:
+                self.scheduler = FairScheduler(self.logger, self.upload_workers,
+                                               self.download_workers)
+            if self.lanes is None:
+                self.lanes = LaneScheduler(self.logger, self.lane_workers,
+                                           aging=float(self.config.get('lane_aging', 30)))
+            if self.observer is None:
+                from watchdog.observers import Observer
+                self.observer = Observer()
+                self.observer.start()
+
+    def close(self):
+        """Закрыть базы состояния пар"""
+        with self._lock:
+            for db in self._state_dbs.values():
+                db.close()
+            self._state_dbs.clear()
+
+    def stop(self):
+        with self._lock:
+            if self.observer is not None:
+                self.observer.stop()
+                self.observer.join(timeout=2)
+                self.observer = None
+            if self.scheduler is not None:
+                self.scheduler.close()
+                self.scheduler = None
+            if self.lanes is not None:
+                self.lanes.close()
+                self.lanes = None
+
+
+class SyncManager:
+    """
+    Несколько пар синхронизации в одном процессе. У каждой пары свой сервис
+    (состояние, очереди событий, опрос диска), а соединения, потоки передач
+    и наблюдатель файловой системы общие. Интерфейс - как у сервиса.
+    """
+
+    def __init__(self, window, logger, configure, language, engine):
+        self.logger = logger
+        self.config = configure
+        pairs = sync_pairs(configure)
+        self.shared = SharedResources(logger, configure, len(pairs))
+        self.services = [engine(window, logger, pair, language, shared=self.shared)
+                         for pair in pairs]
+        self.is_running = False
+
+    def _each(self, method: str) -> List:
+        """Вызвать метод всех сервисов параллельно, вернуть результаты"""
+        results = [None] * len(self.services)
+
+        def call(i, service):
+            try:
+                results[i] = getattr(service, method)()
+            except Exception as e:
+                self.logger.error(f"[PAIR] {service.local_root} {method} error: {e}")
+
+        threads = [threading.Thread(target=call, args=(i, service), daemon=True)
+                   for i, service in enumerate(self.services)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def check_token(self) -> bool:
+        return bool(self.services) and self.services[0].check_token()
+
+    def add_progress_listener(self, listener):
+        for service in self.services:
+            service.add_progress_listener(listener)
+
+    def add_status_listener(self, listener):
+        for service in self.services:
+            service.add_status_listener(listener)
+
+    def start_sync(self) -> bool:
+        """Запуск всех пар; False - ни одна пара не запустилась"""
+        if self.is_running or not self.services:
+            return False
+        self.shared.start()
+        self.is_running = any(self._each('start_sync'))
+        if not self.is_running:
+            self.shared.stop()
+        return self.is_running
+
+    def stop_sync(self):
+        self._each('stop_sync')
+        self.shared.stop()
+        self.is_running = False
+
+    def full_sync(self) -> bool:
+        """Полная синхронизация всех пар (в том числе без запуска, для --once)"""
+        self.shared.start()
+        try:
+            return all(self._each('full_sync'))
+        finally:
+            if not self.is_running:
+                self.shared.stop()
+
+    def force_resync(self) -> bool:
+        return all(self._each('force_resync'))
+
+    def close(self):
+        self._each('close')
+        self.shared.close()
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# Окно для оценки текущей скорости, секунды
+RATE_WINDOW = 10.0
+
+
+class SyncProgress:
+    """
+    Прогресс полной синхронизации: файлы и байты (сделано / всего), текущая
+    скорость, оценка оставшегося времени и глубина очереди событий.
+    Подписчики получают словарь состояния не чаще раза в interval секунд.
+    """
+
+    def __init__(self, pair: str, queue_depth: Callable[[], int], interval: float = 0.5):
+        self.pair = pair
+        self.queue_depth = queue_depth
+        self.interval = interval
+        self.listeners: List[Callable[[dict], None]] = []
+        self._lock = threading.Lock()
+        self._phase = 'idle'
+        self._files = [0, 0]
+        self._bytes = [0, 0]
+        # (время, байт сделано, файлов сделано) за последние RATE_WINDOW секунд
+        self._samples: deque = deque([(time.monotonic(), 0, 0)])
+        self._reported = 0.0
+
+    def _reset(self, phase: str, files: int = 0, size: int = 0):
+        now = time.monotonic()
+        with self._lock:
+            self._phase = phase
+            self._files = [0, files]
+            self._bytes = [0, size]
+            self._samples = deque([(now, 0, 0)])
+        self._notify(force=True)
+
+    def scanning(self):
+        self._reset('scan')
+
+    def start(self, files: int, size: int):
+        """План составлен: столько файлов и байт предстоит передать"""
+        self._reset('transfer', files, size)
+
+    def extend(self, files: int, size: int):
+        """В план добавлены действия (например, вместо неудавшихся перемещений)"""
+        with self._lock:
+            self._files[1] += files
+            self._bytes[1] += size
+        self._notify()
+
+    def advance(self, size: int = 0):
+        now = time.monotonic()
+        with self._lock:
+            self._files[0] += 1
+            self._bytes[0] += size
+            self._samples.append((now, self._bytes[0], self._files[0]))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+        self._notify()
+
+    def finish(self):
+        with self._lock:
+            self._phase = 'idle'
+        self._notify(force=True)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            start, start_bytes, start_files = self._samples[0]
+            files_done, files_total = self._files
+            bytes_done, bytes_total = self._bytes
+            phase = self._phase
+        elapsed = time.monotonic() - start
+        rate = (bytes_done - start_bytes) / elapsed if elapsed > 0 else 0.0
+        files_rate = (files_done - start_files) / elapsed if elapsed > 0 else 0.0
+        # Оставшееся время - по байтам, а без передач (удаления, перемещения) - по файлам
+        eta: Optional[float] = None
+        if phase == 'transfer':
+            if bytes_total and rate > 0:
+                eta = (bytes_total - bytes_done) / rate
+            elif not bytes_total and files_rate > 0:
+                eta = (files_total - files_done) / files_rate
+        return {'pair': self.pair, 'phase': phase,
+                'files_done': files_done, 'files_total': files_total,
+                'bytes_done': bytes_done, 'bytes_total': bytes_total,
+                'rate': rate, 'eta': eta, 'queue': self.queue_depth()}
+
+    def _notify(self, force: bool = False):
+        if not self.listeners:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._reported < self.interval:
+                return
+            self._reported = now
+        status = self.snapshot()
+        for listener in self.listeners:
+            listener(status)
@@ -3,37 +3,30 @@ import re
 import platform
 import sys
 
-import logging
 import threading
-import time
 
-from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from PyQt5 import uic, QtWidgets, QtGui
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QMainWindow, QAction, QMenu, QFileDialog
 
 from SRC.config import LANGUAGE
-from SRC.utils import get_time
+from SRC.utils import get_time, load_config, setup_logging
 from SRC.config import tray_menu_style, qlineedit_style_error, qlineedit_style, windows_drive_pattern
 
-from SRC.service_new import TwoWayYandexDiskSync
-
-CONFIGURE = json.load(open("config.json", "r"))
+CONFIGURE = load_config()
 
 # инициализируем логгер
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        RotatingFileHandler(
-            'yd_sync.log',
-            maxBytes=(CONFIGURE['logsize'] * 1024),
-        ),
-        logging.StreamHandler()
-    ]
-)
-
-logger = logging.getLogger('YandexDiskSync')
+logger = setup_logging(CONFIGURE['logsize'], transfer_log=CONFIGURE.get('transfer_log', ''))
+
+
+class ServiceSignals(QObject):
+    """Сигналы из потоков синхронизации в окно (слоты выполняются в потоке GUI)"""
+    message = pyqtSignal(str)
+    transfer = pyqtSignal(str, str, int, int)
+    status = pyqtSignal(dict)
+    started = pyqtSignal(bool)
+
 
 class SyncWindow(QMainWindow):
 
@@ -46,6 +39,14 @@ class SyncWindow(QMainWindow):
 
         self.loop = False # Запуск цикла синхронизации
         self.sync_time = 0 # Таймер синхронизации
+        self.statuses = {} # Прогресс полной синхронизации по парам
+
+        # Потоки синхронизации меняют окно только через сигналы
+        self.signals = ServiceSignals()
+        self.signals.message.connect(self.show_message_slot)
+        self.signals.transfer.connect(self.show_progress)
+        self.signals.status.connect(self.show_status)
+        self.signals.started.connect(self.on_sync_started)
 
         uic.loadUi("GUI/mainwindow.ui", self)
         self.setFixedSize(699, 531)
@@ -81,7 +82,9 @@ class SyncWindow(QMainWindow):
 
         self.set_from_config()
 
-        threading.Thread(target=self.synchronize, args=(), daemon=True).start()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.synchronize)
+        self.timer.start(1000)
 
     def start_sync(self) -> None:
         """Метод запускает цикл синхронизации"""
@@ -105,25 +108,46 @@ class SyncWindow(QMainWindow):
         self.pb_start.setEnabled(False)
         self.pb_stop.setEnabled(True)
 
-        self.create_sync_service()
-
         if self.sync_service:
-            if self.sync_service.start_sync():
-                self.loop = True
-                self.sync_time = 0
-                logger.info(LANGUAGE['sync_begin'][CONFIGURE['language']])
-                self.l_prompt.setText(LANGUAGE['sync_begin'][CONFIGURE['language']])
+            # Проверка токена и запуск - не в потоке окна, начальная синхронизация идёт в фоне
+            self.l_prompt.setText(LANGUAGE['connect'][CONFIGURE['language']])
+            service = self.sync_service
+            threading.Thread(target=lambda: self.signals.started.emit(service.start_sync()),
+                             daemon=True).start()
         else:
             msg = LANGUAGE['error'][CONFIGURE['language']]
             logger.info(msg)
             self.l_prompt.setText(msg)
 
+    def on_sync_started(self, started: bool) -> None:
+        """Метод вызывается, когда сервис запущен (или не смог запуститься)"""
+        if not started:
+            self.pb_start.setEnabled(True)
+            self.pb_stop.setEnabled(False)
+            # Следующий запуск создаст новый сервис - этот больше не нужен
+            if self.sync_service:
+                self.sync_service.close()
+                self.sync_service = None
+            return
+        self.loop = True
+        self.sync_time = 0
+        logger.info(LANGUAGE['sync_begin'][CONFIGURE['language']])
+
     def stop_sync(self) -> None:
         """Метод останавливает цикл синхронизации"""
         self.pb_start.setEnabled(True)
         self.pb_stop.setEnabled(False)
         self.loop = False
-        self.sync_service.stop_sync()
+        self.statuses.clear()
+        if self.sync_service:
+            service, self.sync_service = self.sync_service, None
+            threading.Thread(target=self.shutdown_service, args=(service,), daemon=True).start()
+
+    @staticmethod
+    def shutdown_service(service) -> None:
+        """Метод останавливает сервис и закрывает его базу состояния"""
+        service.stop_sync()
+        service.close()
 
     def on_tray_icon_activated(self, reason) -> None:
         if reason == QtWidgets.QSystemTrayIcon.DoubleClick: # type: ignore
@@ -132,6 +156,10 @@ class SyncWindow(QMainWindow):
     def exit_program(self) -> None:
         """Метод закрывает окно программы"""
         self.save_config()
+        if self.sync_service:
+            self.shutdown_service(self.sync_service)
+            from SRC.http_client import close_clients
+            close_clients()
         sys.exit()
 
     def closeEvent(self, event) -> None:
@@ -142,7 +170,11 @@ class SyncWindow(QMainWindow):
     def create_sync_service(self) -> None:
         # Создание сервиса синхронизации
         try:
-            self.sync_service = TwoWayYandexDiskSync(self, logger, CONFIGURE, LANGUAGE)
+            # Модули синхронизации загружаются при первом запуске, а не вместе с окном
+            from SRC.engine import create_service
+            self.sync_service = create_service(self, logger, CONFIGURE, LANGUAGE)
+            self.sync_service.add_progress_listener(self.signals.transfer.emit)
+            self.sync_service.add_status_listener(self.signals.status.emit)
         except Exception as e:
             if e == 'Invalid Yandex.Disk token':
                 self.l_prompt.setText(LANGUAGE['token_error'][CONFIGURE['language']])
@@ -151,6 +183,43 @@ class SyncWindow(QMainWindow):
                 self.l_prompt.setText(LANGUAGE['error'][CONFIGURE['language']])
                 logger.error(LANGUAGE['error'][CONFIGURE['language']])
 
+    def show_message(self, msg: str) -> None:
+        """Метод выводит сообщение сервиса (можно вызывать из любого потока)"""
+        self.signals.message.emit(msg)
+
+    def show_message_slot(self, msg: str) -> None:
+        self.l_prompt.setText(msg)
+
+    def show_progress(self, direction: str, path: str, done: int, total: int) -> None:
+        """Метод показывает прогресс передачи большого файла"""
+        percent = done * 100 // total if total else 100
+        self.l_prompt.setText(f'{Path(path).name}: {percent}%')
+
+    def show_status(self, status: dict) -> None:
+        """Метод показывает прогресс полной синхронизации (сумма по всем парам)"""
+        language = CONFIGURE['language']
+        previous = self.statuses.get(status['pair'])
+        self.statuses[status['pair']] = status
+        active = [item for item in self.statuses.values() if item['phase'] != 'idle']
+        if not active:
+            if previous and previous['phase'] != 'idle':
+                self.l_prompt.setText(LANGUAGE['full_sync_done'][language])
+            return
+        if all(item['phase'] == 'scan' for item in active):
+            self.l_prompt.setText(LANGUAGE['scan'][language])
+            return
+        etas = [item['eta'] for item in active if item['phase'] == 'transfer']
+        eta = get_time(max(etas)) if etas and None not in etas else '--:--:--'
+        self.l_prompt.setText(LANGUAGE['progress'][language].format(
+            files_done=sum(item['files_done'] for item in active),
+            files_total=sum(item['files_total'] for item in active),
+            mb_done=sum(item['bytes_done'] for item in active) / 1024 ** 2,
+            mb_total=sum(item['bytes_total'] for item in active) / 1024 ** 2,
+            rate=sum(item['rate'] for item in active) / 1024 ** 2,
+            eta=eta,
+            queue=sum(item['queue'] for item in active),
+        ))
+
     def language_set(self, language: str) -> None:
         """Метод устанавливает язык интерфейса"""
         self.l_language.setText(LANGUAGE['l_language'][language])
@@ -217,12 +286,14 @@ class SyncWindow(QMainWindow):
         if files:
             files_names = [Path(path).name for path in files.split(',')]
         CONFIGURE['ignorefiles'] = files_names
+        extensions = self.le_ignoreextension.text()
+        CONFIGURE['ignoreextensions'] = [ext.strip() for ext in extensions.split(',')
+                                         if ext.strip()]
         json.dump(CONFIGURE, open('config.json', 'w'), indent=4)
 
 
     def synchronize(self) -> None:
-        while True:
-            time.sleep(1)
-            if self.loop:
-                self.l_time.setText(get_time(self.sync_time))
-                self.sync_time += 1
+        """Метод обновляет время синхронизации (таймер окна, раз в секунду)"""
+        if self.loop:
+            self.l_time.setText(get_time(self.sync_time))
+            self.sync_time += 1
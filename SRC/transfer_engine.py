@@ -0,0 +1,218 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import requests
+
+from SRC.hash_index import hash_file
+from SRC.metrics import METRICS
+
+# progress(direction, relative_path, done_bytes, total_bytes)
+ProgressCallback = Callable[[str, str, int, int], None]
+
+CHUNK_SIZE = 1024 * 1024
+PARTIAL_SUFFIX = '.partial'
+# Недокачанные файлы - в служебной папке в корне синхронизации (исключена
+# на обеих сторонах), чтобы не путать их с файлами пользователя *.partial
+PARTIAL_DIR = '.ydsync-partial'
+# Прогресс передачи сообщается при смене процента, но не чаще раза
+# в PROGRESS_INTERVAL секунд (и всегда - в конце)
+PROGRESS_INTERVAL = 0.25
+
+
+class TransferError(Exception):
+    """Передача не завершена (остановка, обрыв или несовпадение хеша)"""
+
+
+class _ProgressThrottle:
+    """Передаёт report(done) не на каждый блок, а по процентам и интервалу"""
+
+    def __init__(self, total: int, report: Callable[[int], None]):
+        self._total = total
+        self._report = report
+        self._percent = -1
+        self._last = 0.0
+
+    def __call__(self, done: int):
+        now = time.monotonic()
+        percent = done * 100 // self._total if self._total else 100
+        if done >= self._total or \
+                (percent != self._percent and now - self._last >= PROGRESS_INTERVAL):
+            self._percent = percent
+            self._last = now
+            self._report(done)
+
+
+class _ProgressReader:
+    """Файл для PUT-запроса, сообщающий о прочитанных байтах (с прореживанием)"""
+
+    def __init__(self, file, total: int, on_read: Callable[[int], None],
+                 stop_event: threading.Event):
+        self._file = file
+        self._total = total
+        self._done = 0
+        self._on_read = _ProgressThrottle(total, on_read)
+        self._stop_event = stop_event
+
+    def __len__(self) -> int:
+        return self._total
+
+    def read(self, size: int = -1) -> bytes:
+        if self._stop_event.is_set():
+            raise TransferError('stopped')
+        chunk = self._file.read(CHUNK_SIZE if size is None or size < 0 else size)
+        if chunk:
+            self._done += len(chunk)
+            self._on_read(self._done)
+        return chunk
+
+
+class TransferEngine:
+    """
+    Передача больших файлов по прямым ссылкам Яндекс.Диска.
+    Скачивание докачивается через HTTP Range в файл папки partial_dir,
+    выгрузка повторяется с новой ссылкой. Результат сверяется с md5 сервера.
+    """
+
+    def __init__(self, disk, logger, stop_event: threading.Event,
+                 progress: Optional[ProgressCallback] = None,
+                 retries: int = 3, timeout=60,
+                 session: Optional[requests.Session] = None, limiter=None,
+                 partial_dir: Optional[Path] = None):
+        self.disk = disk
+        self.logger = logger
+        self.stop_event = stop_event
+        self.progress = progress
+        self.retries = retries
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.limiter = limiter
+        self.partial_dir = partial_dir
+
+    def _partial_path(self, local_path: Path, relative_path: str) -> Path:
+        """Файл докачки: имя по хешу пути, одно и то же между перезапусками"""
+        if self.partial_dir is None:
+            return local_path.with_name(local_path.name + PARTIAL_SUFFIX)
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        name = hashlib.sha1(relative_path.encode('utf-8')).hexdigest()
+        return self.partial_dir / (name + PARTIAL_SUFFIX)
+
+    def _retry_pause(self, direction: str, attempt: int):
+        """Пауза со случайным разбросом перед следующей попыткой (прерывается остановкой)"""
+        METRICS.inc('ydsync_transfer_retries_total', direction=direction)
+        if self.limiter and attempt < self.retries:
+            self.stop_event.wait(self.limiter.backoff(attempt))
+
+    def _report(self, direction: str, relative_path: str, done: int, total: int):
+        if self.progress:
+            self.progress(direction, relative_path, done, total)
+
+    # ------------------------------------------------------------
+    #  Скачивание
+    # ------------------------------------------------------------
+
+    def download(self, remote_path: str, local_path: Path, relative_path: str,
+                 size: int, md5: Optional[str] = None):
+        """Скачать файл с докачкой во временный файл (см. _partial_path)"""
+        partial = self._partial_path(local_path, relative_path)
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if self.stop_event.is_set():
+                raise TransferError('stopped')
+            try:
+                self._download_range(remote_path, partial, relative_path, size)
+            except TransferError:
+                raise
+            except (requests.RequestException, OSError) as e:
+                last_error = e
+                self.logger.warning(f"Download interrupted {relative_path} "
+                                    f"(attempt {attempt + 1}): {e}")
+                self._retry_pause('download', attempt)
+                continue
+
+            if md5 and hash_file(str(partial))[0] != md5:
+                # Докачанные части не сошлись - начинаем заново
+                partial.unlink()
+                last_error = TransferError('md5 mismatch')
+                self.logger.warning(f"Download md5 mismatch {relative_path}, restarting")
+                continue
+
+            os.replace(partial, local_path)
+            return
+        raise TransferError(f"download failed: {last_error}")
+
+    def _download_range(self, remote_path: str, partial: Path, relative_path: str, size: int):
+        done = partial.stat().st_size if partial.exists() else 0
+        if done > size:
+            partial.unlink()
+            done = 0
+        if done and done == size:
+            return
+
+        headers = {'Range': f'bytes={done}-'} if done else {}
+        report = _ProgressThrottle(size, lambda done: self._report('download', relative_path,
+                                                                    done, size))
+        link = self.disk.get_download_link(remote_path)
+        with self.session.get(link, headers=headers, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            if done and response.status_code != 206:
+                # Сервер не поддержал Range - качаем с начала
+                done = 0
+            with open(partial, 'ab' if done else 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if self.stop_event.is_set():
+                        raise TransferError('stopped')
+                    f.write(chunk)
+                    done += len(chunk)
+                    report(done)
+
+        if done < size:
+            raise requests.ConnectionError(f"connection closed at {done} of {size} bytes")
+
+    # ------------------------------------------------------------
+    #  Выгрузка
+    # ------------------------------------------------------------
+
+    def upload(self, local_path: Path, remote_path: str, relative_path: str,
+               md5: Optional[str] = None):
+        """
+        Выгрузить файл с повторами. Ссылка для выгрузки Яндекс.Диска
+        не принимает продолжение с середины, поэтому каждая попытка
+        получает новую ссылку и передаёт файл целиком.
+        """
+        size = local_path.stat().st_size
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if self.stop_event.is_set():
+                raise TransferError('stopped')
+            try:
+                link = self.disk.get_upload_link(remote_path, overwrite=True)
+                with open(local_path, 'rb') as f:
+                    reader = _ProgressReader(
+                        f, size,
+                        lambda done: self._report('upload', relative_path, done, size),
+                        self.stop_event)
+                    response = self.session.put(link, data=reader, timeout=self.timeout)
+                response.raise_for_status()
+            except TransferError:
+                raise
+            except (requests.RequestException, OSError) as e:
+                last_error = e
+                self.logger.warning(f"Upload interrupted {relative_path} "
+                                    f"(attempt {attempt + 1}): {e}")
+                self._retry_pause('upload', attempt)
+                continue
+
+            if md5 and not self._remote_md5_matches(remote_path, md5):
+                last_error = TransferError('md5 mismatch')
+                self.logger.warning(f"Upload md5 mismatch {relative_path}, retrying")
+                continue
+            return
+        raise TransferError(f"upload failed: {last_error}")
+
+    def _remote_md5_matches(self, remote_path: str, md5: str) -> bool:
+        meta = self.disk.get_meta(remote_path, fields=['md5'])
+        return meta['md5'] == md5
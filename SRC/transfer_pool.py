@@ -0,0 +1,185 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+# Действия, которые меняют Яндекс.Диск, идут в пул выгрузки,
+# действия, которые меняют локальную папку - в пул загрузки
+TRANSFER_LANES = {
+    'upload': 'upload',
+    'delete_remote': 'upload',
+    'move_remote': 'upload',
+    'download': 'download',
+    'delete_local': 'download',
+    'move_local': 'download',
+}
+
+
+# Задача: (action, относительный путь, функция без аргументов -> успех)
+Task = Tuple[str, str, Callable[[], bool]]
+ResultCallback = Callable[[str, str, bool], None]
+
+
+def _collect(futures: Dict[Future, Tuple[str, str]], logger, stop_event: threading.Event,
+             on_result: Optional[ResultCallback]) -> int:
+    """Ждёт завершения задач, отменяя не начатые при остановке"""
+    succeeded = 0
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        for future in done:
+            action, path = futures[future]
+            ok = False
+            if not future.cancelled():
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    logger.error(f"Transfer error {path}: {e}")
+            if ok:
+                succeeded += 1
+            if on_result:
+                on_result(action, path, ok)
+
+        # При остановке отменяем ещё не начатые задачи
+        if stop_event.is_set():
+            for future in pending:
+                future.cancel()
+
+    return succeeded
+
+
+class TransferPool:
+    """Ограниченный пул потоков для параллельной передачи файлов"""
+
+    def __init__(self, logger, stop_event: threading.Event,
+                 upload_workers: int = 4, download_workers: int = 4):
+        self.logger = logger
+        self.stop_event = stop_event
+        self._executors: Dict[str, ThreadPoolExecutor] = {
+            'upload': ThreadPoolExecutor(max_workers=max(1, upload_workers),
+                                         thread_name_prefix='yd-upload'),
+            'download': ThreadPoolExecutor(max_workers=max(1, download_workers),
+                                           thread_name_prefix='yd-download'),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def _run_task(self, func: Callable[[], bool]) -> bool:
+        """Выполнить задачу, если синхронизация ещё не остановлена"""
+        if self.stop_event.is_set():
+            return False
+        return bool(func())
+
+    def run(self, tasks: Iterable[Task], on_result: Optional[ResultCallback] = None) -> int:
+        """
+        Выполняет задачи (action, path, func) параллельно.
+        Для каждой завершённой задачи вызывает on_result(action, path, ok).
+        Возвращает количество успешно выполненных задач.
+        """
+        futures = {}
+        for action, path, func in tasks:
+            if self.stop_event.is_set():
+                break
+            lane = TRANSFER_LANES.get(action, 'upload')
+            futures[self._executors[lane].submit(self._run_task, func)] = (action, path)
+        return _collect(futures, self.logger, self.stop_event, on_result)
+
+    def shutdown(self):
+        """Остановка пула потоков"""
+        for executor in self._executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _FairLane:
+    """Очереди задач по парам синхронизации; потоки выбирают пары по кругу"""
+
+    def __init__(self, name: str, workers: int):
+        self._queues: 'OrderedDict[str, Deque[Tuple[Future, Callable[[], bool]]]]' = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f'yd-{name}-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, owner: str, func: Callable[[], bool]) -> Future:
+        future = Future()
+        with self._cond:
+            self._queues.setdefault(owner, deque()).append((future, func))
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        with self._cond:
+            while not self._queues and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            # Пара, задачу которой взяли, уходит в конец очереди
+            owner, queue = self._queues.popitem(last=False)
+            job = queue.popleft()
+            if queue:
+                self._queues[owner] = queue
+            return job
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            future, func = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for queue in self._queues.values():
+                for future, _ in queue:
+                    future.cancel()
+            self._queues.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+
+
+class FairScheduler:
+    """
+    Общий планировщик передач для нескольких пар синхронизации.
+    Потоки создаются один раз; у каждой пары своя очередь, и потоки
+    берут задачи из очередей по кругу, поэтому большая пара
+    не задерживает остальные.
+    """
+
+    def __init__(self, logger, upload_workers: int = 4, download_workers: int = 4):
+        self.logger = logger
+        self._lanes = {
+            'upload': _FairLane('upload', upload_workers),
+            'download': _FairLane('download', download_workers),
+        }
+
+    def run(self, owner: str, tasks: Iterable[Task], stop_event: threading.Event,
+            on_result: Optional[ResultCallback] = None) -> int:
+        """То же, что TransferPool.run, для задач пары owner"""
+        def guarded(func):
+            return lambda: False if stop_event.is_set() else bool(func())
+
+        futures = {}
+        for action, path, func in tasks:
+            if stop_event.is_set():
+                break
+            lane = self._lanes[TRANSFER_LANES.get(action, 'upload')]
+            futures[lane.submit(owner, guarded(func))] = (action, path)
+        return _collect(futures, self.logger, stop_event, on_result)
+
+    def close(self):
+        for lane in self._lanes.values():
+            lane.close()
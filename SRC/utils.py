@@ -1,3 +1,12 @@
+import json
+import logging
+from datetime import datetime, timezone
+from os import path
+from typing import Optional
+
+from SRC.config import CONFIG_DEFAULT
+from SRC.log_pipeline import start_log_writer
+
 
 def get_time(time_sync: float) -> str:
     """Функция преобразует число в формат времени 00:00:00"""
@@ -6,5 +15,58 @@ def get_time(time_sync: float) -> str:
     return f'{hours:02d}:{minuts:02d}:{secs:02d}'
 
 
+def to_timestamp(value) -> float:
+    """Функция приводит дату (datetime, ISO-строку или число) к UNIX-времени"""
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.timestamp()
+
+
+def iso_time(value) -> Optional[str]:
+    """Функция приводит дату к ISO-строке в UTC"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(to_timestamp(value), timezone.utc).isoformat()
+
+
+# Настройки-пути: относительные пути считаются от папки config.json,
+# а не от текущего каталога процесса (cron и systemd запускают из /)
+PATH_SETTINGS = ('state_db', 'transfer_log', 'metrics_snapshot')
+
+
+def config_relative(config_path: str, file_path: str) -> str:
+    """Функция приводит путь к абсолютному относительно папки файла конфигурации"""
+    if not file_path or path.isabs(file_path):
+        return file_path
+    return path.join(path.dirname(path.abspath(config_path)), file_path)
+
+
+def load_config(config_path: str = 'config.json') -> dict:
+    """Функция читает файл конфигурации, создавая его при первом запуске"""
+    if not path.exists(config_path):
+        with open(config_path, 'w') as f:
+            json.dump(CONFIG_DEFAULT, f, indent=4)
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    for settings in [config] + list(config.get('pairs') or []):
+        for key in PATH_SETTINGS:
+            value = settings.get(key, CONFIG_DEFAULT[key] if settings is config else '')
+            if value:
+                settings[key] = config_relative(config_path, value)
+    return config
 
 
+def setup_logging(logsize: int, log_file: str = 'yd_sync.log',
+                  transfer_log: str = '') -> logging.Logger:
+    """
+    Функция настраивает журнал (файл и консоль пишет фоновый поток)
+    и возвращает логгер синхронизации. transfer_log - журнал передач в JSON lines.
+    """
+    start_log_writer(logsize * 1024, log_file, transfer_log)
+    return logging.getLogger('YandexDiskSync')
@@ -0,0 +1,443 @@
+"""
+Локальный сервер, имитирующий REST API Яндекс.Диска (в объёме, нужном yadisk
+для синхронизации): метаданные и листинг, плоский список файлов, последние
+загруженные, ссылки на загрузку и скачивание, mkdir, move, copy, remove.
+
+Задержка ответа, пропускная способность и доля ошибок настраиваются,
+все запросы подсчитываются. Данные хранятся в памяти.
+"""
+import hashlib
+import json
+import posixpath
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+# Размер блока при передаче тела запроса/ответа
+CHUNK = 64 * 1024
+
+
+def _norm(path: str) -> str:
+    """'disk:/a/b', '/a/b/', 'a/b' -> 'a/b'; корень - ''"""
+    if path.startswith('disk:'):
+        path = path[5:]
+    path = posixpath.normpath('/' + path.strip('/'))
+    return path.strip('/')
+
+
+class _Node:
+    __slots__ = ('type', 'data', 'md5', 'sha256', 'modified', 'created')
+
+    def __init__(self, node_type: str, data: bytes = b''):
+        self.type = node_type
+        self.created = self.modified = datetime.now(timezone.utc)
+        self.set_data(data)
+
+    def set_data(self, data: bytes):
+        self.data = data
+        self.md5 = hashlib.md5(data).hexdigest()
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.modified = datetime.now(timezone.utc)
+
+
+class _ApiError(Exception):
+    def __init__(self, status: int, error: str, message: str = ''):
+        super().__init__(message or error)
+        self.status = status
+        self.error = error
+
+
+class FakeDisk:
+    """Хранилище диска в памяти и операции над ним"""
+
+    def __init__(self):
+        self.nodes: Dict[str, _Node] = {'': _Node('dir')}
+        self.lock = threading.RLock()
+        # Время (monotonic) последней загрузки каждого файла
+        self.uploaded_at: Dict[str, float] = {}
+
+    def get(self, path: str) -> _Node:
+        node = self.nodes.get(path)
+        if node is None:
+            raise _ApiError(404, 'DiskNotFoundError', f'Resource not found: {path}')
+        return node
+
+    def _check_parent(self, path: str):
+        parent = self.nodes.get(posixpath.dirname(path))
+        if parent is None or parent.type != 'dir':
+            raise _ApiError(409, 'DiskPathDoesntExistsError', f'Parent not found: {path}')
+
+    def _touch_parent(self, path: str):
+        """Появление, удаление и переименование записи меняют дату изменения папки"""
+        parent = self.nodes.get(posixpath.dirname(path))
+        if parent is not None:
+            parent.modified = datetime.now(timezone.utc)
+
+    def _add(self, path: str, node: _Node):
+        self.nodes[path] = node
+        self._touch_parent(path)
+
+    def children(self, path: str) -> list:
+        prefix = path + '/' if path else ''
+        return sorted(p for p in self.nodes
+                      if p and p.startswith(prefix) and '/' not in p[len(prefix):])
+
+    def put_file(self, path: str, data: bytes, make_parents: bool = True):
+        """Записать файл (в том числе «другим клиентом» из бенчмарка)"""
+        path = _norm(path)
+        with self.lock:
+            if make_parents:
+                parts = path.split('/')
+                for i in range(1, len(parts)):
+                    folder = '/'.join(parts[:i])
+                    if folder not in self.nodes:
+                        self._add(folder, _Node('dir'))
+            self._check_parent(path)
+            node = self.nodes.get(path)
+            if node is not None and node.type == 'file':
+                node.set_data(data)
+            else:
+                self._add(path, _Node('file', data))
+            self.uploaded_at[path] = time.monotonic()
+
+    def mkdir(self, path: str):
+        with self.lock:
+            if path in self.nodes:
+                raise _ApiError(409, 'DiskPathPointsToExistentDirectoryError',
+                                f'Directory exists: {path}')
+            self._check_parent(path)
+            self._add(path, _Node('dir'))
+
+    def remove(self, path: str):
+        with self.lock:
+            self.get(path)
+            prefix = path + '/'
+            for p in [p for p in self.nodes if p == path or p.startswith(prefix)]:
+                del self.nodes[p]
+            self._touch_parent(path)
+
+    def move(self, src: str, dst: str, overwrite: bool = False, copy: bool = False):
+        src, dst = _norm(src), _norm(dst)
+        with self.lock:
+            self.get(src)
+            if dst in self.nodes:
+                if not overwrite:
+                    raise _ApiError(409, 'DiskResourceAlreadyExistsError', f'Exists: {dst}')
+                self.remove(dst)
+            self._check_parent(dst)
+            prefix = src + '/'
+            for p in [p for p in self.nodes if p == src or p.startswith(prefix)]:
+                node = self.nodes[p] if copy else self.nodes.pop(p)
+                if copy and node.type == 'file':
+                    node = _Node('file', node.data)
+                self.nodes[dst + p[len(src):]] = node
+            if not copy:
+                self._touch_parent(src)
+            self._touch_parent(dst)
+
+    def resource(self, path: str, node: _Node) -> dict:
+        info = {
+            'name': posixpath.basename(path) or 'disk',
+            'path': 'disk:/' + path,
+            'type': node.type,
+            'created': node.created.isoformat(timespec='seconds'),
+            'modified': node.modified.isoformat(timespec='seconds'),
+            'resource_id': f'1:{hashlib.md5(path.encode()).hexdigest()}',
+        }
+        if node.type == 'file':
+            info.update(size=len(node.data), md5=node.md5, sha256=node.sha256,
+                        mime_type='application/octet-stream')
+        return info
+
+    def files(self) -> list:
+        return sorted((p, n) for p, n in self.nodes.items() if n.type == 'file')
+
+
+class FakeDiskServer:
+    """
+    HTTP-сервер FakeDisk в отдельном потоке.
+    latency - задержка каждого запроса (с), bandwidth - байт/с на соединение
+    (0 - без ограничения), error_rate - доля запросов к API с ответом 503/429.
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: float = 0,
+                 error_rate: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.disk = FakeDisk()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.requests: Counter = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._uploads: Dict[str, str] = {}
+        self._stats_lock = threading.Lock()
+        self._random = random.Random(1)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeDiskServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name='fake-disk', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.requests.clear()
+            self.bytes_in = self.bytes_out = 0
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {'requests': sum(self.requests.values()),
+                    'by_endpoint': dict(self.requests),
+                    'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out}
+
+    def _count(self, key: str, bytes_in: int = 0):
+        with self._stats_lock:
+            self.requests[key] += 1
+            self.bytes_in += bytes_in
+
+    def _count_out(self, size: int):
+        with self._stats_lock:
+            self.bytes_out += size
+
+    def _inject_error(self) -> Optional[int]:
+        if self.error_rate and self._random.random() < self.error_rate:
+            return 429 if self._random.random() < 0.5 else 503
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Без Nagle заголовки и тело ответа не ждут подтверждения клиента
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            # ---------- ввод/вывод ----------
+
+            def _throttle(self, size: int):
+                if server.bandwidth:
+                    time.sleep(size / server.bandwidth)
+
+            def _read_body(self) -> bytes:
+                if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+                    parts = []
+                    while True:
+                        size = int(self.rfile.readline().split(b';')[0], 16)
+                        if not size:
+                            self.rfile.readline()
+                            break
+                        parts.append(self.rfile.read(size))
+                        self.rfile.readline()
+                        self._throttle(size)
+                    return b''.join(parts)
+                remaining = int(self.headers.get('Content-Length') or 0)
+                parts = []
+                while remaining:
+                    part = self.rfile.read(min(CHUNK, remaining))
+                    if not part:
+                        break
+                    parts.append(part)
+                    remaining -= len(part)
+                    self._throttle(len(part))
+                return b''.join(parts)
+
+            def _send(self, status: int, body: bytes = b'', content_type='application/json',
+                      headers: Optional[dict] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                for i in range(0, len(body), CHUNK):
+                    self.wfile.write(body[i:i + CHUNK])
+                    self._throttle(min(CHUNK, len(body) - i))
+
+            def _json(self, status: int, payload: Optional[dict] = None, headers=None):
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self._send(status, body, headers=headers)
+
+            def _link(self, path: str, status: int = 201):
+                self._json(status, {'href': f'{server.url}/v1/disk/resources?path='
+                                            f'{quote("disk:/" + path)}',
+                                    'method': 'GET', 'templated': False})
+
+            # ---------- разбор запроса ----------
+
+            def _handle(self, method: str):
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                route = parts.path.rstrip('/')
+                body = self._read_body() if method in ('PUT', 'POST') else b''
+                endpoint = route
+                for prefix in ('/download/', '/upload/'):
+                    if route.startswith(prefix):
+                        endpoint = prefix.rstrip('/')
+                server._count(f'{method} {endpoint}', bytes_in=len(body))
+
+                if server.latency:
+                    time.sleep(server.latency)
+                try:
+                    if route.startswith('/v1/'):
+                        status = server._inject_error()
+                        if status:
+                            raise _ApiError(status, 'TooManyRequestsError' if status == 429
+                                            else 'ServiceUnavailableError')
+                    handler = getattr(self, f'_{method.lower()}', None)
+                    if handler is None:
+                        raise _ApiError(405, 'MethodNotAllowedError')
+                    handler(route, query, body)
+                except _ApiError as e:
+                    headers = {'Retry-After': '1'} if e.status == 429 else None
+                    self._json(e.status, {'error': e.error, 'message': str(e),
+                                          'description': str(e)}, headers)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_DELETE(self):
+                self._handle('DELETE')
+
+            # ---------- эндпоинты ----------
+
+            def _get(self, route, query, body):
+                disk = server.disk
+                if route.startswith('/v1/disk/operations/'):
+                    raise _ApiError(404, 'DiskOperationNotFoundError')
+                if route == '/v1/disk':
+                    self._json(200, {'total_space': 1 << 40, 'used_space': 0,
+                                     'trash_size': 0, 'is_paid': False})
+                elif route == '/v1/disk/resources':
+                    path = _norm(query.get('path', '/'))
+                    limit = int(query.get('limit', 20))
+                    offset = int(query.get('offset', 0))
+                    with disk.lock:
+                        node = disk.get(path)
+                        info = disk.resource(path, node)
+                        if node.type == 'dir':
+                            children = disk.children(path)
+                            info['_embedded'] = {
+                                'items': [disk.resource(p, disk.nodes[p])
+                                          for p in children[offset:offset + limit]],
+                                'limit': limit, 'offset': offset,
+                                'total': len(children), 'path': info['path'],
+                                'sort': 'name'}
+                    self._json(200, info)
+                elif route == '/v1/disk/resources/files':
+                    limit = int(query.get('limit', 20))
+                    offset = int(query.get('offset', 0))
+                    with disk.lock:
+                        items = [disk.resource(p, n)
+                                 for p, n in disk.files()[offset:offset + limit]]
+                    self._json(200, {'items': items, 'limit': limit, 'offset': offset})
+                elif route == '/v1/disk/resources/last-uploaded':
+                    limit = int(query.get('limit', 20))
+                    with disk.lock:
+                        files = sorted(disk.files(), key=lambda f: f[1].modified, reverse=True)
+                        items = [disk.resource(p, n) for p, n in files[:limit]]
+                    self._json(200, {'items': items, 'limit': limit})
+                elif route == '/v1/disk/resources/upload':
+                    path = _norm(query['path'])
+                    with disk.lock:
+                        disk._check_parent(path)
+                        node = disk.nodes.get(path)
+                        if node is not None and query.get('overwrite') != 'true':
+                            raise _ApiError(409, 'DiskResourceAlreadyExistsError')
+                    upload_id = uuid.uuid4().hex
+                    server._uploads[upload_id] = path
+                    self._json(200, {'operation_id': upload_id,
+                                     'href': f'{server.url}/upload/{upload_id}',
+                                     'method': 'PUT', 'templated': False})
+                elif route == '/v1/disk/resources/download':
+                    path = _norm(query['path'])
+                    disk.get(path)
+                    self._json(200, {'href': f'{server.url}/download/{quote(path)}',
+                                     'method': 'GET', 'templated': False})
+                elif route.startswith('/download/'):
+                    self._download(unquote(route[len('/download/'):]))
+                else:
+                    raise _ApiError(404, 'NotFoundError')
+
+            def _download(self, path: str):
+                with server.disk.lock:
+                    data = server.disk.get(path).data
+                size = len(data)
+                status, headers = 200, {'Accept-Ranges': 'bytes'}
+                range_header = self.headers.get('Range', '')
+                if range_header.startswith('bytes='):
+                    start_text, _, end_text = range_header[6:].partition('-')
+                    start = int(start_text or 0)
+                    end = int(end_text) if end_text else size - 1
+                    if start >= size:
+                        self._send(416, headers={'Content-Range': f'bytes */{size}'})
+                        return
+                    data = data[start:end + 1]
+                    status = 206
+                    headers['Content-Range'] = f'bytes {start}-{start + len(data) - 1}/{size}'
+                server._count_out(len(data))
+                self._send(status, data, 'application/octet-stream', headers)
+
+            def _put(self, route, query, body):
+                if route.startswith('/upload/'):
+                    path = server._uploads.pop(route[len('/upload/'):], None)
+                    if path is None:
+                        raise _ApiError(404, 'NotFoundError')
+                    server.disk.put_file(path, body, make_parents=False)
+                    self._send(201)
+                elif route == '/v1/disk/resources':
+                    path = _norm(query['path'])
+                    server.disk.mkdir(path)
+                    self._link(path)
+                else:
+                    raise _ApiError(404, 'NotFoundError')
+
+            def _post(self, route, query, body):
+                if route in ('/v1/disk/resources/move', '/v1/disk/resources/copy'):
+                    dst = _norm(query['path'])
+                    server.disk.move(query['from'], dst, query.get('overwrite') == 'true',
+                                     copy=route.endswith('copy'))
+                    self._link(dst)
+                else:
+                    raise _ApiError(404, 'NotFoundError')
+
+            def _delete(self, route, query, body):
+                if route == '/v1/disk/resources':
+                    server.disk.remove(_norm(query['path']))
+                    self._send(204)
+                else:
+                    raise _ApiError(404, 'NotFoundError')
+
+        return Handler
@@ -0,0 +1,402 @@
+"""
+Сквозные бенчмарки TwoWayYandexDiskSync на локальном FakeDiskServer.
+
+    python -m bench.run_bench                      # все сценарии, полный размер
+    python -m bench.run_bench --scale 0.01 tiny    # быстрый прогон одного сценария
+    python -m bench.run_bench --latency 0.03 --error-rate 0.01 --json result.json
+    python -m bench.run_bench --engine asyncio --scale 0.01 roundtrip   # smoke-тест asyncio
+    python -m bench.run_bench --scale 0.05 echo    # эхо собственных скачиваний
+    python -m bench.run_bench --scale 0.05 nested  # вложенные удаления и переименования на диске
+
+Для каждого сценария выводятся время, пропускная способность, число запросов
+к API по видам и (для сценариев с наблюдением) задержка от события до загрузки.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import yadisk
+
+from bench.fake_disk import FakeDiskServer
+from SRC.config import CONFIG_DEFAULT, LANGUAGE
+from SRC.engine import create_service
+from SRC.event_queue import EchoRegistry
+from SRC.http_client import close_clients
+from SRC.service_new import TwoWayYandexDiskSync
+
+MB = 1024 * 1024
+REMOTE_ROOT = 'bench'
+
+
+class Bench:
+    """Окружение одного сценария: сервер, временная папка и сервис"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.tmp = Path(tempfile.mkdtemp(prefix='ydsync-bench-'))
+        self.local = self.tmp / 'local'
+        self.local.mkdir()
+        self.server = FakeDiskServer(latency=args.latency, bandwidth=args.bandwidth * MB,
+                                     error_rate=args.error_rate).start()
+        self.server.disk.mkdir(REMOTE_ROOT)
+        yadisk.settings.BASE_API_URL = self.server.url
+        self.service = None
+
+    def create_service(self, **overrides) -> TwoWayYandexDiskSync:
+        config = dict(CONFIG_DEFAULT, token='bench', local=str(self.local), yddir=REMOTE_ROOT,
+                      state_db=str(self.tmp / 'state.db'), event_quiet_period=0.2,
+                      remote_full_scan_interval=2, remote_poll_max_interval=2,
+                      api_rate_limit=self.args.api_rate, engine=self.args.engine)
+        config.update(overrides)
+        self.service = create_service(None, logging.getLogger('bench'), config, LANGUAGE)
+        return self.service
+
+    def close(self):
+        if self.service:
+            self.service.stop_sync()
+            self.service.close()
+        close_clients()
+        self.server.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def remote_path(self, relative_path: str) -> str:
+        return f'{REMOTE_ROOT}/{relative_path}'
+
+    def wait_until(self, condition: Callable[[], bool], timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.05)
+        return False
+
+
+def _write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {'p50_ms': round(pick(0.5) * 1000, 1), 'p95_ms': round(pick(0.95) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1), 'mean_ms': round(statistics.mean(values) * 1000, 1)}
+
+
+def _full_sync(bench: Bench, items: int, size: int) -> dict:
+    bench.server.reset_stats()
+    started = time.perf_counter()
+    ok = bench.service.full_sync()
+    elapsed = time.perf_counter() - started
+    return {'ok': ok, 'seconds': round(elapsed, 3), 'items': items,
+            'items_per_s': round(items / elapsed, 1),
+            'mb_per_s': round(size / MB / elapsed, 2), **bench.server.stats()}
+
+
+# ============================================================
+#  Сценарии
+# ============================================================
+
+def scenario_tiny(bench: Bench) -> dict:
+    """Много маленьких файлов: первая выгрузка и повторная синхронизация без изменений"""
+    count = max(10, int(100_000 * bench.args.scale))
+    for i in range(count):
+        _write(bench.local / f'd{i % 100:02d}' / f'f{i}.txt', f'{i:064d}'.encode())
+    bench.create_service()
+    result = {'upload': _full_sync(bench, count, count * 64)}
+    result['resync'] = _full_sync(bench, count, 0)
+    return result
+
+
+def scenario_huge(bench: Bench) -> dict:
+    """Несколько больших файлов: выгрузка и скачивание частями"""
+    count = 3
+    size = max(1, int(64 * bench.args.scale)) * MB
+    block = os.urandom(MB)
+    for i in range(count):
+        _write(bench.local / f'up{i}.bin', block * (size // MB))
+        bench.server.disk.put_file(bench.remote_path(f'down{i}.bin'), block[::-1] * (size // MB))
+    bench.create_service(chunked_threshold_mb=1)
+    return {'transfer': _full_sync(bench, count * 2, count * 2 * size)}
+
+
+def scenario_deep(bench: Bench) -> dict:
+    """Глубокое дерево папок: число mkdir и листингов"""
+    depth = max(5, int(40 * bench.args.scale ** 0.5))
+    branches = 3
+    files = 0
+    for branch in range(branches):
+        folder = bench.local
+        for level in range(depth):
+            folder = folder / f'b{branch}l{level}'
+            _write(folder / 'file.txt', f'{branch}/{level}'.encode())
+            files += 1
+    bench.create_service()
+    return {'upload': _full_sync(bench, files, 0)}
+
+
+def scenario_burst(bench: Bench) -> dict:
+    """Серия правок при наблюдении: задержка от последней записи до загрузки"""
+    count = max(10, int(2_000 * bench.args.scale))
+    edits = 3
+    service = bench.create_service()
+    service.start_sync()
+    bench.server.reset_stats()
+
+    written: Dict[str, float] = {}
+    started = time.perf_counter()
+    for edit in range(edits):
+        for i in range(count):
+            relative_path = f'burst/f{i}.txt'
+            _write(bench.local / relative_path, f'{i}:{edit}'.encode())
+            written[relative_path] = time.monotonic()
+
+    expected = {bench.remote_path(path): f'{path[7:-4]}:{edits - 1}'.encode()
+                for path in written}
+    disk = bench.server.disk
+
+    def synced():
+        with disk.lock:
+            return all(path in disk.nodes and disk.nodes[path].data == data
+                       for path, data in expected.items())
+
+    ok = bench.wait_until(synced, timeout=60 + count * 0.05)
+    elapsed = time.perf_counter() - started
+    latencies = [disk.uploaded_at[bench.remote_path(path)] - moment
+                 for path, moment in written.items()
+                 if bench.remote_path(path) in disk.uploaded_at]
+    stats = bench.server.stats()
+    return {'burst': {'ok': ok, 'seconds': round(elapsed, 3), 'files': count, 'edits': count * edits,
+                      'uploads': stats['by_endpoint'].get('PUT /upload', 0),
+                      'event_to_upload': _percentiles(latencies), **stats}}
+
+
+def scenario_rename(bench: Bench) -> dict:
+    """Переименование папки на диске другим клиентом: обнаружение и перенос без скачивания"""
+    count = max(10, int(1_000 * bench.args.scale))
+    for i in range(count):
+        bench.server.disk.put_file(bench.remote_path(f'old/f{i}.txt'), f'{i}'.encode())
+    service = bench.create_service()
+    service.full_sync()
+    service.start_sync()
+    bench.server.reset_stats()
+
+    started = time.perf_counter()
+    bench.server.disk.move(bench.remote_path('old'), bench.remote_path('new'))
+    old_folder, new_folder = bench.local / 'old', bench.local / 'new'
+    ok = bench.wait_until(lambda: new_folder.is_dir() and len(os.listdir(new_folder)) == count
+                          and not any(old_folder.glob('*.txt')), timeout=60)
+    elapsed = time.perf_counter() - started
+    stats = bench.server.stats()
+    return {'rename': {'ok': ok, 'seconds': round(elapsed, 3), 'files': count,
+                       'downloads': stats['by_endpoint'].get('GET /download', 0), **stats}}
+
+
+def scenario_roundtrip(bench: Bench) -> dict:
+    """
+    Передачи в обе стороны при полной синхронизации и при наблюдении.
+    Проверяет содержимое и то, что свои же передачи не повторяются
+    (повторная синхронизация и опрос диска ничего не передают).
+    """
+    count = max(5, int(200 * bench.args.scale))
+    disk = bench.server.disk
+    for i in range(count):
+        _write(bench.local / f'up/f{i}.txt', f'local {i}'.encode())
+        disk.put_file(bench.remote_path(f'down/f{i}.txt'), f'remote {i}'.encode())
+    service = bench.create_service()
+
+    def transfers(stats: dict) -> int:
+        return stats['by_endpoint'].get('PUT /upload', 0) + \
+            stats['by_endpoint'].get('GET /download', 0)
+
+    result = {'sync': _full_sync(bench, count * 2, 0)}
+    with disk.lock:
+        uploaded = all(disk.nodes.get(bench.remote_path(f'up/f{i}.txt')) is not None and
+                       disk.nodes[bench.remote_path(f'up/f{i}.txt')].data == f'local {i}'.encode()
+                       for i in range(count))
+    downloaded = all((bench.local / f'down/f{i}.txt').read_bytes() == f'remote {i}'.encode()
+                     for i in range(count) if (bench.local / f'down/f{i}.txt').exists())
+    downloaded = downloaded and len(os.listdir(bench.local / 'down')) == count
+    # Передачи записаны в состояние (иначе они считаются неудавшимися)
+    recorded = len(service.state_db.load()) == count * 2
+    result['sync']['ok'] = result['sync']['ok'] and uploaded and downloaded and recorded
+
+    result['resync'] = _full_sync(bench, count * 2, 0)
+    result['resync']['ok'] = result['resync']['ok'] and transfers(result['resync']) == 0
+
+    service.start_sync()
+    bench.wait_until(lambda: not service.initial_sync, timeout=60)
+    bench.server.reset_stats()
+    started = time.perf_counter()
+    _write(bench.local / 'live/local.txt', b'local edit')
+    disk.put_file(bench.remote_path('live/remote.txt'), b'remote edit')
+
+    def synced():
+        with disk.lock:
+            node = disk.nodes.get(bench.remote_path('live/local.txt'))
+        local_file = bench.local / 'live/remote.txt'
+        return node is not None and node.data == b'local edit' and \
+            local_file.exists() and local_file.read_bytes() == b'remote edit'
+
+    ok = bench.wait_until(synced, timeout=30)
+    elapsed = time.perf_counter() - started
+    # Ещё пара циклов опроса: свои передачи не должны вернуться эхом
+    time.sleep(3)
+    stats = bench.server.stats()
+    result['watch'] = {'ok': ok and transfers(stats) == 2, 'seconds': round(elapsed, 3),
+                       'uploads': stats['by_endpoint'].get('PUT /upload', 0),
+                       'downloads': stats['by_endpoint'].get('GET /download', 0), **stats}
+    return result
+
+
+def scenario_echo(bench: Bench) -> dict:
+    """
+    Эхо собственных скачиваний: поздние события записи (created и несколько
+    modified) отбрасываются, правка пользователя - нет; скачанные при
+    наблюдении файлы не загружаются обратно.
+    """
+    echoes = EchoRegistry(bench.local, ttl=10)
+    with echoes.writing('late/a.txt'):
+        _write(bench.local / 'late/a.txt', b'ours')
+    late = [echoes.is_echo('late/a.txt') for _ in ('created', 'modified', 'modified')]
+    _write(bench.local / 'late/a.txt', b'user edit')
+    edited = echoes.is_echo('late/a.txt')
+    result = {'late': {'ok': all(late) and not edited, 'late_events': late,
+                       'user_edit': edited, **bench.server.stats()}}
+
+    count = max(5, int(200 * bench.args.scale))
+    disk = bench.server.disk
+    service = bench.create_service()
+    service.start_sync()
+    bench.wait_until(lambda: not service.initial_sync, timeout=60)
+    bench.server.reset_stats()
+    started = time.perf_counter()
+    for i in range(count):
+        disk.put_file(bench.remote_path(f'echo/f{i}.txt'), f'remote {i}'.encode())
+    ok = bench.wait_until(lambda: all((bench.local / f'echo/f{i}.txt').exists()
+                                      for i in range(count)), timeout=60)
+    elapsed = time.perf_counter() - started
+    # Ещё пара циклов: события скачиваний не должны стать загрузками
+    time.sleep(3)
+    stats = bench.server.stats()
+    uploads = stats['by_endpoint'].get('PUT /upload', 0)
+    result['watch'] = {'ok': ok and uploads == 0, 'seconds': round(elapsed, 3), 'files': count,
+                       'uploads': uploads,
+                       'downloads': stats['by_endpoint'].get('GET /download', 0), **stats}
+    return result
+
+
+def scenario_nested(bench: Bench) -> dict:
+    """
+    Удаления и переименования во вложенных папках диска при наблюдении
+    с полным сканированием по умолчанию (раз в 600 с): их должна заметить
+    проверка дат изменения папок, переименование - без скачивания.
+    """
+    count = max(5, int(200 * bench.args.scale))
+    disk = bench.server.disk
+    for i in range(count):
+        disk.put_file(bench.remote_path(f'nested/a/b/c/gone{i}.txt'), f'gone {i}'.encode())
+        disk.put_file(bench.remote_path(f'nested/a/old{i}.txt'), f'moved {i}'.encode())
+    service = bench.create_service(
+        remote_full_scan_interval=CONFIG_DEFAULT['remote_full_scan_interval'])
+    service.start_sync()
+    bench.wait_until(lambda: not service.initial_sync, timeout=60)
+    # Первый опрос после полной синхронизации запоминает даты папок
+    time.sleep(service.remote_detector.min_interval + 1)
+    bench.server.reset_stats()
+    started = time.perf_counter()
+    for i in range(count):
+        disk.remove(bench.remote_path(f'nested/a/b/c/gone{i}.txt'))
+        disk.move(bench.remote_path(f'nested/a/old{i}.txt'),
+                  bench.remote_path(f'nested/a/new{i}.txt'))
+
+    def synced():
+        return all(not (bench.local / f'nested/a/b/c/gone{i}.txt').exists() and
+                   not (bench.local / f'nested/a/old{i}.txt').exists() and
+                   (bench.local / f'nested/a/new{i}.txt').exists() for i in range(count))
+
+    ok = bench.wait_until(synced, timeout=60)
+    elapsed = time.perf_counter() - started
+    stats = bench.server.stats()
+    downloads = stats['by_endpoint'].get('GET /download', 0)
+    return {'watch': {'ok': ok and downloads == 0, 'seconds': round(elapsed, 3),
+                      'files': count * 2, 'downloads': downloads, **stats}}
+
+
+SCENARIOS = {
+    'tiny': scenario_tiny,
+    'huge': scenario_huge,
+    'deep': scenario_deep,
+    'burst': scenario_burst,
+    'rename': scenario_rename,
+    'roundtrip': scenario_roundtrip,
+    'echo': scenario_echo,
+    'nested': scenario_nested,
+}
+
+
+def _print(name: str, results: dict):
+    for phase, result in results.items():
+        head = ' '.join(f'{key}={result[key]}' for key in
+                        ('ok', 'seconds', 'items', 'files', 'items_per_s', 'mb_per_s',
+                         'uploads', 'downloads', 'requests') if key in result)
+        print(f'{name}/{phase}: {head}')
+        if result.get('event_to_upload'):
+            print(f'    event->upload {result["event_to_upload"]}')
+        for endpoint, count in sorted(result['by_endpoint'].items(), key=lambda e: -e[1]):
+            print(f'    {count:8d}  {endpoint}')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m bench.run_bench', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f'scenarios to run: {", ".join(SCENARIOS)} (default: all)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='size multiplier (1.0 = 100k tiny files, 3x64 MB huge files)')
+    parser.add_argument('--latency', type=float, default=0.0, help='per-request latency, s')
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help='per-connection bandwidth, MB/s (0 = unlimited)')
+    parser.add_argument('--api-rate', type=float, default=0,
+                        help='api_rate_limit for the service, requests/s (0 = unlimited)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of API requests answered with 429/503')
+    parser.add_argument('--engine', choices=('threads', 'asyncio'), default='threads',
+                        help='sync engine (config.json "engine")')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='show service logs')
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenario: {", ".join(sorted(unknown))}')
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL,
+                        format='%(asctime)s %(levelname)s %(message)s')
+
+    results = {}
+    for name in args.scenarios or list(SCENARIOS):
+        bench = Bench(args)
+        try:
+            results[name] = SCENARIOS[name](bench)
+        finally:
+            bench.close()
+        _print(name, results[name])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r.get('ok', True) for s in results.values() for r in s.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
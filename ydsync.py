@@ -1,24 +1,54 @@
-import sys
-import json
-from os import path
+import time
+
+STARTED = time.perf_counter()
 
-from PyQt5 import QtWidgets
-from SRC.synchranize import SyncWindow
+import argparse
+import sys
 
-from SRC.config import CONFIG_DEFAULT
 
-# создание файла конфигурации
-if not path.exists('config.json'):
-    json.dump(CONFIG_DEFAULT, open('config.json', 'w'), indent=4)
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='ydsync',
+                                     description='Two-way folder sync with Yandex.Disk')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without GUI until SIGTERM (SIGHUP reloads config.json)')
+    parser.add_argument('--once', action='store_true',
+                        help='run one full sync without GUI and exit (for cron)')
+    parser.add_argument('--config', default='config.json',
+                        help='path to config.json for headless mode')
+    parser.add_argument('--profile', nargs='?', const='', metavar='DIR',
+                        help='run one profiled full sync without GUI and write the profile '
+                             'and per-phase timings to DIR (default: profile_dir)')
+    parser.add_argument('--profile-mode', choices=('cprofile', 'sample'),
+                        help='cprofile (deterministic) or sample (stack sampling, all threads)')
+    return parser.parse_args(argv)
 
 
-def main():
+def run_gui():
     """Запуск GUI приложения"""
+    from PyQt5 import QtWidgets
+    from SRC.synchranize import SyncWindow
+
     app = QtWidgets.QApplication(sys.argv)
     window = SyncWindow()
     window.show()
-    sys.exit(app.exec_())
+    return app.exec_()
+
+
+def main():
+    args = parse_args()
+    if args.headless or args.once or args.profile is not None:
+        # Без окна Qt не загружается вовсе
+        from SRC.headless import run_headless
+        profile = None
+        if args.profile is not None:
+            profile = {'profile_resync': True}
+            if args.profile:
+                profile['profile_dir'] = args.profile
+            if args.profile_mode:
+                profile['profile_mode'] = args.profile_mode
+        return run_headless(args.config, once=args.once, started=STARTED, profile=profile)
+    return run_gui()
 
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    sys.exit(main())